@@ -11,8 +11,10 @@ from django_prefixctl.models import (
     AlertTask,
     ASNMonitor,
     ASNSet,
+    IRRExpansion,
     Prefix,
     PrefixSet,
+    PrefixSetChangeset,
     PrefixSetIRRImporter,
 )
 
@@ -93,6 +95,38 @@ class PrefixSetIRRImporterAdmin(admin.ModelAdmin):
     list_display = ("prefix_set", "instance", "task_schedule")
 
 
+@admin.register(IRRExpansion)
+class IRRExpansionAdmin(admin.ModelAdmin):
+    list_display = ("as_set", "sources", "prefix_count", "updated")
+    readonly_fields = ("created", "updated")
+
+    def prefix_count(self, obj):
+        return len(obj.prefixes)
+
+
+@admin.register(PrefixSetChangeset)
+class PrefixSetChangesetAdmin(admin.ModelAdmin):
+    list_display = (
+        "prefix_set",
+        "operation",
+        "added_count",
+        "changed_count",
+        "removed_count",
+        "revision",
+        "created",
+    )
+    readonly_fields = ("revision", "prefix_set", "created", "updated")
+
+    def added_count(self, obj):
+        return len(obj.added)
+
+    def changed_count(self, obj):
+        return len(obj.changed)
+
+    def removed_count(self, obj):
+        return len(obj.removed)
+
+
 class PrefixInline(admin.TabularInline):
     model = Prefix
     extra = 0
@@ -0,0 +1,70 @@
+"""
+Changeset revisions for bulk prefix operations
+
+`Prefix` is registered with reversion following its `PrefixSet` (which in
+turn follows all of its prefixes), so every prefix saved inside a revision
+serializes the whole prefix set into version rows. Bulk operations instead
+record a single revision holding one `PrefixSetChangeset` with the prefix
+level diff of the operation.
+"""
+
+from contextlib import contextmanager
+
+import reversion
+from django.utils import timezone
+from reversion.models import Revision
+
+from django_prefixctl.models import PrefixSet, PrefixSetChangeset
+
+__all__ = [
+    "prefix_set_changeset",
+]
+
+
+@contextmanager
+def prefix_set_changeset(prefix_set: PrefixSet, operation: str, record: bool = True):
+    """
+    Context manager for bulk changes to the prefixes of a prefix set
+
+    Prefixes saved inside the context are not versioned. The operation
+    fills the yielded dict with the prefixes it added, updated and removed,
+    which are stored as one changeset revision once the context exits.
+    User and comment are taken from the active revision, if any.
+
+    Arguments:
+    - prefix_set: the prefix set that is changed
+    - operation: the bulk operation, see `PrefixSetChangeset.operation`
+    - record: if False no revision is recorded for the changes at all
+
+    Yields:
+    - dict with "added", "updated" and "removed" lists of
+      (prefix, mask_length_range) tuples, updated prefixes are stored
+      as the changeset's `changed` prefixes
+    """
+
+    changes = {"added": [], "updated": [], "removed": []}
+
+    if reversion.is_active():
+        with reversion.create_revision(manage_manually=True):
+            yield changes
+        user = reversion.get_user()
+        comment = reversion.get_comment()
+    else:
+        yield changes
+        user = None
+        comment = ""
+
+    if not record or not any(changes.values()):
+        return
+
+    revision = Revision.objects.create(
+        date_created=timezone.now(), user=user, comment=comment
+    )
+    PrefixSetChangeset.objects.create(
+        revision=revision,
+        prefix_set=prefix_set,
+        operation=operation,
+        added=[list(change) for change in changes["added"]],
+        changed=[list(change) for change in changes["updated"]],
+        removed=[list(change) for change in changes["removed"]],
+    )
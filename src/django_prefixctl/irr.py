@@ -1,17 +1,498 @@
+import hashlib
+import io
+import ipaddress
 import json
 import subprocess
+import tempfile
 
-from django_prefixctl.models import PrefixSet
+import structlog
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from django_prefixctl.changesets import prefix_set_changeset
+from django_prefixctl.models import (
+    IRRExpansion,
+    Prefix,
+    PrefixSet,
+    PrefixSetIRRImporter,
+)
+from django_prefixctl.rpsl import get_database
+
+log = structlog.get_logger("django")
 
 __all__ = [
+    "aggregate_prefixes",
+    "apply_irr_import",
+    "expand_as_set",
+    "expand_as_set_bgpq4",
+    "expand_as_set_rpsl",
+    "get_as_set_prefixes",
+    "import_digest",
+    "iter_bgpq4_rows",
     "perform_irr_import",
 ]
 
 
+def mask_length_runs(levels):
+    """
+    Splits a bitmask of mask lengths into runs of consecutive lengths
+
+    Returns:
+    - list of (first, last) tuples
+    """
+
+    runs = []
+    length = 0
+
+    while levels >> length:
+        if not levels >> length & 1:
+            length += 1
+            continue
+        first = length
+        while levels >> length & 1:
+            length += 1
+        runs.append((first, length - 1))
+
+    return runs
+
+
+def aggregate_prefixes(prefixes: dict):
+    """
+    Aggregates prefixes into covering prefixes with mask length ranges
+    (`bgpq4 -A` semantics).
+
+    A covering prefix gets the range a..b if every one of its subnets
+    with a mask length from a to b is part of `prefixes`, so the
+    aggregated list matches exactly the same prefixes as the original
+    one with far fewer entries.
+
+    Only "exact" prefixes are aggregated, other entries are kept as they are.
+
+    Arguments:
+    - prefixes: dict of prefix (str) -> mask length range (str)
+
+    Returns:
+    - dict of prefix (str) -> mask length range (str)
+    """
+
+    result = {}
+
+    # ip version -> mask length -> network address (int) -> bitmask of
+    # mask lengths at which all subnets of the network are in `prefixes`
+    nodes = {4: {}, 6: {}}
+
+    # networks of entries that are kept as they are
+    keep = set()
+
+    for prefix, mask_length_range in prefixes.items():
+        network = ipaddress.ip_network(prefix)
+
+        if mask_length_range != "exact":
+            result[f"{network}"] = mask_length_range
+            keep.add((int(network.network_address), network.prefixlen))
+            continue
+
+        nodes[network.version].setdefault(network.prefixlen, {})[
+            int(network.network_address)
+        ] = (1 << network.prefixlen)
+
+    for version, by_length in nodes.items():
+        max_length = 32 if version == 4 else 128
+        network_cls = ipaddress.IPv4Network if version == 4 else ipaddress.IPv6Network
+
+        # bottom up: a network is fully populated at a mask length if
+        # both its halves are
+
+        for length in range(max_length, 0, -1):
+            bit = 1 << (max_length - length)
+            parents = by_length.setdefault(length - 1, {})
+
+            for address, levels in by_length.get(length, {}).items():
+                if address & bit:
+                    continue
+
+                common = levels & by_length[length].get(address | bit, 0)
+
+                if not common:
+                    continue
+
+                if (address, length - 1) in keep:
+                    continue
+
+                parents[address] = parents.get(address, 0) | common
+
+        # top down: every network gets one entry for the run of mask lengths
+        # that is not yet covered by a less specific entry and matches the
+        # most prefixes, the network itself has to be in the run if it is
+        # part of `prefixes`
+
+        chosen = {}
+        chosen_lengths = []
+
+        for length in range(0, max_length + 1):
+            for address, levels in by_length.get(length, {}).items():
+                covered = 0
+                for parent_length in chosen_lengths:
+                    mask = ((1 << parent_length) - 1) << (max_length - parent_length)
+                    covered |= chosen.get((address & mask, parent_length), 0)
+
+                runs = mask_length_runs(levels & ~covered)
+
+                if not runs:
+                    continue
+
+                if runs[0][0] == length:
+                    first, last = runs[0]
+                else:
+                    first, last = max(
+                        runs,
+                        key=lambda run: sum(
+                            1 << (n - length) for n in range(run[0], run[1] + 1)
+                        ),
+                    )
+
+                chosen[(address, length)] = ((1 << (last + 1)) - 1) ^ ((1 << first) - 1)
+
+                if chosen_lengths[-1:] != [length]:
+                    chosen_lengths.append(length)
+
+                if first == last == length:
+                    mask_length_range = "exact"
+                else:
+                    mask_length_range = f"{first}..{last}"
+
+                result[f"{network_cls((address, length))}"] = mask_length_range
+
+    return result
+
+
+def apply_irr_import(prefix_set: PrefixSet, prefixes: dict, record: bool = True):
+    """
+    Syncs the prefixes of a prefix set to the result of an IRR expansion.
+
+    The difference between the expansion and the prefix set is computed
+    against a single snapshot of the prefix set and applied with bulk
+    writes inside one transaction. The difference is recorded as a single
+    changeset revision (see `prefix_set_changeset`).
+
+    Arguments:
+    - prefix_set: the prefix set to import into
+    - prefixes: dict of prefix (str) -> mask length range (str)
+    - record: record a changeset revision for the import
+
+    Returns:
+    - dict with "added", "updated" and "removed" lists of
+      (prefix, mask_length_range) tuples
+    """
+
+    # normalize so prefixes compare equal to the stored ones
+    prefixes = {
+        f"{ipaddress.ip_network(prefix)}": mask_length_range
+        for prefix, mask_length_range in prefixes.items()
+    }
+
+    with transaction.atomic(), prefix_set_changeset(
+        prefix_set, "irr_import", record
+    ) as result:
+        existing = {
+            f"{prefix.prefix}": prefix
+            for prefix in prefix_set.prefix_set.select_for_update()
+        }
+
+        create = []
+        update = []
+        now = timezone.now()
+
+        for prefix, mask_length_range in prefixes.items():
+            obj = existing.get(prefix)
+
+            if not obj:
+                obj = Prefix(
+                    prefix_set=prefix_set,
+                    prefix=prefix,
+                    status="ok",
+                    mask_length_range=mask_length_range,
+                )
+                # bulk_create does not call save()
+                obj.sync_mask_lengths()
+                create.append(obj)
+                result["added"].append((prefix, mask_length_range))
+                continue
+
+            if obj.mask_length_range == mask_length_range and obj.status == "ok":
+                continue
+
+            obj.mask_length_range = mask_length_range
+            obj.sync_mask_lengths()
+            obj.status = "ok"
+            # bulk_update does not apply auto_now
+            obj.updated = now
+            update.append(obj)
+            result["updated"].append((prefix, mask_length_range))
+
+        remove = [obj for prefix, obj in existing.items() if prefix not in prefixes]
+
+        Prefix.objects.bulk_create(create, batch_size=1000)
+        Prefix.objects.bulk_update(
+            update,
+            ["mask_length_range", "min_len", "max_len", "status", "updated"],
+            batch_size=1000,
+        )
+        Prefix.objects.filter(id__in=[obj.id for obj in remove]).delete()
+
+        result["removed"].extend(
+            (f"{obj.prefix}", obj.mask_length_range) for obj in remove
+        )
+
+    return result
+
+
+def iter_bgpq4_rows(stream, chunk_size=65536):
+    """
+    Incrementally parses bgpq4 json output (`bgpq4 -j`), yielding
+    the rows of the prefix list as they are read from `stream`.
+
+    Only the current chunk is held in memory, so the output of large
+    AS-SET expansions is never read or decoded as a whole.
+
+    Arguments:
+    - stream: text stream of bgpq4 json output
+    - chunk_size: number of characters to read at a time
+
+    Yields:
+    - dict with "prefix" and "exact" keys
+    """
+
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    eof = False
+    in_list = False
+
+    while True:
+        # drop what has been parsed and top up the buffer
+        if not eof and len(buffer) - pos < chunk_size:
+            chunk = stream.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+
+        if not in_list:
+            start = buffer.find("[", pos)
+            if start == -1:
+                if eof:
+                    raise ValueError("bgpq4 output does not contain a prefix list")
+                pos = len(buffer)
+                continue
+            pos = start + 1
+            in_list = True
+
+        while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+            pos += 1
+
+        if pos == len(buffer):
+            if eof:
+                raise ValueError("bgpq4 output ended unexpectedly")
+            continue
+
+        if buffer[pos] == "]":
+            return
+
+        try:
+            row, pos = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            # row is incomplete, read more unless there is nothing left
+            if eof:
+                raise
+            chunk = stream.read(chunk_size)
+            eof = not chunk
+            buffer += chunk
+            continue
+
+        yield row
+
+
+def expand_as_set(as_set: str, sources=None, address_family=4):
+    """
+    Expands an AS-SET into its prefixes using the expansion backend
+    configured in `IRR_EXPANSION_BACKEND`.
+
+    Arguments:
+    - as_set: the AS set to expand
+    - sources: the IRR sources to use (optional)
+    - address_family: 4 or 6, only prefixes of this address family
+      are returned
+
+    Returns:
+    - dict of prefix (str) -> mask length range (str)
+    """
+
+    try:
+        backend = EXPANSION_BACKENDS[settings.IRR_EXPANSION_BACKEND]
+    except KeyError:
+        raise ValueError(
+            f"Unknown IRR expansion backend: {settings.IRR_EXPANSION_BACKEND}"
+        )
+
+    if address_family not in (4, 6):
+        raise ValueError(f"Invalid address family: {address_family}")
+
+    return backend(as_set, sources, address_family)
+
+
+def expand_as_set_rpsl(as_set: str, sources=None, address_family=4):
+    """
+    Expands an AS-SET into its prefixes from the RPSL dump files
+    configured in `IRR_RPSL_DUMPS`.
+
+    Arguments:
+    - as_set: the AS set to expand
+    - sources: the IRR sources to use (optional)
+    - address_family: 4 (route objects) or 6 (route6 objects)
+
+    Returns:
+    - dict of prefix (str) -> mask length range (str)
+    """
+
+    paths = [
+        path.strip() for path in settings.IRR_RPSL_DUMPS.split(",") if path.strip()
+    ]
+
+    if not paths:
+        raise ValueError("IRR_RPSL_DUMPS is not configured")
+
+    return get_database(paths).expand(as_set, sources, address_family)
+
+
+def expand_as_set_bgpq4(as_set: str, sources=None, address_family=4):
+    """
+    Expands an AS-SET into its prefixes using bgpq4.
+
+    The bgpq4 output is parsed as it is streamed from the process.
+
+    Arguments:
+    - as_set: the AS set to expand
+    - sources: the IRR sources to use (optional)
+    - address_family: 4 or 6 (`bgpq4 -6`)
+
+    Returns:
+    - dict of prefix (str) -> mask length range (str)
+    """
+
+    command = ["bgpq4", "-j"]
+    if address_family == 6:
+        command.append("-6")
+    command.append(as_set)
+    if sources:
+        command += ["-S", sources]
+
+    log.debug("running bgpq4", command=command)
+
+    prefixes = None
+    parse_error = None
+
+    # stderr goes to a file so a chatty bgpq4 can never block on a full
+    # stderr pipe while stdout is being read
+    with tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=stderr)
+
+        try:
+            with io.TextIOWrapper(process.stdout, encoding="utf-8") as stdout:
+                prefixes = {
+                    row["prefix"]: "exact" if row["exact"] is True else ""
+                    for row in iter_bgpq4_rows(stdout)
+                }
+        except ValueError as exc:
+            parse_error = exc
+        finally:
+            process.wait()
+
+        stderr.seek(0)
+        error = stderr.read()
+
+    if error:
+        raise Exception(error.decode())
+
+    if parse_error:
+        raise Exception(f"could not parse bgpq4 output: {parse_error}")
+
+    if process.returncode:
+        raise Exception(f"bgpq4 exited with status {process.returncode}")
+
+    return prefixes
+
+
+EXPANSION_BACKENDS = {
+    "bgpq4": expand_as_set_bgpq4,
+    "rpsl": expand_as_set_rpsl,
+}
+
+
+def get_as_set_prefixes(as_set: str, sources=None):
+    """
+    Returns the prefixes of an AS-SET, expanding it only if there is no
+    cached expansion for the same AS-SET and sources that is younger
+    than `IRR_EXPANSION_CACHE_EXPIRY`.
+
+    Arguments:
+    - as_set: the AS set to expand
+    - sources: the IRR sources to use (optional)
+
+    Returns:
+    - dict of prefix (str) -> mask length range (str)
+    """
+
+    expansion = IRRExpansion.get_valid(as_set, sources)
+
+    if expansion:
+        return expansion.prefixes
+
+    prefixes = expand_as_set(as_set, sources)
+    IRRExpansion.store(as_set, sources, prefixes)
+    return prefixes
+
+
+def import_digest(prefix_set: PrefixSet, prefixes: dict):
+    """
+    Returns a digest of an AS-SET expansion and the current state of
+    the prefix set it is imported into.
+
+    The prefix set state (prefix count and last update) is included so
+    that manual changes to the prefix set are reconciled by the next
+    import even if the expansion itself did not change.
+
+    Arguments:
+    - prefix_set: the prefix set to import into
+    - prefixes: dict of prefix (str) -> mask length range (str)
+
+    Returns:
+    - sha256 hex digest (str)
+    """
+
+    digest = hashlib.sha256()
+
+    for prefix, mask_length_range in sorted(prefixes.items()):
+        digest.update(f"{prefix} {mask_length_range}\n".encode())
+
+    state = prefix_set.prefix_set.aggregate(count=Count("id"), updated=Max("updated"))
+    digest.update(f"{state['count']} {state['updated']}".encode())
+
+    return digest.hexdigest()
+
+
 def perform_irr_import(prefix_set: PrefixSet, as_set: str, sources=None):
     """
     Perform an IRR import for the given prefix set.
 
+    If `irr_aggregate` is enabled on the prefix set, the expansion is
+    aggregated before it is applied (see `aggregate_prefixes`).
+
+    If neither the AS-SET expansion nor the prefix set changed since the
+    last import, the prefix set is left alone and the result is reported
+    as `unchanged`.
+
     Arguments:
     - prefix_set: the prefix set to import into
     - as_set: the AS set to import from
@@ -27,39 +508,23 @@ def perform_irr_import(prefix_set: PrefixSet, as_set: str, sources=None):
     if not prefix_set.irr_import:
         return {"error": "irr import disabled"}
 
-    command = ["bgpq4", "-j", as_set]
-    if sources:
-        command += ["-S", sources]
+    prefixes = get_as_set_prefixes(as_set, sources)
 
-    print("COMMAND", command)
-    result = subprocess.run(command, capture_output=True)
+    if prefix_set.irr_aggregate:
+        prefixes = aggregate_prefixes(prefixes)
 
-    if result.stderr:
-        raise Exception(result.stderr.decode())
+    try:
+        importer = prefix_set.prefix_set_irr_importer
+    except PrefixSetIRRImporter.DoesNotExist:
+        importer = None
 
-    output = result.stdout.decode()
-    data = json.loads(output)
+    if importer and importer.import_digest == import_digest(prefix_set, prefixes):
+        return {"added": [], "updated": [], "removed": [], "unchanged": True}
 
-    old_prefixes = [prefix for prefix in prefix_set.prefix_set.all()]
-
-    prefixes = {row["prefix"]: row["exact"] for row in data.get("NN")}
-
-    result = {"added": [], "updated": [], "removed": []}
-
-    for prefix, exact in list(prefixes.items()):
-        if exact is True:
-            mask_length_range = "exact"
-        else:
-            mask_length_range = ""
-        added, updated = prefix_set.add_or_update_prefix(prefix, mask_length_range)
-        if added:
-            result["added"].append((prefix, mask_length_range))
-        elif updated:
-            result["updated"].append((prefix, mask_length_range))
+    result = apply_irr_import(prefix_set, prefixes, settings.IRR_IMPORT_REVISIONS)
 
-    for prefix in old_prefixes:
-        if prefix.prefix not in prefixes.keys():
-            result["removed"].append((str(prefix.prefix), prefix.mask_length_range))
-            prefix.delete()
+    if importer:
+        importer.import_digest = import_digest(prefix_set, prefixes)
+        importer.save(update_fields=["import_digest"])
 
     return result
@@ -0,0 +1,58 @@
+# Generated by Django 4.2.15 on 2026-10-19 00:29
+
+from django.db import migrations, models
+import django.db.models.manager
+import django_handleref.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("django_prefixctl", "0019_alter_prefixset_irr_as_set"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="IRRExpansion",
+            fields=[
+                ("id", models.AutoField(primary_key=True, serialize=False)),
+                (
+                    "created",
+                    django_handleref.models.CreatedDateTimeField(
+                        auto_now_add=True, verbose_name="Created"
+                    ),
+                ),
+                (
+                    "updated",
+                    django_handleref.models.UpdatedDateTimeField(
+                        auto_now=True, verbose_name="Updated"
+                    ),
+                ),
+                ("version", models.IntegerField(default=0)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("ok", "Ok"),
+                            ("pending", "Pending"),
+                            ("deactivated", "Deactivated"),
+                            ("failed", "Failed"),
+                            ("expired", "Expired"),
+                        ],
+                        default="ok",
+                        max_length=12,
+                    ),
+                ),
+                ("as_set", models.CharField(max_length=255)),
+                ("sources", models.CharField(blank=True, default="", max_length=255)),
+                ("prefixes", models.JSONField(default=dict)),
+            ],
+            options={
+                "db_table": "prefixctl_irr_expansion",
+                "unique_together": {("as_set", "sources")},
+            },
+            managers=[
+                ("handleref", django.db.models.manager.Manager()),
+            ],
+        ),
+    ]
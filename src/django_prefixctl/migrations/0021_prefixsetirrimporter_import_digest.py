@@ -0,0 +1,23 @@
+# Generated by Django 4.2.15 on 2026-10-19 00:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("django_prefixctl", "0020_irr_expansion"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="prefixsetirrimporter",
+            name="import_digest",
+            field=models.CharField(
+                blank=True,
+                help_text="Digest of the last imported AS-SET expansion and the resulting prefix set",
+                max_length=64,
+                null=True,
+            ),
+        ),
+    ]
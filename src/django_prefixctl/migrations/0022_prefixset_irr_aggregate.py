@@ -0,0 +1,21 @@
+# Generated by Django 4.2.15 on 2026-10-19 00:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("django_prefixctl", "0021_prefixsetirrimporter_import_digest"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="prefixset",
+            name="irr_aggregate",
+            field=models.BooleanField(
+                default=False,
+                help_text="aggregate imported prefixes into covering prefixes with mask length ranges",
+            ),
+        ),
+    ]
@@ -0,0 +1,86 @@
+# Generated by Django 4.2.15 on 2026-10-19 00:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.db.models.manager
+import django_handleref.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("reversion", "0002_add_index_on_version_for_content_type_and_db"),
+        ("django_prefixctl", "0022_prefixset_irr_aggregate"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PrefixSetChangeset",
+            fields=[
+                ("id", models.AutoField(primary_key=True, serialize=False)),
+                (
+                    "created",
+                    django_handleref.models.CreatedDateTimeField(
+                        auto_now_add=True, verbose_name="Created"
+                    ),
+                ),
+                (
+                    "updated",
+                    django_handleref.models.UpdatedDateTimeField(
+                        auto_now=True, verbose_name="Updated"
+                    ),
+                ),
+                ("version", models.IntegerField(default=0)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("ok", "Ok"),
+                            ("pending", "Pending"),
+                            ("deactivated", "Deactivated"),
+                            ("failed", "Failed"),
+                            ("expired", "Expired"),
+                        ],
+                        default="ok",
+                        max_length=12,
+                    ),
+                ),
+                (
+                    "operation",
+                    models.CharField(
+                        choices=[
+                            ("irr_import", "IRR import"),
+                            ("add_prefixes", "Add prefixes"),
+                            ("delete_prefixes", "Delete prefixes"),
+                        ],
+                        max_length=32,
+                    ),
+                ),
+                ("added", models.JSONField(default=list)),
+                ("changed", models.JSONField(default=list)),
+                ("removed", models.JSONField(default=list)),
+                (
+                    "prefix_set",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="changeset_set",
+                        to="django_prefixctl.prefixset",
+                    ),
+                ),
+                (
+                    "revision",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="prefix_set_changesets",
+                        to="reversion.revision",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "prefixctl_prefix_set_changeset",
+            },
+            managers=[
+                ("handleref", django.db.models.manager.Manager()),
+            ],
+        ),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 4.2.15 on 2026-10-19 00:54
+
+from django.db import migrations, models
+from django.db.models import F, Func, IntegerField, Value
+from django.db.models.functions import Cast
+
+
+def populate_mask_lengths(apps, schema_editor):
+    """
+    Fills min_len and max_len from the mask length range of
+    existing prefixes, in the database
+    """
+    Prefix = apps.get_model("django_prefixctl", "Prefix")
+
+    masklen = Func(F("prefix"), function="masklen", output_field=IntegerField())
+
+    Prefix.objects.filter(mask_length_range__in=["exact", ""]).update(
+        min_len=masklen, max_len=masklen
+    )
+
+    def bound(index):
+        return Cast(
+            Func(
+                F("mask_length_range"),
+                Value(".."),
+                Value(index),
+                function="split_part",
+            ),
+            IntegerField(),
+        )
+
+    Prefix.objects.filter(mask_length_range__regex=r"^[0-9]+\.\.[0-9]+$").update(
+        min_len=bound(1), max_len=bound(2)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("django_prefixctl", "0023_prefix_set_changeset"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="prefix",
+            options={"default_manager_name": "objects"},
+        ),
+        migrations.AlterModelManagers(
+            name="prefix",
+            managers=[],
+        ),
+        migrations.AddField(
+            model_name="prefix",
+            name="max_len",
+            field=models.PositiveSmallIntegerField(
+                blank=True,
+                editable=False,
+                help_text="Longest permitted mask length",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="prefix",
+            name="min_len",
+            field=models.PositiveSmallIntegerField(
+                blank=True,
+                editable=False,
+                help_text="Shortest permitted mask length",
+                null=True,
+            ),
+        ),
+        migrations.RunPython(populate_mask_lengths, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="prefix",
+            index=models.Index(
+                fields=["prefix_set", "min_len", "max_len"],
+                name="prefixctl_prefix_mask_len",
+            ),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.15 on 2026-10-19 01:16
+
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+
+def create_trigram_index(apps, schema_editor):
+    """
+    Creates the trigram index used for substring prefix searches
+
+    pg_trgm is an optional contrib extension, if it is not available
+    substring searches still work but are not indexed
+    """
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if not cursor.fetchone():
+            return
+
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS prefixctl_prefix_trgm ON prefixctl_prefix "
+        "USING gin ((prefix::text) gin_trgm_ops)"
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    schema_editor.execute("DROP INDEX IF EXISTS prefixctl_prefix_trgm")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("django_prefixctl", "0024_prefix_mask_lengths"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="prefix",
+            index=django.contrib.postgres.indexes.GistIndex(
+                fields=["prefix"], name="prefixctl_prefix_inet", opclasses=["inet_ops"]
+            ),
+        ),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.15 on 2026-10-19 01:56
+
+from django.db import migrations
+import django.db.models.manager
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("django_fullctl", "0034_task_requeued"),
+        ("django_prefixctl", "0025_prefix_search_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DeletePrefixSetsTask",
+            fields=[],
+            options={
+                "proxy": True,
+                "indexes": [],
+                "constraints": [],
+            },
+            bases=("django_fullctl.task",),
+            managers=[
+                ("handleref", django.db.models.manager.Manager()),
+            ],
+        ),
+    ]
@@ -1,29 +1,49 @@
+import ipaddress
+import re
 import secrets
+from datetime import timedelta
 
 import fullctl.service_bridge.pdbctl as pdbctl
 import reversion
 import structlog
 from django.conf import settings
+from django.contrib.postgres.indexes import GistIndex
 from django.db import models
+from django.db.models.functions import Cast
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django_grainy.decorators import grainy_model
+from django_handleref.manager import HandleRefQuerySet
 from fullctl.django.inet.validators import validate_masklength_range
 from fullctl.django.models.abstract.alert import AlertGroup as AlertGroupBase
 from fullctl.django.models.abstract.alert import AlertLog as AlertLogBase
 from fullctl.django.models.abstract.alert import AlertRecipient as AlertRecipientBase
 from fullctl.django.models.abstract.base import HandleRefModel, SlugModel
 from fullctl.django.models.concrete import Instance
-from fullctl.django.models.concrete.tasks import Monitor, Task, TaskSchedule
+from fullctl.django.models.concrete.tasks import Monitor as MonitorBase
+from fullctl.django.models.concrete.tasks import Task, TaskSchedule
 from fullctl.django.validators import validate_alphanumeric_list
 from fullctl.django.inet.validators import validate_as_set
 from netfields import CidrAddressField
+from netfields.functions import Masklen
+from reversion.models import Revision
+
+from django_prefixctl.schedule import (
+    phased_schedule,
+    rate_limited_schedule,
+    schedule_lock,
+)
 
 __all__ = (
     "ASNSet",
     "ASN",
     "PrefixSet",
     "PrefixSetIRRImporter",
+    "IRRExpansion",
+    "PrefixSetChangeset",
     "Prefix",
+    "PrefixQuerySet",
+    "mask_length_bounds",
     "Monitor",
     "MonitorTaskMixin",
     "ASNMonitor",
@@ -39,6 +59,8 @@ __all__ = (
 
 PREFIX_MONITOR_CLASSES = {}
 
+RE_MASK_LENGTH_RANGE = re.compile(r"^([0-9]+)\.\.([0-9]+)$")
+
 log = structlog.get_logger("django")
 
 
@@ -82,6 +104,119 @@ def generate_secret():
     return f"{secrets.token_urlsafe()}"
 
 
+class Monitor(MonitorBase):
+    """
+    Base class for monitors that run on a recurring task schedule.
+
+    Task schedules are not started all at once, every monitor runs on its own
+    deterministic phase of the schedule interval (see `django_prefixctl.schedule`).
+    """
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def monitor_classes(cls):
+        """
+        Returns all concrete monitor classes, including monitors that
+        subclass other monitors.
+        """
+        classes = []
+        for subclass in cls.__subclasses__():
+            if not subclass._meta.abstract:
+                classes.append(subclass)
+            classes.extend(subclass.monitor_classes())
+        return classes
+
+    @classmethod
+    def for_task_schedule(cls, task_schedule):
+        """
+        Returns the monitor running on a task schedule.
+
+        Task schedules are matched to a monitor class by their description
+        (see `schedule_description`), so only that class is queried and
+        schedules of anything else are not queried at all.
+
+        Arguments:
+        task_schedule: The TaskSchedule.
+
+        Returns:
+        The monitor or None if the task schedule does not belong to a monitor.
+        """
+        for monitor_cls in cls.monitor_classes():
+            if monitor_cls.__name__ == task_schedule.description:
+                monitor = monitor_cls.objects.filter(
+                    task_schedule_id=task_schedule.id
+                ).first()
+                if monitor:
+                    return monitor
+        return None
+
+    @property
+    def schedule_description(self):
+        """
+        Returns the description of the task schedule, the monitor class name.
+
+        This identifies the monitor class of a task schedule, see
+        `for_task_schedule`.
+        """
+        return self.__class__.__name__
+
+    @property
+    def schedule_key(self):
+        """
+        Returns the key the phase of the task schedule is derived from.
+        """
+        return f"{self.HandleRef.tag}.{self.id}"
+
+    @property
+    def schedule_first_run(self):
+        """
+        Returns the time of the first run of a new task schedule.
+        """
+        return phased_schedule(self.schedule_key, self.schedule_interval)
+
+    @property
+    def require_task_schedule(self):
+        if not self.task_schedule:
+            org = self.instance.org
+            with schedule_lock():
+                self.task_schedule = TaskSchedule.objects.create(
+                    org=org,
+                    task_config=self.schedule_task_config,
+                    description=self.schedule_description,
+                    repeat=True,
+                    interval=self.schedule_interval,
+                    schedule=self.schedule_first_run,
+                )
+            self.save()
+
+        return self.task_schedule
+
+    def realign_task_schedule(self):
+        """
+        Moves the next run of the task schedule back onto the monitor's phase.
+
+        The next run is at least half an interval away.
+
+        Returns:
+        The next run, None if the monitor has no task schedule.
+        """
+        if not self.task_schedule_id:
+            return None
+
+        interval = self.schedule_interval
+        after = timezone.now() + timedelta(seconds=interval // 2)
+
+        with schedule_lock():
+            schedule = phased_schedule(self.schedule_key, interval, after)
+            TaskSchedule.objects.filter(id=self.task_schedule_id).update(
+                schedule=schedule
+            )
+
+        return schedule
+
+
 class TaskContainer(models.Model):
     """
     A container model for tasks.
@@ -165,7 +300,7 @@ class ASN(HandleRefModel):
     namespace="prefix",
     namespace_instance="prefix.{instance.org.permission_id}.{instance.id}",
 )
-@reversion.register(follow=['prefix_set'])
+@reversion.register(follow=["prefix_set"])
 class PrefixSet(SlugModel):
     """
     Represents a set of IP network prefixes.
@@ -177,6 +312,7 @@ class PrefixSet(SlugModel):
     irr_import: Boolean indicating if automatic import of prefixes is enabled.
     irr_sources: Comma-separated sources for prefix list import.
     irr_as_set: Specifies the AS-SET for importing prefixes.
+    irr_aggregate: Boolean indicating if imported prefixes are aggregated.
     ux_keep_list_open: UX preference, whether to keep the prefix list expanded.
     """
 
@@ -214,6 +350,12 @@ class PrefixSet(SlugModel):
         help_text=_("import prefixes for AS-SET"),
         validators=(validate_as_set,),
     )
+    irr_aggregate = models.BooleanField(
+        default=False,
+        help_text=_(
+            "aggregate imported prefixes into covering prefixes with mask length ranges"
+        ),
+    )
 
     # TODO: user centric preferences?
 
@@ -267,6 +409,10 @@ class PrefixSet(SlugModel):
             log.error("IRR import enabled but no task schedule found", prefix_set=self)
             return "error"
 
+        # status of the most recent task annotated by a list query
+        if hasattr(self, "irr_import_task_status"):
+            return self.irr_import_task_status or "pending"
+
         recent_task = importer.task_schedule.tasks.order_by("-created").first()
 
         if not recent_task:
@@ -328,6 +474,7 @@ class PrefixSetIRRImporter(Monitor):
     instance: Foreign key to an environment instance linked with this importer.
     prefix_set: OneToOne relationship to the PrefixSet being imported into.
     task_schedule: OneToOne relationship to the task schedule for this importer.
+    import_digest: Digest of the last import, used to skip imports that would not change anything.
     """
 
     instance = models.ForeignKey(
@@ -346,6 +493,15 @@ class PrefixSetIRRImporter(Monitor):
         help_text=_("The task schedule for the irr importer"),
     )
 
+    import_digest = models.CharField(
+        max_length=64,
+        null=True,
+        blank=True,
+        help_text=_(
+            "Digest of the last imported AS-SET expansion and the resulting prefix set"
+        ),
+    )
+
     class Meta:
         db_table = "prefixctl_prefix_set_irr_importer"
 
@@ -362,6 +518,18 @@ class PrefixSetIRRImporter(Monitor):
         """
         return settings.IRR_IMPORT_FREQUENCY
 
+    @property
+    def schedule_first_run(self):
+        """
+        Runs the first import as soon as the rate limit allows, so prefixes
+        show up shortly after the import is enabled. The schedule is moved
+        onto the importer's phase once it has run.
+
+        Returns:
+        The time of the first import.
+        """
+        return rate_limited_schedule(timezone.now(), self.schedule_interval)
+
     @property
     def schedule_task_config(self):
         """
@@ -384,11 +552,223 @@ class PrefixSetIRRImporter(Monitor):
         }
 
 
+class IRRExpansion(HandleRefModel):
+    """
+    Caches the expansion of an AS-SET into prefixes so prefix sets
+    importing the same AS-SET from the same IRR sources share it.
+
+    Attributes:
+    as_set: The expanded AS-SET (normalized to upper case).
+    sources: The IRR sources the AS-SET was expanded from (normalized, comma separated).
+    prefixes: The expanded prefixes, prefix -> mask length range.
+    """
+
+    as_set = models.CharField(max_length=255)
+    sources = models.CharField(max_length=255, blank=True, default="")
+    prefixes = models.JSONField(default=dict)
+
+    class Meta:
+        db_table = "prefixctl_irr_expansion"
+        unique_together = ("as_set", "sources")
+
+    class HandleRef:
+        tag = "irr_expansion"
+
+    @classmethod
+    def normalize_key(cls, as_set, sources=None):
+        """
+        Normalizes an AS-SET and IRR sources into the cache key
+
+        Returns:
+        A tuple of (as_set, sources).
+        """
+        sources = ",".join(
+            source.strip().upper()
+            for source in (sources or "").split(",")
+            if source.strip()
+        )
+        return as_set.strip().upper(), sources
+
+    @classmethod
+    def get_valid(cls, as_set, sources=None):
+        """
+        Returns the cached expansion for the AS-SET and sources if it is
+        younger than `IRR_EXPANSION_CACHE_EXPIRY`, None otherwise.
+        """
+        as_set, sources = cls.normalize_key(as_set, sources)
+        valid_after = timezone.now() - timedelta(
+            seconds=settings.IRR_EXPANSION_CACHE_EXPIRY
+        )
+        return cls.objects.filter(
+            as_set=as_set, sources=sources, updated__gt=valid_after
+        ).first()
+
+    @classmethod
+    def store(cls, as_set, sources, prefixes):
+        """
+        Stores an expansion for the AS-SET and sources, replacing
+        any previously cached one.
+        """
+        as_set, sources = cls.normalize_key(as_set, sources)
+        expansion, _ = cls.objects.update_or_create(
+            as_set=as_set, sources=sources, defaults={"prefixes": prefixes}
+        )
+        return expansion
+
+
+class PrefixSetChangeset(HandleRefModel):
+    """
+    Compact record of a bulk change to the prefixes of a PrefixSet.
+
+    Bulk operations (IRR imports, bulk adds) record one changeset revision
+    instead of a version for every prefix they touch.
+
+    Attributes:
+    revision: The revision the changeset belongs to.
+    prefix_set: The PrefixSet that was changed.
+    operation: The bulk operation that changed the prefix set.
+    added: Added prefixes, list of [prefix, mask length range].
+    changed: Prefixes with a changed mask length range, list of [prefix, mask length range].
+    removed: Removed prefixes, list of [prefix, mask length range].
+    """
+
+    revision = models.ForeignKey(
+        Revision, related_name="prefix_set_changesets", on_delete=models.CASCADE
+    )
+    prefix_set = models.ForeignKey(
+        PrefixSet, related_name="changeset_set", on_delete=models.CASCADE
+    )
+    operation = models.CharField(
+        max_length=32,
+        choices=(
+            ("irr_import", _("IRR import")),
+            ("add_prefixes", _("Add prefixes")),
+            ("delete_prefixes", _("Delete prefixes")),
+        ),
+    )
+    added = models.JSONField(default=list)
+    changed = models.JSONField(default=list)
+    removed = models.JSONField(default=list)
+
+    class Meta:
+        db_table = "prefixctl_prefix_set_changeset"
+
+    class HandleRef:
+        tag = "prefix_set_changeset"
+
+
+def mask_length_bounds(prefix, mask_length_range):
+    """
+    Returns the shortest and longest mask length permitted by
+    a mask length range.
+
+    Arguments:
+        - prefix (str|ipaddress.ip_network): the prefix the range applies to
+        - mask_length_range (str): "exact" or "[0-9]..[0-9]", an empty
+          range is treated as "exact"
+
+    Returns:
+        - tuple(min_len(int), max_len(int)), (None, None) if the prefix
+          or range can not be parsed
+    """
+
+    try:
+        prefixlen = ipaddress.ip_network(f"{prefix}").prefixlen
+    except ValueError:
+        return None, None
+
+    if mask_length_range in ("exact", ""):
+        return prefixlen, prefixlen
+
+    match = RE_MASK_LENGTH_RANGE.match(mask_length_range or "")
+
+    if not match:
+        return None, None
+
+    return int(match.group(1)), int(match.group(2))
+
+
+class PrefixQuerySet(HandleRefQuerySet):
+    """
+    Queries prefixes by the mask lengths they permit.
+    """
+
+    def permitting_length(self, length):
+        """
+        Returns the prefixes that permit mask length `length`.
+        """
+        return self.filter(min_len__lte=length, max_len__gte=length)
+
+    def permitting(self, prefix):
+        """
+        Returns the prefixes that permit announcing `prefix`: they cover
+        it and its mask length is inside their mask length range.
+        """
+        network = ipaddress.ip_network(f"{prefix}")
+        return self.filter(prefix__net_contains_or_equals=network).permitting_length(
+            network.prefixlen
+        )
+
+    def search(self, query):
+        """
+        Searches prefixes.
+
+        If `query` is an address or prefix, the prefixes covering or equal
+        to it are returned longest match first, followed by the prefixes
+        it covers, shortest first. Both use the GiST index on `prefix`.
+
+        Any other query is matched as a substring of the prefix (trigram
+        indexed where pg_trgm is available, see migration 0025).
+        """
+        query = f"{query}".strip()
+
+        if not query:
+            return self.none()
+
+        try:
+            network = ipaddress.ip_network(query, strict=False)
+        except ValueError:
+            return (
+                self.annotate(search_text=Cast("prefix", models.TextField()))
+                .filter(search_text__contains=query)
+                .order_by("prefix", "id")
+            )
+
+        covering = models.Q(prefix__net_contains_or_equals=network)
+        contained = models.Q(prefix__net_contained_or_equal=network)
+
+        # rank covering prefixes by mask length descending, then the
+        # covered prefixes by mask length ascending
+
+        search_rank = models.Case(
+            models.When(covering, then=129 - Masklen("prefix")),
+            default=129 + Masklen("prefix"),
+            output_field=models.IntegerField(),
+        )
+
+        return (
+            self.filter(covering | contained)
+            .annotate(search_rank=search_rank)
+            .order_by("search_rank", "prefix", "id")
+        )
+
+    def after(self, prefix, id):
+        """
+        Returns the prefixes ordered on (prefix, id) that come after
+        `prefix` / `id`, used for keyset pagination.
+        """
+        return (
+            self.order_by("prefix", "id")
+            .filter(prefix__gte=prefix)
+            .exclude(prefix=prefix, id__lte=id)
+        )
+
+
 @grainy_model(
     namespace="prefix",
     namespace_instance="prefix.{instance.prefix_set.org.permission_id}.{instance.prefix_set_id}.{instance.id}",
 )
-@reversion.register(follow=['prefix_set'])
+@reversion.register(follow=["prefix_set"])
 class Prefix(HandleRefModel):
     """
     Represents an IP network prefix within a set.
@@ -397,6 +777,8 @@ class Prefix(HandleRefModel):
     prefix_set: Foreign key to the PrefixSet this prefix belongs to.
     prefix: The IP network prefix.
     mask_length_range: Specifies the permissible mask length range for the prefix.
+    min_len: Shortest permitted mask length, kept in sync with mask_length_range.
+    max_len: Longest permitted mask length, kept in sync with mask_length_range.
     """
 
     prefix_set = models.ForeignKey(
@@ -408,13 +790,57 @@ class Prefix(HandleRefModel):
         max_length=255, default="exact", validators=[validate_masklength_range]
     )
 
+    min_len = models.PositiveSmallIntegerField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text=_("Shortest permitted mask length"),
+    )
+    max_len = models.PositiveSmallIntegerField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text=_("Longest permitted mask length"),
+    )
+
+    objects = PrefixQuerySet.as_manager()
+
     class Meta:
         db_table = "prefixctl_prefix"
         unique_together = ("prefix_set", "prefix")
+        default_manager_name = "objects"
+        indexes = [
+            models.Index(
+                fields=["prefix_set", "min_len", "max_len"],
+                name="prefixctl_prefix_mask_len",
+            ),
+            GistIndex(
+                fields=["prefix"],
+                opclasses=["inet_ops"],
+                name="prefixctl_prefix_inet",
+            ),
+        ]
 
     class HandleRef:
         tag = "prefix"
 
+    def sync_mask_lengths(self):
+        """
+        Updates min_len and max_len from the mask length range.
+        """
+        self.min_len, self.max_len = mask_length_bounds(
+            self.prefix, self.mask_length_range
+        )
+
+    def save(self, *args, **kwargs):
+        self.sync_mask_lengths()
+
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "mask_length_range" in update_fields:
+            kwargs["update_fields"] = set(update_fields) | {"min_len", "max_len"}
+
+        super().save(*args, **kwargs)
+
 
 class MonitorTaskMixin:
     """
@@ -591,7 +1017,7 @@ class AlertLogRecipient(AlertRecipientBase):
     Attributes:
     alertlog: Foreign key to the AlertLog this recipient is associated with.
     """
-    
+
     alertlog = models.ForeignKey(
         AlertLog, related_name="alert_log_recipient_set", on_delete=models.CASCADE
     )
@@ -1,12 +1,16 @@
 import json
 
+from django.conf import settings
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
 from fullctl.django.models import Task
 from fullctl.django.tasks import register
 
 from django_prefixctl.irr import perform_irr_import
-from django_prefixctl.models.prefixctl import PrefixSet
+from django_prefixctl.models.prefixctl import Prefix, PrefixSet
 
 __all__ = [
+    "DeletePrefixSetsTask",
     "IRRImportTask",
 ]
 
@@ -67,3 +71,106 @@ class IRRImportTask(Task):
         sources = prefix_set.irr_sources
         result = perform_irr_import(self.prefix_set, as_set, sources)
         return json.dumps(result)
+
+
+@register
+class DeletePrefixSetsTask(Task):
+    """
+    Task for deleting the PrefixSets of an instance that were created
+    before a cutoff date.
+
+    PrefixSets are deleted in batches of `PREFIX_SET_DELETE_BATCH_SIZE`,
+    their prefixes in batches of `PREFIX_DELETE_BATCH_SIZE` first, so no
+    single transaction grows with the size of the instance. Progress is
+    reported in `output` while the task is running, see `progress`.
+
+    Arguments (task param):
+    - instance_id: The id of the instance.
+    - cutoff: ISO 8601 datetime, PrefixSets created before it are deleted.
+    """
+
+    class TaskMeta:
+        limit = 1
+
+    class HandleRef:
+        tag = "task_delete_prefixsets"
+
+    class Meta:
+        proxy = True
+
+    @property
+    def generate_limit_id(self):
+        """
+        Generates a limit ID for the task, based on the instance ID, so
+        only one deletion runs per instance at a time.
+
+        Returns:
+        The instance ID.
+        """
+        return self.param["args"][0]
+
+    @property
+    def progress(self):
+        """
+        Returns the deletion progress (dict with `deleted` and `total`
+        PrefixSet counts), None if the task has not started yet.
+        """
+        if self.status not in ("running", "completed") or not self.output:
+            return None
+        return json.loads(self.output)
+
+    def report_progress(self, deleted, total):
+        self.output = json.dumps({"deleted": deleted, "total": total})
+        self.save(update_fields=["output", "updated"])
+
+    def run(self, instance_id, cutoff, *args, **kwargs):
+        """
+        Deletes the PrefixSets in batches.
+
+        Arguments:
+        - instance_id: The id of the instance.
+        - cutoff: ISO 8601 datetime, PrefixSets created before it are deleted.
+
+        Returns:
+        A JSON string with the number of deleted PrefixSets.
+        """
+        prefix_sets = PrefixSet.objects.filter(
+            instance_id=instance_id, created__lt=parse_datetime(cutoff)
+        ).order_by("id")
+
+        total = prefix_sets.count()
+        deleted = 0
+
+        self.report_progress(deleted, total)
+
+        while True:
+            batch = list(
+                prefix_sets.values_list("id", flat=True)[
+                    : settings.PREFIX_SET_DELETE_BATCH_SIZE
+                ]
+            )
+
+            if not batch:
+                break
+
+            # prefixes make up the bulk of the rows, delete them in
+            # bounded chunks before the prefix sets cascade
+
+            prefixes = Prefix.objects.filter(prefix_set_id__in=batch)
+            while True:
+                ids = list(
+                    prefixes.values_list("id", flat=True)[
+                        : settings.PREFIX_DELETE_BATCH_SIZE
+                    ]
+                )
+                if not ids:
+                    break
+                Prefix.objects.filter(id__in=ids).delete()
+
+            with transaction.atomic():
+                PrefixSet.objects.filter(id__in=batch).delete()
+
+            deleted += len(batch)
+            self.report_progress(deleted, total)
+
+        return json.dumps({"deleted": deleted, "total": total})
@@ -1,16 +1,28 @@
+import base64
+import ipaddress
+import json
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, OuterRef, Q, QuerySet, Subquery, TextField
+from django.db.models.manager import BaseManager
+from django.db.models.functions import Cast, Coalesce
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
+from fullctl.django.models.concrete.tasks import Task
 from fullctl.django.rest.decorators import serializer_registry
 from fullctl.django.rest.fields import DynamicChoiceField
 from fullctl.django.rest.serializers import ModelSerializer, SlugSerializerMixin
 from fullctl.django.validators import validate_alphanumeric_list
-from fullctl.django.inet.validators import validate_as_set
+from fullctl.django.inet.validators import validate_as_set, validate_masklength_range
 from rest_framework import serializers
 
 import django_prefixctl.models as models
+from django_prefixctl.changesets import prefix_set_changeset
 from django_prefixctl.rest.serializers.monitor import (
     PREFIX_MONITOR_CLASSES,
 )
-from django_prefixctl.rest.views.monitor import list_monitors
+from django_prefixctl.rest.views.monitor import list_monitors, list_monitors_by
 
 Serializers, register = serializer_registry()
 
@@ -32,6 +44,64 @@ def validate_shared_instance(instance, **children):
             raise serializers.ValidationError({name: ["instance mismatch"]})
 
 
+class SparseFieldsMixin:
+    """
+    Lets clients request a subset of the serializer's fields.
+
+    The requested field names are passed in the serializer context as
+    `fields`, fields that are not requested are not serialized (`id` is
+    always included). Use `requested_fields` to read them from the
+    `fields=` or `view=summary` query parameters.
+    """
+
+    # fields returned for `view=summary`
+    summary_fields = []
+
+    @classmethod
+    def requested_fields(cls, query_params):
+        """
+        Returns the field names requested by the query parameters.
+
+        Arguments:
+        query_params: The request query parameters, `fields` is a comma
+        separated list of field names, `view=summary` requests the summary
+        fields. `fields` takes precedence.
+
+        Returns:
+        A set of field names, None if all fields are requested.
+        """
+        fields = {
+            name.strip()
+            for name in query_params.get("fields", "").split(",")
+            if name.strip()
+        }
+
+        if fields:
+            return fields
+
+        if query_params.get("view") == "summary":
+            return set(cls.summary_fields)
+
+        return None
+
+    @classmethod
+    def is_requested(cls, fields, name):
+        return fields is None or name in fields
+
+    def get_fields(self):
+        fields = super().get_fields()
+        requested = self.context.get("fields")
+
+        if requested is None:
+            return fields
+
+        return {
+            name: field
+            for name, field in fields.items()
+            if name in requested or name == "id"
+        }
+
+
 @register
 class Instance(ModelSerializer):
     class Meta:
@@ -39,6 +109,96 @@ class Instance(ModelSerializer):
         fields = []
 
 
+def prefix_values(queryset):
+    """
+    Serializes prefixes from `values_list` tuples, without instantiating
+    models or running the serializer fields for every row.
+
+    The output is the same as `Prefix(queryset, many=True).data`.
+
+    Arguments:
+    queryset: The Prefix queryset.
+
+    Returns:
+    A list of dicts.
+    """
+    # resolve the timezone once instead of for every value
+
+    datetime_repr = serializers.DateTimeField(
+        default_timezone=timezone.get_current_timezone() if settings.USE_TZ else None
+    ).to_representation
+
+    # the prefix is read as text, postgres formats ipv4 networks
+    # like the ipaddress module, ipv6 networks are normalized
+
+    rows = queryset.annotate(prefix_text=Cast("prefix", TextField())).values_list(
+        "prefix_set_id",
+        "prefix_text",
+        "mask_length_range",
+        "min_len",
+        "max_len",
+        "id",
+        "status",
+        "created",
+        "updated",
+        "prefix_set__instance__org__remote_id",
+        "prefix_set__instance__org_id",
+    )
+
+    return [
+        {
+            "prefix_set": prefix_set_id,
+            "prefix": f"{ipaddress.ip_network(prefix)}" if ":" in prefix else prefix,
+            "mask_length_range": mask_length_range,
+            "min_len": min_len,
+            "max_len": max_len,
+            # grainy namespace of models.Prefix, org.permission_id is the
+            # remote id if set
+            "grainy": f"prefix.{remote_id or org_id}.{prefix_set_id}.{id}",
+            "id": id,
+            "status": status,
+            "created": datetime_repr(created),
+            "updated": datetime_repr(updated),
+        }
+        for (
+            prefix_set_id,
+            prefix,
+            mask_length_range,
+            min_len,
+            max_len,
+            id,
+            status,
+            created,
+            updated,
+            remote_id,
+            org_id,
+        ) in rows.iterator(chunk_size=2000)
+    ]
+
+
+class PrefixListSerializer(serializers.ListSerializer):
+    """
+    Serializes unevaluated prefix querysets through `prefix_values`.
+
+    Nested under a PrefixSet the prefixes are taken from the `prefixes`
+    context (PrefixSet id -> serialized prefixes) if present, see
+    `PrefixSet.list_context`. Either way nested prefixes are ordered by
+    prefix. Lists of model instances are serialized the regular way.
+    """
+
+    def to_representation(self, data):
+        if isinstance(data, BaseManager):
+            prefixes = self.context.get("prefixes")
+            if prefixes is not None:
+                return prefixes.get(data.instance.pk, [])
+            data = data.all().order_by("prefix", "id")
+
+        if isinstance(data, QuerySet) and data._result_cache is None:
+            return prefix_values(data)
+
+        return super().to_representation(data)
+
+
 @register
 class Prefix(ModelSerializer):
     mask_length_range = serializers.CharField(
@@ -62,15 +222,18 @@ class Prefix(ModelSerializer):
 
     class Meta:
         model = models.Prefix
+        list_serializer_class = PrefixListSerializer
         fields = [
             "prefix_set",
             "prefix",
             "mask_length_range",
+            "min_len",
+            "max_len",
         ]
 
 
 @register
-class PrefixSet(SlugSerializerMixin, ModelSerializer):
+class PrefixSet(SparseFieldsMixin, SlugSerializerMixin, ModelSerializer):
     prefixes = Prefix(source="prefix_set", many=True, read_only=True)
     monitors = serializers.SerializerMethodField()
     instance = serializers.PrimaryKeyRelatedField(read_only=True)
@@ -108,12 +271,98 @@ class PrefixSet(SlugSerializerMixin, ModelSerializer):
             "irr_import",
             "irr_as_set",
             "irr_sources",
+            "irr_aggregate",
             "irr_import_status",
             "num_monitors",
             "num_prefixes",
             "ux_keep_list_open",
         ]
 
+    summary_fields = [
+        "instance",
+        "name",
+        "slug",
+        "description",
+        "irr_import",
+        "irr_as_set",
+        "irr_sources",
+        "irr_aggregate",
+        "num_prefixes",
+        "status",
+    ]
+
+    @classmethod
+    def prefetch(cls, queryset, fields=None):
+        """
+        Annotates and prefetches everything the serializer needs for a list
+        of PrefixSets, so they serialize in a constant number of queries.
+
+        Arguments:
+        queryset: The PrefixSet queryset.
+        fields: The requested fields (see `requested_fields`), nothing is
+        loaded for fields that are not requested.
+
+        Returns:
+        The prepared queryset.
+        """
+        prefix_count = (
+            models.Prefix.objects.filter(prefix_set=OuterRef("pk"))
+            .order_by()
+            .values("prefix_set")
+            .annotate(count=Count("id"))
+            .values("count")
+        )
+        latest_task_status = (
+            Task.objects.filter(
+                taskschedule=OuterRef("prefix_set_irr_importer__task_schedule")
+            )
+            .order_by("-created")
+            .values("status")[:1]
+        )
+
+        if cls.is_requested(fields, "irr_import_status"):
+            queryset = queryset.select_related(
+                "prefix_set_irr_importer__task_schedule"
+            ).annotate(irr_import_task_status=Subquery(latest_task_status))
+
+        if cls.is_requested(fields, "num_prefixes"):
+            queryset = queryset.annotate(
+                prefix_count=Coalesce(Subquery(prefix_count), 0)
+            )
+
+        return queryset
+
+    @classmethod
+    def list_context(cls, instance, prefix_sets, fields=None):
+        """
+        Loads the monitors and prefixes of all PrefixSets at once.
+
+        Arguments:
+        instance: The instance the PrefixSets belong to.
+        prefix_sets: The PrefixSets to serialize.
+        fields: The requested fields (see `requested_fields`).
+
+        Returns:
+        The serializer context.
+        """
+        context = {"fields": fields}
+
+        if cls.is_requested(fields, "monitors") or cls.is_requested(
+            fields, "num_monitors"
+        ):
+            context["monitors"] = list_monitors_by(instance, "prefix_set", prefix_sets)
+
+        if cls.is_requested(fields, "prefixes"):
+            context["prefixes"] = {prefix_set.id: [] for prefix_set in prefix_sets}
+            for prefix in prefix_values(
+                models.Prefix.objects.filter(prefix_set__in=prefix_sets).order_by(
+                    "prefix_set_id", "prefix", "id"
+                )
+            ):
+                context["prefixes"][prefix["prefix_set"]].append(prefix)
+
+        return context
+
     def get_num_monitors(self, obj):
         """
         Gets the number of monitors associated with the PrefixSet.
@@ -124,6 +373,9 @@ class PrefixSet(SlugSerializerMixin, ModelSerializer):
         Returns:
         The count of associated monitors.
         """
+        if "monitors" in self.context:
+            return len(self.get_monitors(obj))
+
         cnt = 0
         for moncls in PREFIX_MONITOR_CLASSES.values():
             cnt += moncls.Meta.model.objects.filter(prefix_set=obj).count()
@@ -139,6 +391,8 @@ class PrefixSet(SlugSerializerMixin, ModelSerializer):
         Returns:
         The count of associated prefixes.
         """
+        if hasattr(obj, "prefix_count"):
+            return obj.prefix_count
         return obj.prefix_set.count()
 
     def get_monitors(self, obj):
@@ -151,6 +405,8 @@ class PrefixSet(SlugSerializerMixin, ModelSerializer):
         Returns:
         A list of monitor instances associated with the PrefixSet.
         """
+        if "monitors" in self.context:
+            return self.context["monitors"].get(obj.id, [])
         return list_monitors(obj.instance, prefix_set=obj)
 
     def validate(self, data):
@@ -168,6 +424,32 @@ class PrefixSet(SlugSerializerMixin, ModelSerializer):
         return super().create(validated_data, **kwargs)
 
 
+class BulkPrefix(serializers.Serializer):
+
+    """
+    A prefix to add in bulk, either a prefix string or an object with
+    `prefix` and `mask_length_range`
+    """
+
+    prefix = serializers.CharField()
+    mask_length_range = serializers.CharField(
+        required=False,
+        allow_blank=True,
+        validators=[validate_masklength_range],
+    )
+
+    def to_internal_value(self, data):
+        if isinstance(data, str):
+            data = {"prefix": data}
+        return super().to_internal_value(data)
+
+    def validate_prefix(self, val):
+        try:
+            return f"{ipaddress.ip_network(val.strip())}"
+        except ValueError:
+            raise serializers.ValidationError(_("Invalid prefix: {}").format(val))
+
+
 @register
 class BulkCreatePrefixes(serializers.Serializer):
 
@@ -176,8 +458,11 @@ class BulkCreatePrefixes(serializers.Serializer):
     """
 
     prefixes = serializers.ListField(
-        child=serializers.CharField(),
-        help_text=_("List of prefixes to add"),
+        child=BulkPrefix(),
+        help_text=_(
+            "List of prefixes to add, either prefix strings or objects with "
+            "`prefix` and `mask_length_range`"
+        ),
     )
     prefix_set = serializers.PrimaryKeyRelatedField(
         queryset=models.PrefixSet.objects.all(),
@@ -189,10 +474,110 @@ class BulkCreatePrefixes(serializers.Serializer):
     class Meta:
         fields = ["prefixes", "prefix_set"]
 
+    def to_internal_value(self, data):
+        # the bulk add form splits its input on whitespace, ignore
+        # the blank entries that leaves
+
+        if isinstance(data.get("prefixes"), list):
+            data = data.copy()
+            data["prefixes"] = [
+                prefix
+                for prefix in data["prefixes"]
+                if not isinstance(prefix, str) or prefix.strip()
+            ]
+        return super().to_internal_value(data)
+
     def save(self):
+        """
+        Adds the prefixes to the prefix set with a single upsert on
+        (prefix_set, prefix).
+
+        Existing prefixes keep their mask length range unless one is
+        specified, new prefixes default to "exact".
+
+        Returns:
+        The Prefix queryset of all submitted prefixes.
+        """
         prefix_set = self.validated_data["prefix_set"]
-        for prefix in self.validated_data["prefixes"]:
-            models.Prefix.objects.get_or_create(prefix_set=prefix_set, prefix=prefix)
+
+        # prefix -> mask length range, None if not specified
+
+        prefixes = {}
+        for item in self.validated_data["prefixes"]:
+            mask_length_range = item.get("mask_length_range")
+            if mask_length_range is not None:
+                mask_length_range = mask_length_range or "exact"
+            if mask_length_range is not None or item["prefix"] not in prefixes:
+                prefixes[item["prefix"]] = mask_length_range
+
+        with transaction.atomic(), prefix_set_changeset(
+            prefix_set, "add_prefixes"
+        ) as changes:
+            existing = {
+                f"{prefix.prefix}": prefix
+                for prefix in prefix_set.prefix_set.filter(prefix__in=list(prefixes))
+            }
+
+            upsert = []
+            ids = set()
+
+            for prefix, mask_length_range in prefixes.items():
+                obj = existing.get(prefix)
+
+                if obj is not None:
+                    ids.add(obj.id)
+
+                if obj is None:
+                    mask_length_range = mask_length_range or "exact"
+                    changes["added"].append((prefix, mask_length_range))
+                elif obj.status == "ok" and mask_length_range in (
+                    None,
+                    obj.mask_length_range,
+                ):
+                    continue
+                else:
+                    mask_length_range = mask_length_range or obj.mask_length_range
+                    changes["updated"].append((prefix, mask_length_range))
+
+                obj = models.Prefix(
+                    prefix_set=prefix_set,
+                    prefix=prefix,
+                    mask_length_range=mask_length_range,
+                    status="ok",
+                )
+                # bulk_create does not call save()
+                obj.sync_mask_lengths()
+                upsert.append(obj)
+
+            # prefixes added concurrently are updated instead
+
+            models.Prefix.objects.bulk_create(
+                upsert,
+                batch_size=1000,
+                update_conflicts=True,
+                unique_fields=["prefix_set", "prefix"],
+                update_fields=[
+                    "mask_length_range",
+                    "min_len",
+                    "max_len",
+                    "status",
+                    "updated",
+                ],
+            )
+
+        # existing prefixes keep their id on upsert. New ones only get their
+        # id set by bulk_create on Django >= 5.0, fall back to looking up the
+        # prefixes that are still missing one
+
+        added = [obj for obj in upsert if f"{obj.prefix}" not in existing]
+        ids.update(obj.id for obj in added if obj.id is not None)
+        missing = [f"{obj.prefix}" for obj in added if obj.id is None]
+
+        query = Q(id__in=ids)
+        if missing:
+            query |= Q(prefix_set=prefix_set, prefix__in=missing)
+
+        return models.Prefix.objects.filter(query).order_by("prefix")
 
 
 @register
@@ -215,7 +600,7 @@ class ASN(ModelSerializer):
 
 
 @register
-class ASNSet(SlugSerializerMixin, ModelSerializer):
+class ASNSet(SparseFieldsMixin, SlugSerializerMixin, ModelSerializer):
     asns = ASN(source="asn_set", many=True, read_only=True)
     monitors = serializers.SerializerMethodField()
     instance = serializers.PrimaryKeyRelatedField(read_only=True)
@@ -231,7 +616,53 @@ class ASNSet(SlugSerializerMixin, ModelSerializer):
             "monitors",
         ]
 
+    summary_fields = [
+        "instance",
+        "name",
+        "slug",
+        "description",
+        "status",
+    ]
+
+    @classmethod
+    def prefetch(cls, queryset, fields=None):
+        """
+        Prefetches the ASNs of a list of ASNSets, if requested.
+
+        Arguments:
+        queryset: The ASNSet queryset.
+        fields: The requested fields (see `requested_fields`).
+
+        Returns:
+        The prepared queryset.
+        """
+        if cls.is_requested(fields, "asns"):
+            queryset = queryset.prefetch_related("asn_set")
+        return queryset
+
+    @classmethod
+    def list_context(cls, instance, asn_sets, fields=None):
+        """
+        Loads the monitors of all ASNSets at once, if requested.
+
+        Arguments:
+        instance: The instance the ASNSets belong to.
+        asn_sets: The ASNSets to serialize.
+        fields: The requested fields (see `requested_fields`).
+
+        Returns:
+        The serializer context.
+        """
+        context = {"fields": fields}
+
+        if cls.is_requested(fields, "monitors"):
+            context["monitors"] = list_monitors_by(instance, "asn_set", asn_sets)
+
+        return context
+
     def get_monitors(self, obj):
+        if "monitors" in self.context:
+            return self.context["monitors"].get(obj.id, [])
         return list_monitors(obj.instance, asn_set=obj)
 
     def create(self, validated_data, **kwargs):
@@ -262,6 +693,90 @@ class ASNSetMonitorSelector(serializers.Serializer):
         fields = ["id", "monitor_type"]
 
 
+@register
+class BulkDeletePrefixes(serializers.Serializer):
+
+    """
+    Allows removing of many prefixes at once
+    """
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=False,
+        help_text=_("Ids of the prefixes to remove"),
+    )
+    prefixes = serializers.ListField(
+        child=serializers.CharField(),
+        required=False,
+        help_text=_("Prefixes to remove"),
+    )
+    covering = serializers.CharField(
+        required=False,
+        help_text=_("Remove all prefixes covered by or equal to this prefix"),
+    )
+    prefix_set = serializers.PrimaryKeyRelatedField(
+        queryset=models.PrefixSet.objects.all(),
+        help_text=_("Prefix set to remove prefixes from"),
+    )
+
+    ref_tag = "bulk_delete_prefixes"
+
+    class Meta:
+        fields = ["ids", "prefixes", "covering", "prefix_set"]
+
+    def validate_prefixes(self, val):
+        try:
+            return [f"{ipaddress.ip_network(prefix.strip())}" for prefix in val]
+        except ValueError as exc:
+            raise serializers.ValidationError(f"{exc}")
+
+    def validate_covering(self, val):
+        try:
+            return ipaddress.ip_network(val.strip())
+        except ValueError as exc:
+            raise serializers.ValidationError(f"{exc}")
+
+    def validate(self, data):
+        if not any(data.get(name) for name in ["ids", "prefixes", "covering"]):
+            raise serializers.ValidationError(
+                _("Specify the ids, prefixes or covering prefix to remove")
+            )
+        return data
+
+    def save(self):
+        """
+        Removes the selected prefixes from the prefix set with a single
+        delete, recorded as one changeset revision.
+
+        Returns:
+        The removed prefixes, serialized.
+        """
+        prefix_set = self.validated_data["prefix_set"]
+
+        selector = Q(id__in=self.validated_data.get("ids", []))
+        selector |= Q(prefix__in=self.validated_data.get("prefixes", []))
+
+        if self.validated_data.get("covering"):
+            selector |= Q(
+                prefix__net_contained_or_equal=self.validated_data["covering"]
+            )
+
+        with transaction.atomic(), prefix_set_changeset(
+            prefix_set, "delete_prefixes"
+        ) as changes:
+            prefixes = prefix_set.prefix_set.filter(selector)
+            removed = prefix_values(
+                prefixes.select_for_update(of=("self",)).order_by("prefix")
+            )
+            prefixes.filter(id__in=[prefix["id"] for prefix in removed]).delete()
+
+            changes["removed"].extend(
+                (prefix["prefix"], prefix["mask_length_range"]) for prefix in removed
+            )
+
+        return removed
+
+
 @register
 class PrefixSetPrefixSelector(serializers.Serializer):
     id = serializers.IntegerField(help_text=_("Prefix id"))
@@ -311,3 +826,79 @@ class DeletePrefixSetsSerializer(serializers.Serializer):
 
     class Meta:
         fields = ["days"]
+
+
+@register
+class DeletePrefixSetsTask(ModelSerializer):
+    progress = serializers.JSONField(read_only=True)
+
+    class Meta:
+        model = models.DeletePrefixSetsTask
+        fields = ["op", "progress"]
+
+
+def encode_prefix_cursor(prefix):
+    """
+    Encodes the position after `prefix` in a (prefix, id) ordered
+    prefix listing into an opaque cursor.
+
+    Arguments:
+    prefix: The last serialized prefix of a page.
+
+    Returns:
+    The cursor (str).
+    """
+
+    data = json.dumps([prefix["prefix"], prefix["id"]]).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def decode_prefix_cursor(cursor):
+    """
+    Decodes a cursor created by `encode_prefix_cursor`.
+
+    Arguments:
+    cursor: The cursor (str).
+
+    Returns:
+    A (prefix, id) tuple.
+
+    Raises:
+    ValueError: If the cursor is not valid.
+    """
+
+    try:
+        data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        prefix, id = json.loads(data)
+        return ipaddress.ip_network(prefix), int(id)
+    except (TypeError, ValueError) as exc:
+        raise ValueError(f"Invalid cursor: {cursor}") from exc
+
+
+class PrefixPageSerializer(serializers.Serializer):
+    """
+    Validates the keyset pagination parameters of a prefix listing.
+    """
+
+    cursor = serializers.CharField(required=False, allow_blank=True)
+    limit = serializers.IntegerField(min_value=1, required=False)
+    count = serializers.BooleanField(required=False, default=False)
+
+    class Meta:
+        fields = ["cursor", "limit", "count"]
+
+    def validate_cursor(self, val):
+        if not val:
+            return None
+        try:
+            return decode_prefix_cursor(val)
+        except ValueError:
+            raise serializers.ValidationError(_("Invalid cursor"))
+
+    def validate_limit(self, val):
+        return min(val, settings.PREFIX_PAGE_SIZE_MAX)
+
+    def validate(self, data):
+        data.setdefault("cursor", None)
+        data.setdefault("limit", settings.PREFIX_PAGE_SIZE)
+        return data
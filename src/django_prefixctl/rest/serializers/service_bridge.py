@@ -27,6 +27,8 @@ class Prefix(ModelSerializer):
         fields = [
             "prefix",
             "mask_length_range",
+            "min_len",
+            "max_len",
         ]
 
 
@@ -131,6 +131,50 @@ def list_monitors(instance, types: list[str] = None, **filters) -> list[dict]:
     return monitors
 
 
+def list_monitors_by(instance, field: str, objects, types: list[str] = None) -> dict:
+    """
+    Returns the monitors of many objects at once, using one query
+    per monitor type instead of one per monitor type and object
+
+    Arguments:
+
+    instance - the organization instance to list monitors for
+    field - the monitor field that references the objects (e.g. "prefix_set")
+    objects - the objects to list monitors for
+    types - a list of monitor types to filter on (monitor handle ref tag)
+
+    Returns:
+
+    A dict mapping object id to its list of monitors. Monitor types that
+    do not have `field` are skipped.
+    """
+
+    ids = [obj.id for obj in objects]
+    monitors = {id: [] for id in ids}
+
+    if not ids:
+        return monitors
+
+    for typ, serializer_class in MONITOR_CLASSES.items():
+        if types and typ not in types:
+            continue
+
+        qset = serializer_class.Meta.model.objects.filter(instance=instance)
+
+        try:
+            qset = list(qset.filter(**{f"{field}__in": ids}))
+        except FieldError:
+            # invalid monitor type for filter
+            continue
+
+        serializer = serializer_class(qset, many=True)
+
+        for monitor, data in zip(qset, serializer.data):
+            monitors[getattr(monitor, f"{field}_id")].append(data)
+
+    return monitors
+
+
 @route
 class Monitor(viewsets.GenericViewSet):
     schema = MonitorSchema()
@@ -207,5 +251,5 @@ class Monitor(viewsets.GenericViewSet):
         """
         Remove a monitor for a given organization instance
         """
-        
+
         return remove_monitor(request, instance, request.data)
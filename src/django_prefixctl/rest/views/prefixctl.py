@@ -5,6 +5,7 @@ from fullctl.django.rest.core import BadRequest
 from fullctl.django.rest.decorators import load_object
 from fullctl.django.rest.mixins import CachedObjectMixin, SlugObjectMixin
 from fullctl.django.models import Instance, Organization
+from fullctl.django.models.concrete.tasks import TaskLimitError
 from rest_framework import viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
@@ -17,7 +18,12 @@ from django_prefixctl.rest.api_schema import ASNSetSchema, PrefixSetSchema
 from django_prefixctl.rest.decorators import grainy_endpoint
 from django_prefixctl.rest.route.prefixctl import route
 from django_prefixctl.rest.serializers.monitor import Serializers as MonitorSerializers
-from django_prefixctl.rest.serializers.prefixctl import Serializers, DeletePrefixSetsSerializer
+from django_prefixctl.rest.serializers.prefixctl import (
+    DeletePrefixSetsSerializer,
+    PrefixPageSerializer,
+    Serializers,
+    encode_prefix_cursor,
+)
 from django_prefixctl.rest.views.monitor import (
     add_monitor,
     list_monitors,
@@ -25,6 +31,72 @@ from django_prefixctl.rest.views.monitor import (
 )
 
 
+def serialize_list(serializer_class, request, instance, queryset):
+    """
+    Serializes a list of PrefixSets or ASNSets in a constant number of queries,
+    limited to the fields requested through the `fields` or `view` query
+    parameters.
+
+    Arguments:
+    - serializer_class: The PrefixSet or ASNSet serializer class.
+    - request: The HTTP request object.
+    - instance: The instance associated with the objects.
+    - queryset: The objects to serialize.
+    """
+    fields = serializer_class.requested_fields(request.query_params)
+    objects = list(serializer_class.prefetch(queryset, fields))
+    context = serializer_class.list_context(instance, objects, fields)
+    return serializer_class(objects, many=True, context=context).data
+
+
+def paginate_prefixes(request, prefixes):
+    """
+    Returns one page of prefixes using keyset pagination on (prefix, id),
+    so every page is served in constant time no matter how deep into the
+    listing it is.
+
+    The `cursor` of the next page is returned in the `X-Next-Cursor` and
+    `Link` headers, it is absent on the last page. If `count` is passed
+    the total number of prefixes is returned in the `X-Total-Count` header.
+
+    Arguments:
+    - request: The HTTP request object with the `cursor`, `limit` and
+      `count` query parameters.
+    - prefixes: The Prefix queryset to page through.
+    """
+    page = PrefixPageSerializer(data=request.query_params)
+
+    if not page.is_valid():
+        return BadRequest(page.errors)
+
+    cursor = page.validated_data["cursor"]
+    limit = page.validated_data["limit"]
+    headers = {}
+
+    if page.validated_data["count"]:
+        headers["X-Total-Count"] = f"{prefixes.count()}"
+
+    if cursor:
+        prefixes = prefixes.after(*cursor)
+    else:
+        prefixes = prefixes.order_by("prefix", "id")
+
+    # fetch one extra row to know if there is a next page
+
+    rows = Serializers.prefix(prefixes[: limit + 1], many=True).data
+
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_prefix_cursor(rows[-1])
+        query = request.query_params.copy()
+        query["cursor"] = next_cursor
+        url = request.build_absolute_uri(f"{request.path}?{query.urlencode()}")
+        headers["X-Next-Cursor"] = next_cursor
+        headers["Link"] = f'<{url}>; rel="next"'
+
+    return Response(rows, headers=headers)
+
+
 @route
 class PrefixSet(CachedObjectMixin, SlugObjectMixin, viewsets.GenericViewSet):
     """
@@ -69,7 +141,11 @@ class PrefixSet(CachedObjectMixin, SlugObjectMixin, viewsets.GenericViewSet):
     @grainy_endpoint(namespace="prefix_set.{request.org.permission_id}")
     def search_prefix(self, request, org, instance, *args, **kwargs):
         """
-        Searches for a prefix based on the provided query parameter.
+        Searches the prefixes of the instance's PrefixSets.
+
+        Addresses and prefixes return the covering prefixes longest match
+        first, followed by the prefixes they cover. Other queries are
+        matched as a substring of the prefix, see `PrefixQuerySet.search`.
 
         Arguments:
         - request: The HTTP request object, containing the query parameter 'q'.
@@ -79,7 +155,9 @@ class PrefixSet(CachedObjectMixin, SlugObjectMixin, viewsets.GenericViewSet):
         - kwargs: Additional keyword arguments.
         """
         search_term = request.query_params.get("q", "")
-        prefixes = models.Prefix.objects.filter(prefix__contains=search_term)
+        prefixes = models.Prefix.objects.filter(prefix_set__instance=instance).search(
+            search_term
+        )
 
         serializer = Serializers.prefix(prefixes, many=True)
         return Response(serializer.data)
@@ -103,8 +181,9 @@ class PrefixSet(CachedObjectMixin, SlugObjectMixin, viewsets.GenericViewSet):
         search_term = request.query_params.get("q", "")
         prefixsets = instance.prefix_set_set.filter(name__icontains=search_term)
 
-        serializer = Serializers.prefix_set(prefixsets, many=True)
-        return Response(serializer.data)
+        return Response(
+            serialize_list(self.serializer_class, request, instance, prefixsets)
+        )
 
     @grainy_endpoint(namespace="prefix_set.{request.org.permission_id}")
     def list(self, request, org, instance, *args, **kwargs):
@@ -118,10 +197,10 @@ class PrefixSet(CachedObjectMixin, SlugObjectMixin, viewsets.GenericViewSet):
         - args: Additional positional arguments.
         - kwargs: Additional keyword arguments.
         """
-        serializer = Serializers.prefix_set(
-            instance.prefix_set_set.all().order_by("-created"), many=True
+        prefix_sets = instance.prefix_set_set.all().order_by("-created")
+        return Response(
+            serialize_list(self.serializer_class, request, instance, prefix_sets)
         )
-        return Response(serializer.data)
 
     @grainy_endpoint(namespace="prefix_set.{request.org.permission_id}")
     def retrieve(self, request, org, instance, pk=None, *args, **kwargs):
@@ -137,7 +216,8 @@ class PrefixSet(CachedObjectMixin, SlugObjectMixin, viewsets.GenericViewSet):
         - kwargs: Additional keyword arguments.
         """
         prefix_set = self.get_object()
-        serializer = self.serializer_class(prefix_set)
+        fields = self.serializer_class.requested_fields(request.query_params)
+        serializer = self.serializer_class(prefix_set, context={"fields": fields})
         return Response(serializer.data)
 
     @grainy_endpoint(namespace="prefix_set.{request.org.permission_id}")
@@ -268,9 +348,27 @@ class PrefixSet(CachedObjectMixin, SlugObjectMixin, viewsets.GenericViewSet):
     @action(detail=True, methods=["GET"])
     @grainy_endpoint(namespace="prefix_set.{request.org.permission_id}")
     def prefixes(self, request, org, instance, pk=None, *args, **kwargs):
+        """
+        Lists the prefixes of a PrefixSet.
+
+        If `limit` or `cursor` are passed the prefixes are paged through
+        ordered on (prefix, id), see `paginate_prefixes`.
+
+        Arguments:
+        - request: The HTTP request object.
+        - org: The organization object.
+        - instance: The instance associated with the PrefixSet.
+        - pk: The primary key of the PrefixSet.
+        - args: Additional positional arguments.
+        - kwargs: Additional keyword arguments.
+        """
         prefix_set = self.get_object()
+        prefixes = prefix_set.prefix_set.all()
+
+        if "limit" in request.query_params or "cursor" in request.query_params:
+            return paginate_prefixes(request, prefixes)
 
-        serializer = Serializers.prefix(prefix_set.prefix_set.all(), many=True)
+        serializer = Serializers.prefix(prefixes, many=True)
         return Response(serializer.data)
 
     @action(detail=True, methods=["POST"], serializer_class=Serializers.prefix)
@@ -326,6 +424,38 @@ class PrefixSet(CachedObjectMixin, SlugObjectMixin, viewsets.GenericViewSet):
 
         return response
 
+    @action(
+        detail=True,
+        methods=["DELETE"],
+        serializer_class=Serializers.bulk_delete_prefixes,
+    )
+    @grainy_endpoint(namespace="prefix_set.{request.org.permission_id}")
+    def delete_prefixes(self, request, org, instance, pk=None, *args, **kwargs):
+        """
+        Deletes multiple prefixes from a PrefixSet, selected by id, by
+        prefix or by a covering prefix.
+
+        Arguments:
+        - request: The HTTP request object containing the prefix selection.
+        - org: The organization object.
+        - instance: The instance associated with the PrefixSet.
+        - pk: The primary key of the PrefixSet from which the prefixes will be deleted.
+        - args: Additional positional arguments.
+        - kwargs: Additional keyword arguments.
+        """
+
+        # request.data is an immutable QueryDict for form encoded requests
+
+        data = request.data.copy()
+        data["prefix_set"] = self.get_object().id
+
+        serializer = Serializers.bulk_delete_prefixes(data=data)
+
+        if not serializer.is_valid():
+            return BadRequest(serializer.errors)
+
+        return Response(serializer.save())
+
     
     @action(
         detail=False,
@@ -336,6 +466,9 @@ class PrefixSet(CachedObjectMixin, SlugObjectMixin, viewsets.GenericViewSet):
         """
         Delete all prefixSets older than the given days.
 
+        The deletion runs in the background, the response is the task
+        handle, see `delete_prefixsets_status`.
+
         Arguments:
         - request: The HTTP request object.
         - org: The organization object.
@@ -347,15 +480,57 @@ class PrefixSet(CachedObjectMixin, SlugObjectMixin, viewsets.GenericViewSet):
         if serializer.is_valid():
             days = serializer.validated_data['days']
             cutoff_date = timezone.now() - timedelta(days=days)
-            org_prefix_sets = instance.prefix_set_set.filter(created__lt=cutoff_date)
-
-            for prefix_set in org_prefix_sets:
-                prefix_set.delete()
 
-            return Response({"success": True})
+            # prefix sets are deleted in batches by a background task
+
+            try:
+                task = models.DeletePrefixSetsTask.create_task(
+                    instance.id,
+                    cutoff_date.isoformat(),
+                    org=org,
+                    user=request.user,
+                )
+            except TaskLimitError:
+                return BadRequest(
+                    {"non_field_errors": ["Prefix sets are already being deleted"]}
+                )
+
+            return Response(Serializers.task_delete_prefixsets(task).data)
         else:
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(
+        detail=False,
+        methods=["GET"],
+    )
+    @grainy_endpoint(namespace="prefix_set.{request.org.permission_id}")
+    def delete_prefixsets_status(self, request, org, instance, *args, **kwargs):
+        """
+        Returns the status and progress of a delete_prefixsets task.
+
+        Arguments:
+        - request: The HTTP request object, containing the task id in 'task'.
+        - org: The organization object.
+        - instance: The instance associated with the PrefixSets.
+        - args: Additional positional arguments.
+        - kwargs: Additional keyword arguments.
+        """
+        task_id = request.query_params.get("task", "")
+
+        task = None
+        if task_id.isdigit():
+            task = models.DeletePrefixSetsTask.objects.filter(
+                op=models.DeletePrefixSetsTask.HandleRef.tag,
+                org=org,
+                limit_id=instance.id,
+                id=task_id,
+            ).first()
+
+        if not task:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+
+        return Response(Serializers.task_delete_prefixsets(task).data)
+
 
     @action(
         detail=True, methods=["POST"], serializer_class=Serializers.bulk_create_prefixes
@@ -374,7 +549,9 @@ class PrefixSet(CachedObjectMixin, SlugObjectMixin, viewsets.GenericViewSet):
         - kwargs: Additional keyword arguments.
         """
 
-        data = request.data
+        # request.data is an immutable QueryDict for form encoded requests
+
+        data = request.data.copy()
         data["prefix_set"] = self.get_object().id
 
         serializer = Serializers.bulk_create_prefixes(data=data)
@@ -436,8 +613,10 @@ class ASNSet(CachedObjectMixin, SlugObjectMixin, viewsets.GenericViewSet):
         - args: Additional positional arguments.
         - kwargs: Additional keyword arguments.
         """
-        serializer = Serializers.asn_set(instance.asn_set_set.all(), many=True)
-        return Response(serializer.data)
+        asn_sets = instance.asn_set_set.all()
+        return Response(
+            serialize_list(self.serializer_class, request, instance, asn_sets)
+        )
 
     @grainy_endpoint(namespace="asn_set.{request.org.permission_id}")
     def retrieve(self, request, org, instance, pk=None, *args, **kwargs):
@@ -453,7 +632,8 @@ class ASNSet(CachedObjectMixin, SlugObjectMixin, viewsets.GenericViewSet):
         - kwargs: Additional keyword arguments.
         """
         asn_set = self.get_object()
-        serializer = self.serializer_class(asn_set)
+        fields = self.serializer_class.requested_fields(request.query_params)
+        serializer = self.serializer_class(asn_set, context={"fields": fields})
         return Response(serializer.data)
 
     @grainy_endpoint(namespace="asn_set.{request.org.permission_id}")
@@ -0,0 +1,342 @@
+"""
+In-process IRR expansion from RPSL dump files
+
+Loads route, route6 and as-set objects from RPSL database
+dumps (as published by the IRR databases, optionally gzipped) into
+in-memory indexes and expands AS-SETs into their prefixes without
+querying an IRR server.
+"""
+
+import gzip
+import os
+import re
+import threading
+
+import structlog
+
+__all__ = [
+    "RpslDatabase",
+    "get_database",
+    "parse_rpsl",
+]
+
+log = structlog.get_logger("django")
+
+# object classes the database keeps
+OBJECT_CLASSES = ("route", "route6", "as-set")
+
+# route object class -> address family
+ROUTE_CLASSES = {"route": 4, "route6": 6}
+
+RE_ASN = re.compile(r"^AS(\d+)$", re.IGNORECASE)
+
+
+def parse_asn(value):
+    """
+    Returns the ASN (int) for an AS number like "AS65000",
+    None if `value` is not an AS number
+    """
+
+    match = RE_ASN.match(value)
+    if match:
+        return int(match.group(1))
+    return None
+
+
+def open_dump(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", errors="replace")
+    return open(path, encoding="utf-8", errors="replace")
+
+
+def parse_rpsl(stream, object_classes=None):
+    """
+    Parses RPSL objects from a text stream
+
+    Comment lines (`#`, `%`), end of line comments and continuation
+    lines (starting with whitespace or `+`) are handled. Attribute
+    names are lower cased.
+
+    Arguments:
+    - stream: text stream of RPSL objects separated by blank lines
+    - object_classes: only yield objects of these classes (optional)
+
+    Yields:
+    - `dict` of attribute name -> list of values, the first attribute
+      (the object class) is available as `obj["class"]`
+    """
+
+    obj = None
+    last = None
+
+    def finish(obj):
+        if obj and (not object_classes or obj["class"] in object_classes):
+            return obj
+        return None
+
+    for line in stream:
+        line = line.rstrip("\r\n")
+
+        if not line.strip():
+            obj = finish(obj)
+            if obj:
+                yield obj
+            obj = None
+            last = None
+            continue
+
+        if line[0] in "#%":
+            continue
+
+        value = line.split("#", 1)[0]
+
+        if line[0] in " \t+":
+            # continuation of the previous attribute
+            if last:
+                obj[last][-1] = f"{obj[last][-1]} {value[1:].strip()}".strip()
+            continue
+
+        if ":" not in value:
+            continue
+
+        key, value = value.split(":", 1)
+        key = key.strip().lower()
+
+        if obj is None:
+            obj = {"class": key}
+
+        obj.setdefault(key, []).append(value.strip())
+        last = key
+
+    obj = finish(obj)
+    if obj:
+        yield obj
+
+
+class RpslDatabase:
+
+    """
+    In-memory IRR database indexed for AS-SET expansion
+
+    Indexes:
+    - routes: (source, origin asn, address family) -> set of prefixes
+    - as_sets: as-set name -> {source: [members]}
+    """
+
+    def __init__(self):
+        self.routes = {}
+        self.as_sets = {}
+        self.sources = []
+
+        # (as_set, sources) -> set of asns
+        self._resolved = {}
+        self._lock = threading.Lock()
+
+    def load_file(self, path, default_source=None):
+        """
+        Loads an RPSL dump file (optionally gzipped)
+
+        Objects without a `source` attribute are attributed to
+        `default_source`, which defaults to the upper cased file name
+        up to the first dot (e.g. "RIPE" for "ripe.db.route.gz").
+        """
+
+        if not default_source:
+            default_source = os.path.basename(path).split(".")[0].upper()
+
+        with open_dump(path) as stream:
+            count = self.load(stream, default_source)
+
+        log.info("loaded rpsl dump", path=path, objects=count)
+        return count
+
+    def load(self, stream, default_source=None):
+        """
+        Loads RPSL objects from a text stream
+
+        Returns:
+        - number of objects loaded
+        """
+
+        count = 0
+
+        for obj in parse_rpsl(stream, OBJECT_CLASSES):
+            source = (obj.get("source") or [default_source or ""])[0].upper()
+
+            if source not in self.sources:
+                self.sources.append(source)
+
+            typ = obj["class"]
+            name = obj[typ][0]
+
+            if typ in ROUTE_CLASSES:
+                for origin in obj.get("origin", []):
+                    asn = parse_asn(origin)
+                    if asn is not None:
+                        key = (source, asn, ROUTE_CLASSES[typ])
+                        self.routes.setdefault(key, set()).add(name)
+            elif typ == "as-set":
+                members = []
+                for value in obj.get("members", []):
+                    members.extend(
+                        member.strip().upper()
+                        for member in value.replace(",", " ").split()
+                    )
+                self.as_sets.setdefault(name.upper(), {})[source] = members
+
+            count += 1
+
+        self._resolved = {}
+        return count
+
+    def source_list(self, sources=None):
+        """
+        Returns the sources to query, in order of preference
+
+        Arguments:
+        - sources: comma separated source names (`bgpq4 -S` semantics),
+          all loaded sources if not specified
+        """
+
+        if not sources:
+            return list(self.sources)
+
+        return [
+            source.strip().upper() for source in sources.split(",") if source.strip()
+        ]
+
+    def resolve_as_set(self, as_set, sources=None):
+        """
+        Resolves an AS-SET to the ASNs it contains, following nested
+        AS-SETs
+
+        Nested AS-SETs are looked up in the first source (in order of
+        preference) that defines them. Cycles are followed only once
+        and results are memoized per (as_set, sources).
+
+        Arguments:
+        - as_set: AS-SET name or AS number
+        - sources: comma separated source names (optional)
+
+        Returns:
+        - set of ASNs (int)
+        """
+
+        as_set = as_set.strip().upper()
+        source_list = self.source_list(sources)
+        key = (as_set, tuple(source_list))
+
+        with self._lock:
+            if key in self._resolved:
+                return self._resolved[key]
+
+        asns = set()
+        visited = set()
+        stack = [as_set]
+
+        while stack:
+            name = stack.pop()
+
+            if name in visited:
+                continue
+            visited.add(name)
+
+            asn = parse_asn(name)
+            if asn is not None:
+                asns.add(asn)
+                continue
+
+            definitions = self.as_sets.get(name, {})
+            for source in source_list:
+                if source in definitions:
+                    stack.extend(definitions[source])
+                    break
+            else:
+                log.debug("as-set not found", as_set=name, sources=source_list)
+
+        with self._lock:
+            self._resolved[key] = asns
+
+        return asns
+
+    def expand(self, as_set, sources=None, address_family=4):
+        """
+        Expands an AS-SET into the prefixes of the route (ipv4) or
+        route6 (ipv6) objects originated by its ASNs
+
+        Arguments:
+        - as_set: AS-SET name or AS number
+        - sources: comma separated source names (optional)
+        - address_family: 4 or 6 (`bgpq4 -6` semantics)
+
+        Returns:
+        - dict of prefix (str) -> mask length range (str), every
+          prefix is "exact" like the bgpq4 json output
+        """
+
+        if address_family not in ROUTE_CLASSES.values():
+            raise ValueError(f"Invalid address family: {address_family}")
+
+        source_list = self.source_list(sources)
+        prefixes = {}
+
+        for asn in self.resolve_as_set(as_set, sources):
+            for source in source_list:
+                for prefix in self.routes.get((source, asn, address_family), ()):
+                    prefixes[prefix] = "exact"
+
+        return prefixes
+
+
+# loaded database and the dump file state it was loaded from
+_database = None
+_database_state = None
+_database_lock = threading.Lock()
+
+
+def dump_files(paths):
+    """
+    Returns the dump files for the configured paths, directories
+    are expanded to the files they contain
+    """
+
+    files = []
+
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(
+                os.path.join(path, name)
+                for name in sorted(os.listdir(path))
+                if os.path.isfile(os.path.join(path, name))
+            )
+        else:
+            files.append(path)
+
+    return files
+
+
+def get_database(paths):
+    """
+    Returns the RPSL database for the dump files at `paths`
+
+    The database is loaded once per process and reloaded when
+    the dump files change.
+
+    Arguments:
+    - paths: list of dump files or directories containing dump files
+    """
+
+    global _database, _database_state
+
+    files = dump_files(paths)
+    state = [(path, os.path.getmtime(path), os.path.getsize(path)) for path in files]
+
+    with _database_lock:
+        if _database is None or state != _database_state:
+            database = RpslDatabase()
+            for path in files:
+                database.load_file(path)
+            _database = database
+            _database_state = state
+
+        return _database
@@ -0,0 +1,151 @@
+"""
+Load-spread task scheduling
+
+Recurring task schedules (IRR imports, monitors) run every `interval`
+seconds. If their first run is simply "now", objects created together -
+or backfilled after a deploy - fire in the same minute on every cycle.
+
+Each schedule instead gets a deterministic phase offset inside its
+interval derived from a stable key, so schedules are spread evenly over
+the interval and an object keeps the same slot across cycles. On top of
+that no more than `TASK_SCHEDULE_RATE_LIMIT` schedules are placed into
+the same `TASK_SCHEDULE_RATE_WINDOW`.
+
+The rate limit is checked against the schedules in the database, so
+placing a schedule and writing it needs to happen under `schedule_lock`.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import datetime
+import hashlib
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from fullctl.django.models.concrete.tasks import TaskSchedule
+
+__all__ = [
+    "next_phase",
+    "phased_schedule",
+    "rate_limited_schedule",
+    "schedule_lock",
+    "schedule_phase",
+]
+
+# postgres advisory lock key held while task schedules are placed
+SCHEDULE_LOCK_KEY = int.from_bytes(
+    hashlib.sha256(b"django_prefixctl.schedule").digest()[:8], "big", signed=True
+)
+
+
+@contextlib.contextmanager
+def schedule_lock():
+    """
+    Opens a transaction holding the task schedule advisory lock
+
+    Concurrent writers would otherwise both see the same free capacity
+    in a window and exceed the rate limit. The rate limit check and the
+    write of the schedule both need to happen inside the block.
+    """
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", [SCHEDULE_LOCK_KEY])
+        yield
+
+
+def schedule_phase(key: str, interval: int) -> int:
+    """
+    Returns the deterministic phase offset (seconds) of `key`
+    inside `interval`
+    """
+
+    if interval <= 1:
+        return 0
+
+    digest = hashlib.sha256(f"{key}".encode()).digest()
+    return int.from_bytes(digest[:8], "big") % interval
+
+
+def next_phase(key: str, interval: int, after: datetime.datetime | None = None):
+    """
+    Returns the first point in time at or after `after` (defaults to now)
+    that falls on the phase of `key`
+
+    Phases are anchored to the unix epoch, so the same key and interval
+    always map to the same slots no matter when the schedule is created.
+    """
+
+    if after is None:
+        after = timezone.now()
+
+    if interval <= 1:
+        return after
+
+    timestamp = after.timestamp()
+    phase = schedule_phase(key, interval)
+    wait = (phase - timestamp) % interval
+
+    return after + datetime.timedelta(seconds=wait)
+
+
+def rate_limited_schedule(schedule: datetime.datetime, horizon: int | None = None):
+    """
+    Moves `schedule` to the first `TASK_SCHEDULE_RATE_WINDOW` that has
+    fewer than `TASK_SCHEDULE_RATE_LIMIT` active task schedules in it
+
+    Only windows up to `horizon` seconds after `schedule` are considered,
+    if all of them are full `schedule` is returned unchanged.
+
+    Call this inside `schedule_lock` and write the result before leaving it.
+    """
+
+    limit = settings.TASK_SCHEDULE_RATE_LIMIT
+    window = settings.TASK_SCHEDULE_RATE_WINDOW
+
+    if limit <= 0 or window <= 0:
+        return schedule
+
+    if horizon is None:
+        horizon = window * 60
+
+    # number of active schedules per window, counted from `schedule`
+
+    counts = {}
+
+    for other in TaskSchedule.objects.filter(
+        status="ok",
+        schedule__gte=schedule,
+        schedule__lt=schedule + datetime.timedelta(seconds=horizon),
+    ).values_list("schedule", flat=True):
+        index = int((other - schedule).total_seconds() // window)
+        counts[index] = counts.get(index, 0) + 1
+
+    for index in range(max(horizon // window, 1)):
+        if counts.get(index, 0) < limit:
+            return schedule + datetime.timedelta(seconds=index * window)
+
+    return schedule
+
+
+def phased_schedule(key: str, interval: int, after: datetime.datetime | None = None):
+    """
+    Returns the next run for a recurring schedule identified by `key`
+
+    The run falls on the phase of `key` (see `next_phase`) and is moved
+    to a later window if the rate limit is reached, all within one
+    `interval`.
+
+    If `TASK_SCHEDULE_JITTER` is disabled `after` (defaults to now) is
+    returned.
+    """
+
+    if after is None:
+        after = timezone.now()
+
+    if not settings.TASK_SCHEDULE_JITTER:
+        return after
+
+    return rate_limited_schedule(next_phase(key, interval, after), interval)
@@ -1,8 +1,11 @@
-from django.db.models.signals import post_save, pre_delete
+from django.db.models.signals import post_init, post_save, pre_delete
 from django.dispatch import receiver
+from django.utils import timezone
+from fullctl.django.models.concrete.tasks import TaskSchedule
 
 
 from django_prefixctl.models import PrefixSet, PrefixSetIRRImporter
+from django_prefixctl.models.prefixctl import Monitor
 
 
 @receiver(post_save, sender=PrefixSet)
@@ -51,3 +54,52 @@ def prefix_set_pre_delete(sender, **kwargs):
         prefix_set.prefix_set_irr_importer.delete()
     except PrefixSetIRRImporter.DoesNotExist:
         pass
+
+
+@receiver(post_init, sender=TaskSchedule)
+def task_schedule_post_init(sender, **kwargs):
+    """
+    Signal receiver for post-init actions on a TaskSchedule.
+
+    Remembers the next run the task schedule was loaded with, see
+    `task_schedule_post_save`.
+
+    Arguments:
+    sender: The model class that sent the signal.
+    kwargs: Keyword arguments including 'instance' of the TaskSchedule.
+    """
+    task_schedule = kwargs.get("instance")
+    task_schedule._loaded_schedule = task_schedule.__dict__.get("schedule")
+
+
+@receiver(post_save, sender=TaskSchedule)
+def task_schedule_post_save(sender, **kwargs):
+    """
+    Signal receiver for post-save actions on a TaskSchedule.
+
+    After a due task schedule has run, fullctl moves its next run to now +
+    interval, which drifts monitors off the phase they were spread onto. If
+    the task schedule belongs to a monitor its next run is moved back onto
+    the monitor's phase.
+
+    Arguments:
+    sender: The model class that sent the signal.
+    kwargs: Keyword arguments including 'instance' of the TaskSchedule.
+    """
+    task_schedule = kwargs.get("instance")
+    loaded_schedule = getattr(task_schedule, "_loaded_schedule", None)
+    task_schedule._loaded_schedule = task_schedule.schedule
+
+    if kwargs.get("created") or not task_schedule.repeat or not loaded_schedule:
+        return
+
+    # only a due schedule that was moved forward has been rescheduled
+
+    if loaded_schedule > timezone.now() or task_schedule.schedule <= loaded_schedule:
+        return
+
+    monitor = Monitor.for_task_schedule(task_schedule)
+
+    if monitor:
+        task_schedule.schedule = monitor.realign_task_schedule()
+        task_schedule._loaded_schedule = task_schedule.schedule
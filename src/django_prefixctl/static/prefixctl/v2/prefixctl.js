@@ -849,7 +849,23 @@ $ctl.application.Prefixctl.RemovePrefixSets = $tc.extend(
         "api-write:success",
         function(event, endpoint, payload, response) {
           var list = $ctl.prefixctl.$t.prefix_sets.$w.list;
-          list.load()
+          var status = new twentyc.rest.Client(form.element.data("api-status"));
+          var task = response.first();
+
+          // prefix sets are deleted by a background task, reload
+          // the list once it is done
+          var poll = () => {
+            status.get(null, {task: task.id}).then((response) => {
+              var task = response.first();
+              if(task.status == "pending" || task.status == "running") {
+                setTimeout(poll, 2000);
+              } else {
+                list.load();
+              }
+            });
+          };
+
+          poll();
           modal.hide();
         }
       );
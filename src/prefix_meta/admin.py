@@ -7,7 +7,7 @@ from pygments import highlight
 from pygments.formatters import HtmlFormatter
 from pygments.lexers import JsonLexer
 
-from prefix_meta.models import Data, DataSubnet, Request, Response
+from prefix_meta.models import Data, DataSubnet, Request, Response, Throttle
 
 
 class PrefixMetaResponseInline(admin.TabularInline):
@@ -76,3 +76,9 @@ class PrefixMetaDataAdmin(BaseAdmin):
             highlight("{}", JsonLexer(), HtmlFormatter(style="colorful")),
             json.dumps(obj.data, indent=4, sort_keys=True),
         )
+
+
+@admin.register(Throttle)
+class PrefixMetaThrottleAdmin(admin.ModelAdmin):
+    list_display = ["source", "next_request", "throttled", "updated"]
+    readonly_fields = ["throttled", "updated"]
@@ -0,0 +1,237 @@
+"""
+Concurrent prefix enrichment
+
+Requests meta data for a set of prefixes from all configured
+sources at once, so a full prefix report takes as long as the
+slowest source rather than the sum of all sources.
+"""
+
+import ipaddress
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import structlog
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import connection
+
+from prefix_meta.sources import IP2Location
+from prefix_meta.sources.irr_explorer import IRRExplorerRequest
+from prefix_meta.sources.ripestat import (
+    RIR,
+    HistoricalWhois,
+    RIRStatsCountry,
+    RoutingStatus,
+)
+from prefix_meta.sources.rir import RdapRequest
+
+__all__ = [
+    "ENRICH_SOURCES",
+    "enrich",
+    "enrich_sources",
+]
+
+logger = structlog.get_logger(__name__)
+
+# source name -> request class
+ENRICH_SOURCES = {
+    request_cls.Config.source_name: request_cls
+    for request_cls in [
+        RoutingStatus,
+        RIR,
+        RIRStatsCountry,
+        HistoricalWhois,
+        RdapRequest,
+        IRRExplorerRequest,
+        IP2Location,
+    ]
+}
+
+# while sources are waiting for a free worker, poll this often (seconds)
+# so their timeout is enforced from the moment they start
+POLL_INTERVAL = 0.1
+
+
+def enrich_sources(sources=None):
+    """
+    Returns the request classes for the specified source names
+
+    If no sources are specified the `ENRICH_SOURCES` setting is used,
+    if that is empty as well all available sources are returned
+    (ip2location only if an api key is configured).
+
+    Arguments:
+    - sources (`list`): source names
+
+    Returns:
+    - `dict`: source name -> request class
+    """
+
+    if not sources:
+        sources = [s.strip() for s in settings.ENRICH_SOURCES.split(",") if s.strip()]
+
+    if not sources:
+        sources = [
+            name
+            for name in ENRICH_SOURCES
+            if name != "ip2location" or settings.IP2LOCATION_API_KEY
+        ]
+
+    unknown = [name for name in sources if name not in ENRICH_SOURCES]
+
+    if unknown:
+        raise ValueError(f"Unknown enrich sources: {', '.join(unknown)}")
+
+    return {name: ENRICH_SOURCES[name] for name in sources}
+
+
+def response_data(request):
+    try:
+        return request.response.data
+    except ObjectDoesNotExist:
+        return None
+
+
+def request_source(request_cls, prefixes, timings):
+    """
+    Requests meta data for `prefixes` from a single source
+
+    Runs in a worker thread, start and end times are written
+    to `timings`.
+    """
+
+    name = request_cls.Config.source_name
+    timings[name] = [time.monotonic(), None]
+
+    try:
+        return {
+            target: response_data(request)
+            for target, request in request_cls.request(prefixes).items()
+        }
+    finally:
+        timings[name][1] = time.monotonic()
+
+        # worker threads open their own database connection
+        connection.close()
+
+
+def enrich(prefixes, sources=None, timeout=None, deadline=None):
+    """
+    Requests meta data for `prefixes` from all sources concurrently
+
+    Sources that take longer than `timeout` seconds, or have not finished
+    when the overall `deadline` is reached, are reported as timed out and
+    are no longer waited on (their request finishes in the background
+    and will still populate the cache).
+
+    Arguments:
+    - prefixes (`list|str|ipaddress.ip_network`)
+    - sources (`list`): source names, see `enrich_sources`
+    - timeout (`float`): per source timeout in seconds,
+      defaults to the `ENRICH_SOURCE_TIMEOUT` setting
+    - deadline (`float`): overall deadline in seconds,
+      defaults to the `ENRICH_DEADLINE` setting
+
+    Returns:
+    - `dict` with the keys
+      - `prefixes`: the requested prefixes
+      - `duration`: total duration in seconds
+      - `sources`: source name -> `dict` with `status` ("ok", "error" or
+        "timeout"), `duration`, `data` (target -> response data) and `error`
+    """
+
+    if not isinstance(prefixes, list):
+        prefixes = [prefixes]
+
+    prefixes = [ipaddress.ip_network(prefix) for prefix in prefixes]
+    sources = enrich_sources(sources)
+
+    if timeout is None:
+        timeout = settings.ENRICH_SOURCE_TIMEOUT
+    if deadline is None:
+        deadline = settings.ENRICH_DEADLINE
+
+    results = {
+        name: {"status": "timeout", "duration": None, "data": None, "error": None}
+        for name in sources
+    }
+
+    # source name -> [start, end]
+    timings = {}
+
+    started = time.monotonic()
+    deadline_at = started + deadline
+
+    executor = ThreadPoolExecutor(
+        max_workers=max(min(settings.ENRICH_WORKERS, len(sources)), 1),
+        thread_name_prefix="prefix-meta-enrich",
+    )
+
+    futures = {
+        executor.submit(request_source, request_cls, prefixes, timings): name
+        for name, request_cls in sources.items()
+    }
+    pending = set(futures)
+
+    try:
+        while pending:
+            now = time.monotonic()
+
+            for future in list(pending):
+                name = futures[future]
+                if future.done() or name not in timings:
+                    continue
+                if now - timings[name][0] >= timeout:
+                    pending.discard(future)
+                    results[name]["duration"] = now - timings[name][0]
+
+            if not pending or now >= deadline_at:
+                break
+
+            wake_at = [deadline_at] + [
+                timings[futures[future]][0] + timeout
+                for future in pending
+                if futures[future] in timings
+            ]
+
+            if len(timings) < len(futures):
+                wake_at.append(now + POLL_INTERVAL)
+
+            done, pending = wait(
+                pending,
+                timeout=max(min(wake_at) - now, 0),
+                return_when=FIRST_COMPLETED,
+            )
+
+            for future in done:
+                name = futures[future]
+                start, end = timings[name]
+                result = results[name]
+                result["duration"] = end - start
+
+                try:
+                    result["data"] = future.result()
+                    result["status"] = "ok"
+                except Exception as exc:
+                    logger.error("enrich source failed", source=name, error=f"{exc}")
+                    result["status"] = "error"
+                    result["error"] = f"{exc}"
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    now = time.monotonic()
+
+    for name, result in results.items():
+        if result["status"] != "timeout":
+            continue
+
+        if result["duration"] is None and name in timings:
+            result["duration"] = now - timings[name][0]
+
+        logger.warning("enrich source timed out", source=name)
+
+    return {
+        "prefixes": [f"{prefix}" for prefix in prefixes],
+        "duration": now - started,
+        "sources": results,
+    }
@@ -0,0 +1,48 @@
+import json
+
+from fullctl.django.management.commands.base import CommandInterface
+
+from prefix_meta.enrich import ENRICH_SOURCES, enrich
+
+
+class Command(CommandInterface):
+    help = "Request meta data for prefixes from all sources concurrently"
+
+    always_commit = True
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument("prefixes", nargs="+", help="prefixes to enrich")
+        parser.add_argument(
+            "--source",
+            action="append",
+            dest="sources",
+            choices=list(ENRICH_SOURCES.keys()),
+            help="only request this source, can be specified multiple times",
+        )
+        parser.add_argument("--timeout", type=float, help="per source timeout")
+        parser.add_argument("--deadline", type=float, help="overall deadline")
+        parser.add_argument(
+            "--data", action="store_true", help="output the retrieved data as json"
+        )
+
+    def run(self, *args, **kwargs):
+        report = enrich(
+            kwargs.get("prefixes"),
+            sources=kwargs.get("sources"),
+            timeout=kwargs.get("timeout"),
+            deadline=kwargs.get("deadline"),
+        )
+
+        for name, result in report["sources"].items():
+            duration = result["duration"]
+            duration = f"{duration:.2f}s" if duration is not None else "-"
+            line = f"{name}: {result['status']} ({duration})"
+            if result["error"]:
+                line = f"{line} - {result['error']}"
+            self.log_info(line)
+
+        self.log_info(f"total: {report['duration']:.2f}s")
+
+        if kwargs.get("data"):
+            self.log_info(json.dumps(report, indent=2, default=str))
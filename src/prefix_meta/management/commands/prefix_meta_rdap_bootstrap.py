@@ -0,0 +1,40 @@
+from fullctl.django.management.commands.base import CommandInterface
+
+from prefix_meta.sources.rir.client import BOOTSTRAP_TYPES, refresh_bootstrap
+
+
+class Command(CommandInterface):
+    help = "Refresh the RDAP IANA bootstrap data cache (RDAP_BOOTSTRAP_DIR)"
+
+    always_commit = True
+
+    # bootstrap data is cached on the local disk of the host
+    # running the command
+    queue_allowed = False
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            "typ",
+            nargs="?",
+            choices=BOOTSTRAP_TYPES,
+            help="Bootstrap data type, refreshes all types if omitted",
+        )
+        parser.add_argument(
+            "--file",
+            help="Load bootstrap data from this local file instead of fetching it from IANA (requires typ)",
+        )
+
+    def run(self, *args, **kwargs):
+        typ = kwargs.get("typ")
+        path = kwargs.get("file")
+
+        if path and not typ:
+            self.log_error("--file requires a bootstrap data type")
+            return
+
+        for _typ in [typ] if typ else BOOTSTRAP_TYPES:
+            data = refresh_bootstrap(_typ, path)
+            self.log_info(
+                f"Refreshed {_typ} bootstrap data: {len(data['services'])} services"
+            )
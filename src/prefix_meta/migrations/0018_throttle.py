@@ -0,0 +1,51 @@
+# Generated by Django 4.2.15 on 2026-10-19 00:11
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        (
+            "prefix_meta",
+            "0017_arinapirequestattachment_arinapirequestticketdetails_and_more",
+        ),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Throttle",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("source", models.CharField(max_length=255, unique=True)),
+                (
+                    "next_request",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now,
+                        help_text="No requests to the source are sent before this time",
+                    ),
+                ),
+                (
+                    "throttled",
+                    models.PositiveIntegerField(
+                        default=0, help_text="Number of times the source throttled us"
+                    ),
+                ),
+                ("updated", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name": "Throttle",
+                "verbose_name_plural": "Throttles",
+                "db_table": "prefix_meta_throttle",
+            },
+        ),
+    ]
@@ -1,7 +1,10 @@
 import ipaddress
+import time
+from datetime import timedelta
 
 import fullctl.django.models.abstract.meta as meta
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from netfields import CidrAddressField, NetManager
 
@@ -202,3 +205,117 @@ class Request(meta.Request):
                 final_prefixes.append(prefix)
 
         return final_prefixes
+
+
+class Throttle(models.Model):
+
+    """
+    Rate-throttling state for a third party api that is shared
+    between all workers
+
+    Every request to the api reserves a slot through `wait`, slots
+    are spaced at least `interval` seconds apart. When the api
+    reports that it is throttling us, `throttle` pushes the next
+    available slot out by the throttle window.
+    """
+
+    source = models.CharField(max_length=255, unique=True)
+    next_request = models.DateTimeField(
+        default=timezone.now,
+        help_text=_("No requests to the source are sent before this time"),
+    )
+    throttled = models.PositiveIntegerField(
+        default=0, help_text=_("Number of times the source throttled us")
+    )
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "prefix_meta_throttle"
+        verbose_name = _("Throttle")
+        verbose_name_plural = _("Throttles")
+
+    class HandleRef:
+        tag = "prefix_meta_throttle"
+
+    def __str__(self):
+        return f"{self.source}: {self.next_request}"
+
+    @classmethod
+    def reserve(cls, source, interval=0):
+        """
+        Reserves the next request slot for the source
+
+        Arguments:
+        - source (`str`): source name
+        - interval (`float`): minimum seconds between requests
+
+        Returns:
+        - slot (`datetime`): time at which the request may be sent
+        """
+
+        return cls._reserve(source, interval)[0]
+
+    @classmethod
+    def _reserve(cls, source, interval=0):
+        """
+        Reserves the next request slot for the source
+
+        Returns:
+        - tuple: (slot, number of times the source throttled us so far)
+        """
+
+        with transaction.atomic():
+            throttle, _ = cls.objects.select_for_update().get_or_create(
+                source=source
+            )
+            slot = max(throttle.next_request, timezone.now())
+            throttle.next_request = slot + timedelta(seconds=interval)
+            throttle.save(update_fields=["next_request", "updated"])
+
+        return slot, throttle.throttled
+
+    @classmethod
+    def wait(cls, source, interval=0):
+        """
+        Reserves the next request slot for the source and blocks
+        until it is reached
+
+        If another worker records a `throttle` while we are waiting,
+        the reserved slot falls into the throttle window and a new
+        slot is reserved.
+
+        Returns:
+        - waited (`float`): seconds spent waiting
+        """
+
+        waited = 0
+
+        while True:
+            slot, throttled = cls._reserve(source, interval)
+            remaining = (slot - timezone.now()).total_seconds()
+
+            if remaining <= 0:
+                return waited
+
+            time.sleep(remaining)
+            waited += remaining
+
+            if cls.objects.filter(source=source, throttled=throttled).exists():
+                return waited
+
+    @classmethod
+    def throttle(cls, source, window):
+        """
+        Records that the source is throttling us, no further
+        requests will be sent for `window` seconds
+        """
+
+        with transaction.atomic():
+            throttle, _ = cls.objects.select_for_update().get_or_create(
+                source=source
+            )
+            throttle.next_request = max(
+                throttle.next_request, timezone.now() + timedelta(seconds=window)
+            )
+            throttle.throttled += 1
+            throttle.save(update_fields=["next_request", "throttled", "updated"])
@@ -1,3 +1,6 @@
+import os
+import tempfile
+
 from django.conf import settings
 from fullctl.django.settings import SettingsManager
 
@@ -10,12 +13,56 @@ settings_manager.set_option("IP2LOCATION_CACHE_EXPIRY", 86400 * 30)
 # ARIN API key
 settings_manager.set_option("ARIN_API_KEY", "")
 
+# Minimum seconds between ARIN API requests (across all workers)
+settings_manager.set_option("ARIN_API_REQUEST_INTERVAL", 1.0, envvar_type=float)
+
+# Seconds to hold off all ARIN API requests after being throttled
+settings_manager.set_option("ARIN_API_THROTTLE_WINDOW", 15, envvar_type=int)
+
 # Disable the ARIN who was task from actually doing anything
 settings_manager.set_option("ARIN_WHOWAS_DISABLED", False)
 
+# Parse ARIN WhoWas report archives in memory instead of extracting
+# them to a temporary directory for the prefix-meta-arin parser
+settings_manager.set_option("ARIN_WHOWAS_PARSE_IN_MEMORY", False)
+
 # rdap bootstrap server
 settings_manager.set_option("RDAP_BOOTSTRAP_URL", "https://rdap.org/")
 
+# resolve rdap services from IANA bootstrap data instead of
+# going through the bootstrap server
+settings_manager.set_option("RDAP_SELF_BOOTSTRAP", True)
+
+# IANA bootstrap data disk cache
+settings_manager.set_option(
+    "RDAP_BOOTSTRAP_DIR", os.path.join(tempfile.gettempdir(), "prefixctl-rdap")
+)
+
+# IANA bootstrap data cache ttl (hours)
+settings_manager.set_option("RDAP_BOOTSTRAP_CACHE_TTL", 25)
+
+# answer rdap lookups for targets inside an already known
+# inetnum from that inetnum's result
+settings_manager.set_option("RDAP_REUSE_COVERING_INETNUM", True)
+
+# seconds a pooled rdap client (and its http session) is reused for
+settings_manager.set_option("RDAP_CLIENT_MAX_AGE", 3600)
+
+# Prefix enrichment
+
+# comma separated source names to request when enriching prefixes,
+# all available sources if empty
+settings_manager.set_option("ENRICH_SOURCES", "")
+
+# seconds a single source may take
+settings_manager.set_option("ENRICH_SOURCE_TIMEOUT", 30.0, envvar_type=float)
+
+# seconds after which enrichment returns with whatever has finished
+settings_manager.set_option("ENRICH_DEADLINE", 60.0, envvar_type=float)
+
+# sources requested at the same time
+settings_manager.set_option("ENRICH_WORKERS", 8)
+
 # Cache expiry
 
 # 24 hours
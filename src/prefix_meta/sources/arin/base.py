@@ -4,6 +4,8 @@ import xmltodict
 from django.conf import settings
 from fullctl.django.models.concrete.meta import Request
 
+from prefix_meta.models import Throttle
+
 __all__ = [
     "ArinAPIRequest",
 ]
@@ -25,6 +27,9 @@ class ArinAPIRequest(Request):
         cache_expiry = 10
         xml_lists = ["messages", "attachments"]
 
+        # all arin api requests share the same throttle state
+        throttle_source = "arin-api"
+
     @classmethod
     def url_param(cls, target):
         api_key = getattr(settings, "ARIN_API_KEY", "")
@@ -47,6 +52,39 @@ class ArinAPIRequest(Request):
     def target_to_type(cls, target):
         return "live"
 
+    @classmethod
+    def is_throttled(cls, response):
+        """
+        Returns whether the ARIN api response indicates that
+        we are sending too many requests
+        """
+
+        return (
+            response.status_code == 429 or b"E_TOO_MANY_REQUESTS" in response.content
+        )
+
+    @classmethod
+    def send_request(cls, url):
+        """
+        Sends the request once the shared ARIN throttle allows it
+
+        Requests from all workers are spaced at least
+        `ARIN_API_REQUEST_INTERVAL` seconds apart and if ARIN reports
+        that we are being throttled no worker will send another request
+        for `ARIN_API_THROTTLE_WINDOW` seconds.
+        """
+
+        throttle_source = cls.config("throttle_source")
+
+        Throttle.wait(throttle_source, settings.ARIN_API_REQUEST_INTERVAL)
+
+        response = super().send_request(url)
+
+        if cls.is_throttled(response):
+            Throttle.throttle(throttle_source, settings.ARIN_API_THROTTLE_WINDOW)
+
+        return response
+
     @classmethod
     def send(cls, target):
         """
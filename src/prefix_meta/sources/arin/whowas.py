@@ -2,9 +2,11 @@
 Implements querying, downloading, unpacking and normalizing
 of ARIN whowas reports.
 """
+import csv
 import datetime
 import io
 import logging
+import os
 import tempfile
 import time
 import zipfile
@@ -14,9 +16,9 @@ import structlog
 from django.conf import settings
 from fullctl.django.models.concrete import Task
 from fullctl.django.tasks.qualifiers import ConcurrencyLimit
-from prefix_meta_arin.parser import Parser
 
 from prefix_meta.models import Data, Request
+from prefix_meta.util import normalize_keys
 
 from .base import ArinAPIRequest
 
@@ -30,6 +32,8 @@ __all__ = [
     "ArinAPIRequestTicketSummary",
     "ArinAPIRequestTicketDetails",
     "ArinAPIRequestAttachment",
+    "parse_report_zip",
+    "read_report_member",
 ]
 
 log = logging.getLogger(__name__)
@@ -52,6 +56,56 @@ class ArinApiThrottled(IOError):
     pass
 
 
+def read_report_member(fileobj):
+    """
+    Reads the rows of a single WhoWas report csv file
+
+    Arguments:
+    - fileobj: binary file-like object of the csv file
+
+    Returns:
+    - list of row dicts
+    """
+
+    return list(
+        csv.DictReader(io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline=""))
+    )
+
+
+def parse_report_zip(file_data):
+    """
+    Parses a WhoWas report zip archive in memory
+
+    Members are streamed straight out of the archive, nothing is
+    extracted to disk. Each csv member holds the history of one
+    handle (net or org) and its rows are collected under that
+    handle (the member's file name without extension).
+
+    Arguments:
+    - file_data (`bytes`): zip archive as returned by the ARIN api
+
+    Returns:
+    - dict: handle -> list of row dicts
+    """
+
+    data = {}
+
+    with zipfile.ZipFile(io.BytesIO(file_data), "r") as zip_file:
+        for info in zip_file.infolist():
+            if info.is_dir():
+                continue
+
+            handle, ext = os.path.splitext(os.path.basename(info.filename))
+
+            if ext.lower() != ".csv":
+                continue
+
+            with zip_file.open(info) as member:
+                data.setdefault(handle, []).extend(read_report_member(member))
+
+    return data
+
+
 @fullctl.django.tasks.register
 class ArinWhoWasTask(Task):
     """
@@ -133,34 +187,77 @@ class ArinWhoWasData(Data):
         )
 
     @property
-    def net_entries(self):
-        r = {}
+    def index(self):
+        """
+        Lazily built lookup index over the report data, so that
+        history rendering does not need to rescan the data for
+        every handle and action.
 
-        for k, v in self.data.items():
-            if "net_name" in v[0]:
-                r[k] = v
+        - nets: net handle -> entries
+        - orgs: org handle -> entries
+        - entity_data: handle -> {field name: first value seen}
+        - actions: net handle -> list of (date, action) sorted by date
 
-        return r
+        The index is rebuilt whenever `data` is replaced (assigned,
+        updated or reloaded from the database).
+        """
 
-    @property
-    def org_entries(self):
-        r = {}
+        if getattr(self, "_index", None) is None or self._index_data is not self.data:
+            self._index = self.build_index(self.data)
+            self._index_data = self.data
+        return self._index
 
-        for k, v in self.data.items():
-            if "org_name" in v[0]:
-                r[k] = v
+    @classmethod
+    def build_index(cls, data):
+        nets = {}
+        orgs = {}
+        entity_data = {}
+        actions = {}
+
+        for handle, entries in (data or {}).items():
+            if not entries:
+                continue
+
+            fields = entity_data[handle] = {}
+            for entity in entries:
+                for name, value in entity.items():
+                    fields.setdefault(name, value)
+
+            if "org_name" in entries[0]:
+                orgs[handle] = entries
+
+            if "net_name" in entries[0]:
+                nets[handle] = entries
+                actions[handle] = sorted(
+                    (
+                        (
+                            datetime.datetime.strptime(
+                                action["action_date"], "%m-%d-%Y"
+                            ),
+                            action,
+                        )
+                        for action in entries
+                    ),
+                    key=lambda x: x[0],
+                )
 
-        return r
+        return {
+            "nets": nets,
+            "orgs": orgs,
+            "entity_data": entity_data,
+            "actions": actions,
+        }
 
-    def entity_data(self, handle, name):
-        if handle not in self.data:
-            return None
+    @property
+    def net_entries(self):
+        return self.index["nets"]
 
-        for entity in self.data[handle]:
-            if name in entity:
-                return entity[name]
+    @property
+    def org_entries(self):
+        return self.index["orgs"]
 
-        return None
+    def entity_data(self, handle, name):
+        return self.index["entity_data"].get(handle, {}).get(name)
 
     def determine_rir(self, action):
         # get RIR by scanning for "POCs" in the action data
@@ -174,19 +271,22 @@ class ArinWhoWasData(Data):
         return None
 
     def registration_history(self, net_handle, rir_fallback=None):
-        if net_handle.lower() not in self.data:
+        actions = self.index["actions"].get(net_handle.lower())
+
+        if not actions:
             return []
 
         registrations = []
         org_handle = None
 
-        for action in self.data[net_handle.lower()]:
+        # actions are sorted by datetime formatted from "Action Date"
+        # MM-DD-YYYY timestamp
+
+        for date, action in actions:
             if action["organization"] != org_handle:
                 registrations.append(
                     {
-                        "date": datetime.datetime.strptime(
-                            action["action_date"], "%m-%d-%Y"
-                        ),
+                        "date": date,
                         "org_name": self.entity_data(
                             action["organization"].lower(), "org_name"
                         ),
@@ -196,10 +296,7 @@ class ArinWhoWasData(Data):
                 )
                 org_handle = action["organization"]
 
-        # return list sorted by datetime formatted from "Action Date"
-        # MM-DD-YYYY timestamp
-
-        return sorted(registrations, key=lambda x: x["date"])
+        return registrations
 
 
 class ArinWhoWasRequest(Request):
@@ -263,19 +360,18 @@ class ArinWhoWasRequest(Request):
                 ticket_no = ArinAPIRequestWhoWas.ticket_number(ip)
                 break
             except ArinApiThrottled:
-                log.debug("arin_whowas", throttled="waiting 15 seconds")
+                log.debug("arin_whowas", throttled="retrying")
                 # TODO: fullctl-core should implment specific shorter
                 # caching times for throttled requests (status=429)
                 #
-                # for now, just kill the request cache
-                # and wait 15 seconds
+                # for now, just kill the request cache, the retry
+                # will wait for the shared ARIN api throttle window
+                # to pass before it is sent
 
                 cache = ArinAPIRequestWhoWas.get_cache(ip)
                 if cache:
                     cache.delete()
 
-                time.sleep(15)
-
         if ticket_no is None:
             raise OSError(
                 f"Unable to open ticket for ARIN WhoWas request (tried {tries} times)"
@@ -320,20 +416,30 @@ class ArinWhoWasRequest(Request):
         )
         results = ArinAPIRequestAttachment.request(attachment_target)
 
-        # unpack the compressed data and extract the files
-        # to a temporary directory and then use the prefix-meta-arin Parser
-        # to parse the data and return a dict
-
         attachment = results[attachment_target].response.attachments.first()
 
+        return cls.parse_report(bytes(attachment.file_data))
+
+    @classmethod
+    def parse_report(cls, file_data):
+        """
+        Parses the WhoWas report zip archive and returns a dict
+
+        By default the archive is extracted to a temporary directory
+        and parsed with the prefix-meta-arin Parser, set
+        `ARIN_WHOWAS_PARSE_IN_MEMORY` to parse it in memory instead.
+        """
+
+        if getattr(settings, "ARIN_WHOWAS_PARSE_IN_MEMORY", False):
+            return parse_report_zip(file_data)
+
+        from prefix_meta_arin.parser import Parser
+
         with tempfile.TemporaryDirectory() as tmpdirname:
-            file_data = bytes(attachment.file_data)
             with zipfile.ZipFile(io.BytesIO(file_data), "r") as zip_file:
                 zip_file.extractall(tmpdirname)
 
-            data = Parser().parse(tmpdirname)
-
-            return data
+            return Parser().parse(tmpdirname)
 
     @classmethod
     def send(cls, target):
@@ -346,19 +452,11 @@ class ArinWhoWasRequest(Request):
 
     def prepare_data(self, data):
         """
-        Recursively ensures all dict keys in data are lowercase
+        Ensures all dict keys in data are lowercase
         and use underscores instead of spaces
         """
 
-        if isinstance(data, dict):
-            return {
-                k.lower().replace(" ", "_").replace("/", "_"): self.prepare_data(v)
-                for k, v in data.items()
-            }
-        elif isinstance(data, list):
-            return [self.prepare_data(v) for v in data]
-        else:
-            return data
+        return normalize_keys(data)
 
 
 class ArinAPIRequestWhoWas(ArinAPIRequest):
@@ -1,11 +1,17 @@
 import prefix_meta.models as prefix_meta
 import ipaddress
+from collections import namedtuple
 
 __all__ = [
     "IRRExplorerData",
     "IRRExplorerRequest",
+    "RouteObject",
 ]
 
+# flat route object table row, `route` is the original route
+# object dict as stored in the irrexplorer data (never modified)
+RouteObject = namedtuple("RouteObject", ["prefix", "origin", "dataset", "route"])
+
 
 class IRRExplorerData(prefix_meta.Data):
     class Meta:
@@ -21,8 +27,8 @@ class IRRExplorerData(prefix_meta.Data):
 
     @property
     def get_matched_subnets(self):
-        for row in self.route_objects():
-            yield ipaddress.ip_network(row["prefix"])
+        for row in self.route_table:
+            yield ipaddress.ip_network(row.prefix)
 
     @classmethod
     def get_prefix_queryset(cls, prefix):
@@ -55,34 +61,120 @@ class IRRExplorerData(prefix_meta.Data):
 
         return False
 
-    def _augment_route_objects(self, route_objects: list, prefix: str, dataset: str):
+    @property
+    def route_table(self):
         """
-        Add prefix key and value to each route object dictonary
-
-        :param route_objects: list of route objects
-        :param prefix: prefix
+        Flat table of all route objects in the data as `RouteObject`
+        rows, built once per record
         """
+        return self.route_index["table"]
 
-        for route_object in route_objects:
-            route_object["prefix"] = prefix
-            route_object["ip_address"] = prefix
-            route_object["dataset"] = dataset
+    @property
+    def route_index(self):
+        """
+        Lazily built route object table and its indexes
 
-        return route_objects
+        - table: list of `RouteObject`
+        - dataset: dataset -> list of `RouteObject`
+        - origin: origin asn -> list of `RouteObject`
+        """
 
-    def route_objects(self):
-        if not self.data:
-            return []
+        if getattr(self, "_route_index", None) is None:
+            self._route_index = self.build_route_index(self.data)
+        return self._route_index
 
-        collected_routes = []
+    @classmethod
+    def build_route_index(cls, data):
+        table = []
+        by_dataset = {}
+        by_origin = {}
 
-        for entry in self.data:
+        for entry in data or []:
+            prefix = entry["prefix"]
             for dataset, routes in entry.get("irrRoutes", {}).items():
-                collected_routes += self._augment_route_objects(
-                    routes, entry["prefix"], dataset
-                )
+                for route in routes:
+                    row = RouteObject(prefix, route.get("asn"), dataset, route)
+                    table.append(row)
+                    by_dataset.setdefault(dataset, []).append(row)
+                    by_origin.setdefault(row.origin, []).append(row)
+
+        return {
+            "table": table,
+            "dataset": by_dataset,
+            "origin": by_origin,
+        }
+
+    def reset_route_index(self):
+        self._route_index = None
+
+    def update(self, data):
+        super().update(data)
+        self.reset_route_index()
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self.reset_route_index()
+
+    def save(self, *args, **kwargs):
+        # data may have been assigned directly, make sure matched
+        # subnets are collected from the current data
+        self.reset_route_index()
+        super().save(*args, **kwargs)
+
+    @staticmethod
+    def _route_object(row):
+        """
+        Route object dict with the prefix and dataset it was
+        found under
+        """
+        return {
+            **row.route,
+            "prefix": row.prefix,
+            "ip_address": row.prefix,
+            "dataset": row.dataset,
+        }
+
+    def route_objects(self, dataset=None, origin=None):
+        """
+        Returns route objects as dicts, augmented with `prefix`,
+        `ip_address` and `dataset` keys
+
+        Every call returns new dicts, the stored data and the
+        route table are not modified.
+
+        Arguments:
+        - dataset (`str`): only return route objects from this dataset
+        - origin (`int`): only return route objects for this origin asn
+        """
+
+        return [self._route_object(row) for row in self.filter_routes(dataset, origin)]
+
+    def filter_routes(self, dataset=None, origin=None):
+        """
+        Returns a list of `RouteObject` rows filtered by dataset
+        and / or origin using the route indexes
+        """
+
+        index = self.route_index
 
-        return collected_routes
+        if dataset is not None:
+            rows = index["dataset"].get(dataset, [])
+            if origin is not None:
+                rows = [row for row in rows if row.origin == origin]
+            return list(rows)
+
+        if origin is not None:
+            return list(index["origin"].get(origin, []))
+
+        return list(index["table"])
+
+    @property
+    def datasets(self):
+        return list(self.route_index["dataset"].keys())
+
+    @property
+    def origins(self):
+        return list(self.route_index["origin"].keys())
 
 
 class IRRExplorerRequest(prefix_meta.Request):
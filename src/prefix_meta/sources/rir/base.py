@@ -1,9 +1,16 @@
-import rdap
+import bisect
+import ipaddress
+from math import inf
+
 import rdap.exceptions
+from django.conf import settings
+from django.db.models import Q
 
 from prefix_meta.models import Data, Request
+from prefix_meta.sources.rir.client import get_client
 
 __all__ = [
+    "InetnumIndex",
     "RdapData",
     "RdapRequest",
 ]
@@ -13,6 +20,93 @@ import structlog
 logger = structlog.get_logger(__name__)
 
 
+def inetnum_range(inetnum):
+    """
+    Parses an RDAP result inetnum key ("<start> - <end>")
+
+    Returns:
+    - tuple: (start, end) ip addresses, or None if the inetnum is not a
+      valid address range
+    """
+
+    try:
+        start, end = (
+            ipaddress.ip_address(address.strip()) for address in inetnum.split(" - ")
+        )
+    except ValueError:
+        return None
+
+    if start.version != end.version or start > end:
+        return None
+
+    return start, end
+
+
+class InetnumIndex:
+    """
+    Range index over the inetnums of RDAP results
+
+    Allows looking up the most specific known inetnum
+    that fully covers a prefix.
+    """
+
+    def __init__(self):
+        # ip version -> sorted list of (start, end, inetnum)
+        self._ranges = {4: [], 6: []}
+
+        # inetnum -> rdap result entry
+        self._entries = {}
+
+    def __len__(self):
+        return sum(len(ranges) for ranges in self._ranges.values())
+
+    def add(self, data):
+        """
+        Adds the inetnums of an RDAP result (as returned by
+        `RdapRequest.rdap_request`) to the index
+        """
+
+        for inetnum, entry in (data or {}).items():
+            addresses = inetnum_range(inetnum)
+
+            if addresses is None:
+                continue
+
+            start, end = addresses
+
+            if inetnum not in self._entries:
+                bisect.insort(
+                    self._ranges[start.version], (int(start), int(end), inetnum)
+                )
+
+            self._entries[inetnum] = entry
+
+    def lookup(self, prefix):
+        """
+        Returns the RDAP result for the most specific inetnum
+        covering `prefix` or None if no known inetnum covers it
+        """
+
+        prefix = ipaddress.ip_network(prefix)
+        ranges = self._ranges[prefix.version]
+        first = int(prefix.network_address)
+        last = int(prefix.broadcast_address)
+
+        covering = None
+
+        # only ranges starting at or before the prefix can cover it
+        for start, end, inetnum in ranges[: bisect.bisect_right(ranges, (first, inf))]:
+            if end < last:
+                continue
+            if covering is None or end - start < covering[1] - covering[0]:
+                covering = (start, end, inetnum)
+
+        if covering is None:
+            return None
+
+        return {covering[2]: self._entries[covering[2]]}
+
+
 class RdapData(Data):
     class Meta:
         proxy = True
@@ -21,6 +115,35 @@ class RdapData(Data):
         source_name = "rdap"
         type = "rdap"
 
+    @property
+    def get_matched_subnets(self):
+        """
+        Networks of the inetnums in the data, so the data can be
+        found for any prefix inside them
+        """
+
+        for inetnum in self.data or {}:
+            addresses = inetnum_range(inetnum)
+            if addresses is not None:
+                yield from ipaddress.summarize_address_range(*addresses)
+
+    @classmethod
+    def get_covering_queryset(cls, prefixes):
+        """
+        Returns RDAP data with an inetnum that covers any of `prefixes`
+
+        Arguments:
+        - prefixes (`list`): prefixes to find covering inetnums for
+        """
+
+        covering = Q()
+        for prefix in prefixes:
+            covering |= Q(subnets__prefix__net_contains_or_equals=prefix)
+
+        return cls.objects.filter(
+            covering, type=cls.config("type"), source_name=cls.config("source_name")
+        ).distinct()
+
 
 class RdapRequest(Request):
     class Meta:
@@ -38,6 +161,75 @@ class RdapRequest(Request):
 
         rdap_url = None
 
+    @classmethod
+    def request(cls, targets):
+        """
+        Requests data for one or more targets
+
+        RDAP results describe the whole inetnum that contains a target,
+        so targets that fall inside an inetnum that is already known from
+        cached RDAP data or an earlier result in the same call are answered
+        from that result instead of sending another RDAP query.
+
+        This can be disabled with the `RDAP_REUSE_COVERING_INETNUM` setting.
+        """
+
+        if not settings.RDAP_REUSE_COVERING_INETNUM:
+            return super().request(targets)
+
+        targets = cls.prepare_request(targets)
+        results = {}
+        inetnums = InetnumIndex()
+        pending = []
+
+        for target in targets:
+            request = cls.get_cache(target)
+
+            if not request:
+                pending.append(target)
+                continue
+
+            results[f"{target}"] = cls.process(
+                target,
+                request.url,
+                request.http_status,
+                request.response.data,
+                cached=True,
+                content=request.response.content,
+            )
+            inetnums.add(request.response.data)
+
+        if pending:
+            # seed the index with cached inetnums covering the targets
+            # that are not cached themselves
+            covering = RdapData.get_covering_queryset(pending).filter(
+                updated__gte=cls.valid_cache_datetime(pending[0])
+            )
+            for meta_data in covering:
+                inetnums.add(meta_data.data)
+
+        sent = 0
+
+        for target in sorted(pending, key=ipaddress.ip_network):
+            data = inetnums.lookup(target)
+
+            if data is None:
+                logger.debug(f"sending rdap request - target - {target}")
+                data = cls.rdap_request(target)
+                inetnums.add(data)
+                sent += 1
+
+            results[f"{target}"] = cls.process(
+                target, cls.target_to_url(target), 200, data
+            )
+
+        logger.debug(
+            f"rdap requests sent: {sent}, "
+            f"answered by covering inetnum: {len(pending) - sent}"
+        )
+
+        return results
+
     @classmethod
     def target_to_url(cls, target):
         return f"RDAP {target}"
@@ -55,7 +247,7 @@ class RdapRequest(Request):
 
     @classmethod
     def rdap_request(cls, target):
-        client = rdap.RdapClient(config={"ignore_recurse_errors": True})
+        client = get_client()
         try:
             data = client.get(f"{target}")
         except rdap.exceptions.RdapNotFoundError:
@@ -0,0 +1,269 @@
+"""
+Process-wide RDAP client pool
+
+RDAP clients are kept alive per thread so their http sessions (and
+connections) are reused between lookups, and IANA bootstrap data is
+loaded once per process from a disk cache instead of being resolved
+through a redirecting bootstrap server for every lookup.
+"""
+
+import ipaddress
+import json
+import os
+import threading
+import time
+
+import rdap
+import rdap.exceptions
+import structlog
+from django.conf import settings
+from rdap.objects import RdapNetwork
+
+__all__ = [
+    "BOOTSTRAP_TYPES",
+    "IpTree",
+    "RdapClient",
+    "get_client",
+    "get_bootstrap_data",
+    "refresh_bootstrap",
+]
+
+logger = structlog.get_logger(__name__)
+
+# iana bootstrap data files
+BOOTSTRAP_TYPES = ["ipv4", "ipv6", "asn"]
+
+# bootstrap data loaded into this process, typ -> (loaded, data)
+_bootstrap = {}
+_bootstrap_lock = threading.Lock()
+
+# ip trees built from the bootstrap data, typ -> IpTree
+_ip_trees = {}
+
+_local = threading.local()
+
+
+class IpTree:
+    """
+    Finds the RDAP service url for an ip address from
+    IANA ipv4 / ipv6 bootstrap data
+    """
+
+    def __init__(self, data=None):
+        # prefixlen -> {network: url}
+        self._networks = {}
+
+        if data:
+            self.load_data(data)
+
+    def __len__(self):
+        return sum(len(networks) for networks in self._networks.values())
+
+    def load_data(self, data):
+        """Loads data from iana format."""
+        for service in data["services"]:
+            # only get primary URL
+            url = service[1][0].rstrip("/")
+            for network in service[0]:
+                network = ipaddress.ip_network(network)
+                self._networks.setdefault(network.prefixlen, {})[network] = url
+
+    def get_service_url(self, address):
+        "Return service url for address.  Raise LookupError if not found."
+        address = ipaddress.ip_address(address)
+
+        for prefixlen in sorted(self._networks.keys(), reverse=True):
+            network = ipaddress.ip_network(f"{address}/{prefixlen}", strict=False)
+            try:
+                return self._networks[prefixlen][network]
+            except KeyError:
+                continue
+
+        raise LookupError(f"No service found for {address}")
+
+
+def bootstrap_file(typ):
+    return os.path.join(settings.RDAP_BOOTSTRAP_DIR, f"{typ}.json")
+
+
+def client_config():
+    return {
+        "bootstrap_url": settings.RDAP_BOOTSTRAP_URL,
+        "self_bootstrap": settings.RDAP_SELF_BOOTSTRAP,
+        "ignore_recurse_errors": True,
+    }
+
+
+def write_bootstrap_data(typ, data):
+    """
+    Writes bootstrap data to the disk cache
+
+    Data is written to a temporary file first so other processes never
+    read a partially written bootstrap file.
+    """
+
+    os.makedirs(settings.RDAP_BOOTSTRAP_DIR, exist_ok=True)
+
+    tmp_file = f"{bootstrap_file(typ)}.{os.getpid()}.tmp"
+    with open(tmp_file, "w") as fh:
+        json.dump(data, fh, separators=(",", ":"))
+    os.replace(tmp_file, bootstrap_file(typ))
+
+
+def load_bootstrap_data(typ, client):
+    """
+    Reads bootstrap data from the disk cache, fetching it from IANA
+    if the cache is missing or older than `RDAP_BOOTSTRAP_CACHE_TTL`
+    """
+
+    cache_age = time.time() - settings.RDAP_BOOTSTRAP_CACHE_TTL * 3600
+
+    try:
+        if os.path.getmtime(bootstrap_file(typ)) > cache_age:
+            with open(bootstrap_file(typ)) as fh:
+                return json.load(fh)
+    except (FileNotFoundError, ValueError):
+        pass
+
+    data = client.fetch_bootstrap_data(typ)
+    write_bootstrap_data(typ, data)
+    return data
+
+
+def get_bootstrap_data(typ, client=None):
+    """
+    Returns IANA bootstrap data for `typ`
+
+    Data is held in memory for `RDAP_BOOTSTRAP_CACHE_TTL` hours,
+    after which it is re-read from the disk cache in
+    `RDAP_BOOTSTRAP_DIR` (which is refreshed from IANA once it
+    is older than the ttl as well).
+    """
+
+    ttl = settings.RDAP_BOOTSTRAP_CACHE_TTL * 3600
+
+    with _bootstrap_lock:
+        loaded, data = _bootstrap.get(typ, (0, None))
+
+        if data is None or time.time() - loaded > ttl:
+            data = load_bootstrap_data(typ, client or get_client())
+            _bootstrap[typ] = (time.time(), data)
+            _ip_trees.pop(typ, None)
+
+        return data
+
+
+def get_ip_tree(typ, client=None):
+    data = get_bootstrap_data(typ, client)
+
+    with _bootstrap_lock:
+        if typ not in _ip_trees:
+            _ip_trees[typ] = IpTree(data)
+        return _ip_trees[typ]
+
+
+def refresh_bootstrap(typ, path=None):
+    """
+    Refreshes the bootstrap disk cache for `typ` and drops it from memory
+
+    Arguments:
+    - typ (`str`): one of `BOOTSTRAP_TYPES`
+    - path (`str`): load the bootstrap data from this local file instead
+      of fetching it from IANA
+    """
+
+    if path:
+        with open(path) as fh:
+            data = json.load(fh)
+        if "services" not in data:
+            raise ValueError(f"{path} is not IANA bootstrap data")
+    else:
+        data = get_client().fetch_bootstrap_data(typ)
+
+    write_bootstrap_data(typ, data)
+
+    with _bootstrap_lock:
+        _bootstrap.pop(typ, None)
+        _ip_trees.pop(typ, None)
+
+    return data
+
+
+class RdapClient(rdap.RdapClient):
+    """
+    RDAP client that self-bootstraps ip lookups as well as
+    asn lookups, using the process-wide bootstrap data
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.created = time.time()
+        self._rdap_cache = {}
+
+    def get_rdap(self, url):
+        """
+        Get RDAP information from a full RDAP url and returns an object
+
+        `rdap.RdapClient.get_rdap` is wrapped in a process-wide lru_cache,
+        which would keep serving responses for the lifetime of a pooled
+        client regardless of `RDAP_CACHE_EXPIRY`. Responses are cached
+        for the current lookup only instead (see `get_client`).
+        """
+
+        if url not in self._rdap_cache:
+            self._rdap_cache[url] = rdap.RdapClient.get_rdap.__wrapped__(self, url)
+        return self._rdap_cache[url]
+
+    def get_bootstrap_data(self, typ):
+        return get_bootstrap_data(typ, self)
+
+    def ip_url(self, address):
+        """Gets the correct url for specified ip address."""
+        if not self.self_bootstrap:
+            return self.url
+
+        return get_ip_tree(f"ipv{address.version}", self).get_service_url(address)
+
+    def get_ip(self, address):
+        """
+        Get an IP object.
+        """
+        address = ipaddress.ip_address(f"{address}")
+
+        try:
+            url = self.ip_url(address)
+        # catch bootstrap Lookup errors and report as not found
+        except LookupError as excinfo:
+            raise rdap.exceptions.RdapNotFoundError(str(excinfo))
+
+        query = f"/ip/{address}"
+        return RdapNetwork(self._rdap_get(query, base_url=url).json(), self)
+
+    def close(self):
+        self.http.close()
+
+
+def get_client():
+    """
+    Returns the RDAP client for the current thread
+
+    Clients (and their keep-alive http sessions) are reused until
+    they are older than `RDAP_CLIENT_MAX_AGE` seconds.
+    """
+
+    client = getattr(_local, "client", None)
+
+    if client and time.time() - client.created > settings.RDAP_CLIENT_MAX_AGE:
+        client.close()
+        client = None
+
+    if not client:
+        client = _local.client = RdapClient(config=client_config())
+        logger.debug("rdap client created", bootstrap_url=client.url)
+
+    # request history and fetched objects are only relevant for a
+    # single lookup, don't keep them for the lifetime of the client
+    client._history = []
+    client._rdap_cache = {}
+
+    return client
@@ -6,8 +6,21 @@ import ipaddress
 
 __all__ = [
     "prefix_to_net_handle",
+    "normalize_key",
+    "normalize_keys",
 ]
 
+# translation applied to data keys by `normalize_key`
+KEY_TRANSLATION = str.maketrans({" ": "_", "/": "_"})
+
+# memoized key translations, reports repeat the same
+# handful of column names over and over
+NORMALIZED_KEYS = {}
+
+# upper bound for the memoized translations, top level
+# keys are handles and are not repeated
+NORMALIZED_KEYS_MAX = 10000
+
 
 def prefix_to_net_handle(prefix):
     """
@@ -18,3 +31,76 @@ def prefix_to_net_handle(prefix):
         prefix = ipaddress.ip_network(prefix)
 
     return "NET-%s-1" % "-".join(prefix.network_address.exploded.split("."))
+
+
+def normalize_key(key):
+    """
+    Lowercase key with spaces and slashes replaced by underscores
+    """
+
+    try:
+        return NORMALIZED_KEYS[key]
+    except KeyError:
+        pass
+
+    if len(NORMALIZED_KEYS) >= NORMALIZED_KEYS_MAX:
+        NORMALIZED_KEYS.clear()
+
+    normalized = NORMALIZED_KEYS[key] = key.lower().translate(KEY_TRANSLATION)
+    return normalized
+
+
+def normalize_keys(data):
+    """
+    Returns a copy of data with all dict keys (at any depth) passed
+    through `normalize_key`
+
+    Walks the data iteratively, so deeply nested data does not hit
+    the recursion limit, and visits every container exactly once.
+
+    Only plain `dict` and `list` containers (as produced by json
+    and csv parsing) are descended into.
+    """
+
+    if type(data) is dict:
+        result = {}
+    elif type(data) is list:
+        result = []
+    else:
+        return data
+
+    normalized_keys = NORMALIZED_KEYS
+    stack = [(data, result)]
+    push = stack.append
+    pop = stack.pop
+
+    while stack:
+        source, target = pop()
+
+        if type(source) is dict:
+            for key, value in source.items():
+                typ = type(value)
+                if typ is dict:
+                    copy = {}
+                    push((value, copy))
+                    value = copy
+                elif typ is list:
+                    copy = []
+                    push((value, copy))
+                    value = copy
+                target[normalized_keys.get(key) or normalize_key(key)] = value
+        else:
+            append = target.append
+            for value in source:
+                typ = type(value)
+                if typ is dict:
+                    copy = {}
+                    push((value, copy))
+                    value = copy
+                elif typ is list:
+                    copy = []
+                    push((value, copy))
+                    value = copy
+                append(value)
+
+    return result
@@ -92,6 +92,44 @@ REST_FRAMEWORK = {
 # IRR IMPORT FREQUENCY (per prefix set that has it enabled), 12 hours
 settings_manager.set_option("IRR_IMPORT_FREQUENCY", 3600 * 12)
 
+# AS-SET expansions are shared by all prefix sets importing the same
+# AS-SET for this long, slightly less than the import frequency so
+# every import cycle expands each AS-SET once
+settings_manager.set_option(
+    "IRR_EXPANSION_CACHE_EXPIRY",
+    int(settings_manager.get("IRR_IMPORT_FREQUENCY") * 0.9),
+)
+
+# AS-SET expansion backend, "bgpq4" or "rpsl" (expand from the local
+# RPSL dump files in IRR_RPSL_DUMPS)
+settings_manager.set_option("IRR_EXPANSION_BACKEND", "bgpq4")
+
+# comma separated RPSL dump files (or directories of dump files)
+settings_manager.set_option("IRR_RPSL_DUMPS", "")
+
+# record a changeset revision for every IRR import that changes a
+# prefix set, disable to keep automated imports out of the history
+settings_manager.set_option("IRR_IMPORT_REVISIONS", True)
+
+# recurring task schedules (irr imports, monitors) run on a deterministic
+# per object phase of their interval instead of all at once
+settings_manager.set_option("TASK_SCHEDULE_JITTER", True)
+
+# at most this many task schedules are started per rate window (seconds),
+# 0 disables the limit
+settings_manager.set_option("TASK_SCHEDULE_RATE_LIMIT", 10)
+settings_manager.set_option("TASK_SCHEDULE_RATE_WINDOW", 60)
+
+# page size of cursor paginated prefix listings, clients can request
+# up to PREFIX_PAGE_SIZE_MAX prefixes per page
+settings_manager.set_option("PREFIX_PAGE_SIZE", 1000)
+settings_manager.set_option("PREFIX_PAGE_SIZE_MAX", 10000)
+
+# prefix sets deleted per batch by the delete_prefixsets task, their
+# prefixes are deleted in batches of PREFIX_DELETE_BATCH_SIZE
+settings_manager.set_option("PREFIX_SET_DELETE_BATCH_SIZE", 50)
+settings_manager.set_option("PREFIX_DELETE_BATCH_SIZE", 10000)
+
 # OUTSIDE SERVICES
 
 settings_manager.set_option("GOOGLE_ANALYTICS_ID", "")
@@ -1,3 +1,22 @@
-import pytest  # noqa: F401
+import os
+
+import pytest
 
 from tests.fixtures import *  # noqa: F401, F403
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        "markers",
+        "benchmark: timing benchmark, only runs when PREFIXCTL_BENCHMARK is set",
+    )
+
+
+def pytest_collection_modifyitems(config, items):
+    if os.environ.get("PREFIXCTL_BENCHMARK"):
+        return
+
+    skip = pytest.mark.skip(reason="set PREFIXCTL_BENCHMARK=1 to run benchmarks")
+    for item in items:
+        if "benchmark" in item.keywords:
+            item.add_marker(skip)
@@ -0,0 +1,318 @@
+import csv
+import datetime
+import io
+import time
+import zipfile
+
+import pytest
+
+from prefix_meta.sources.arin.whowas import (
+    ArinWhoWasData,
+    ArinWhoWasRequest,
+    parse_report_zip,
+)
+from prefix_meta.util import normalize_keys
+
+NET_HEADER = [
+    "Action Date",
+    "Action",
+    "Net Handle",
+    "Net Name",
+    "Organization",
+    "Start Address",
+    "End Address",
+    "Tech POCs",
+]
+
+ORG_HEADER = [
+    "Action Date",
+    "Action",
+    "Org Handle",
+    "Org Name",
+    "Admin POCs",
+]
+
+
+def _csv(header, rows):
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(header)
+    writer.writerows(rows)
+    return out.getvalue()
+
+
+def make_report(nets=500, actions=20):
+    """
+    Builds a synthetic WhoWas report archive with `nets` net handles
+    and one org handle per net, each with `actions` history rows
+    """
+
+    buf = io.BytesIO()
+
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zip_file:
+        for n in range(nets):
+            net_handle = f"NET-10-{n // 256}-{n % 256}-0-1"
+            org_handle = f"ORG{n}"
+
+            zip_file.writestr(
+                f"{net_handle}.csv",
+                _csv(
+                    NET_HEADER,
+                    [
+                        [
+                            f"01-{(a % 28) + 1:02d}-{2000 + a}",
+                            "MODIFY",
+                            net_handle,
+                            f"NET{n}",
+                            org_handle,
+                            f"10.{n // 256}.{n % 256}.0",
+                            f"10.{n // 256}.{n % 256}.255",
+                            f"TECH{n}-ARIN",
+                        ]
+                        for a in range(actions)
+                    ],
+                ),
+            )
+            zip_file.writestr(
+                f"{org_handle}.csv",
+                _csv(
+                    ORG_HEADER,
+                    [
+                        [f"01-01-{2000 + a}", "MODIFY", org_handle, f"Org {n}", ""]
+                        for a in range(actions)
+                    ],
+                ),
+            )
+
+    return buf.getvalue()
+
+
+def test_parse_report_zip():
+    file_data = make_report(nets=2, actions=3)
+
+    data = parse_report_zip(file_data)
+
+    assert sorted(data.keys()) == [
+        "NET-10-0-0-0-1",
+        "NET-10-0-1-0-1",
+        "ORG0",
+        "ORG1",
+    ]
+    assert len(data["NET-10-0-0-0-1"]) == 3
+    assert data["NET-10-0-0-0-1"][0]["Organization"] == "ORG0"
+    assert data["ORG1"][0]["Org Name"] == "Org 1"
+
+
+def test_parse_report_matches_parser(settings):
+    """
+    In-memory parsing produces the same data as the prefix-meta-arin
+    Parser used on the extracted archive
+    """
+
+    pytest.importorskip("prefix_meta_arin.parser")
+
+    file_data = make_report(nets=20, actions=5)
+
+    settings.ARIN_WHOWAS_PARSE_IN_MEMORY = False
+    extracted = ArinWhoWasRequest.parse_report(file_data)
+
+    settings.ARIN_WHOWAS_PARSE_IN_MEMORY = True
+    in_memory = ArinWhoWasRequest.parse_report(file_data)
+
+    assert normalize_keys(in_memory) == normalize_keys(extracted)
+
+
+@pytest.mark.benchmark
+def test_parse_report_benchmark(settings):
+    pytest.importorskip("prefix_meta_arin.parser")
+
+    file_data = make_report(nets=2000, actions=20)
+
+    settings.ARIN_WHOWAS_PARSE_IN_MEMORY = False
+    t = time.perf_counter()
+    ArinWhoWasRequest.parse_report(file_data)
+    t_extracted = time.perf_counter() - t
+
+    settings.ARIN_WHOWAS_PARSE_IN_MEMORY = True
+    t = time.perf_counter()
+    in_memory = ArinWhoWasRequest.parse_report(file_data)
+    t_in_memory = time.perf_counter() - t
+
+    print(
+        f"whowas report ({len(file_data)} bytes, {len(in_memory)} handles): "
+        f"extracted {t_extracted:.3f}s, in memory {t_in_memory:.3f}s"
+    )
+
+
+def test_registration_history():
+    data = ArinWhoWasData(
+        prefix="10.0.0.0/24",
+        data={
+            "net-10-0-0-0-1": [
+                {
+                    "action_date": "05-01-2010",
+                    "net_name": "NET0",
+                    "organization": "ORG-B",
+                    "tech_pocs": "TECH-RIPE",
+                },
+                {
+                    "action_date": "01-01-2000",
+                    "net_name": "NET0",
+                    "organization": "ORG-A",
+                    "tech_pocs": "TECH-ARIN",
+                },
+                {
+                    "action_date": "03-01-2005",
+                    "net_name": "NET0",
+                    "organization": "ORG-A",
+                    "tech_pocs": "",
+                },
+            ],
+            "org-a": [{"org_name": "Org A"}, {"org_name": "Org A renamed"}],
+            "org-b": [{"org_name": "Org B"}],
+        },
+    )
+
+    assert list(data.net_entries.keys()) == ["net-10-0-0-0-1"]
+    assert list(data.org_entries.keys()) == ["org-a", "org-b"]
+    assert data.entity_data("org-a", "org_name") == "Org A"
+    assert data.entity_data("org-c", "org_name") is None
+
+    assert data.registration_history("NET-10-0-0-0-1", rir_fallback="ARIN") == [
+        {
+            "date": datetime.datetime(2000, 1, 1),
+            "org_name": "Org A",
+            "org_handle": "ORG-A",
+            "rir": "ARIN",
+        },
+        {
+            "date": datetime.datetime(2010, 5, 1),
+            "org_name": "Org B",
+            "org_handle": "ORG-B",
+            "rir": "RIPE",
+        },
+    ]
+    assert data.registration_history("NET-10-0-1-0-1") == []
+
+    data.update({})
+    assert data.net_entries == {}
+
+    # assigning data directly does not leave a stale index
+
+    data.data = {"org-c": [{"org_name": "Org C"}]}
+    assert data.entity_data("org-c", "org_name") == "Org C"
+
+
+def test_arin_api_throttle(db, mocker, settings):
+    from prefix_meta.models import Throttle
+    from prefix_meta.sources.arin.base import ArinAPIRequest
+
+    settings.ARIN_API_REQUEST_INTERVAL = 0
+    settings.ARIN_API_THROTTLE_WINDOW = 15
+
+    sleep = mocker.patch("prefix_meta.models.time.sleep")
+    get = mocker.patch("fullctl.django.models.abstract.meta.requests.get")
+
+    get.return_value.status_code = 400
+    get.return_value.content = b"<error><code>E_TOO_MANY_REQUESTS</code></error>"
+
+    ArinAPIRequest.send_request("https://reg.arin.net/rest/")
+
+    throttle = Throttle.objects.get(source="arin-api")
+    assert throttle.throttled == 1
+    sleep.assert_not_called()
+
+    # every subsequent arin request waits for the throttle window
+
+    get.return_value.status_code = 200
+    get.return_value.content = b"<ticket></ticket>"
+
+    ArinAPIRequest.send_request("https://reg.arin.net/rest/")
+
+    assert sleep.call_count == 1
+    assert 14 < sleep.call_args[0][0] <= 15
+
+
+def test_throttle_wait_rethrottled(db, mocker):
+    from prefix_meta.models import Throttle
+
+    Throttle.reserve("test", interval=10)
+
+    # another worker is throttled while we wait for our slot
+
+    def sleep(seconds):
+        if sleep.calls == 0:
+            Throttle.throttle("test", window=60)
+        sleep.calls += 1
+
+    sleep.calls = 0
+    mocker.patch("prefix_meta.models.time.sleep", side_effect=sleep)
+
+    waited = Throttle.wait("test", interval=10)
+
+    assert sleep.calls == 2
+    assert 60 < waited <= 70
+
+
+def test_throttle_reserve_interval(db):
+    from prefix_meta.models import Throttle
+
+    first = Throttle.reserve("test", interval=2)
+    second = Throttle.reserve("test", interval=2)
+
+    assert (second - first).total_seconds() == 2
+
+
+def _prepare_data_recursive(data):
+    """
+    Previous recursive `ArinWhoWasRequest.prepare_data` implementation
+    """
+
+    if isinstance(data, dict):
+        return {
+            k.lower().replace(" ", "_").replace("/", "_"): _prepare_data_recursive(v)
+            for k, v in data.items()
+        }
+    elif isinstance(data, list):
+        return [_prepare_data_recursive(v) for v in data]
+    else:
+        return data
+
+
+def test_normalize_keys():
+    assert normalize_keys(
+        {"Net Handle": [{"Start/End Address": {"A B": 1}}, [{"X": None}], 2]}
+    ) == {"net_handle": [{"start_end_address": {"a_b": 1}}, [{"x": None}], 2]}
+    assert normalize_keys("Net Handle") == "Net Handle"
+
+
+def test_normalize_keys_matches_recursive():
+    data = parse_report_zip(make_report(nets=20, actions=5))
+
+    iterative = normalize_keys(data)
+    recursive = _prepare_data_recursive(data)
+
+    assert iterative == recursive
+    assert list(iterative.keys()) == list(recursive.keys())
+
+
+@pytest.mark.benchmark
+def test_normalize_keys_benchmark():
+    data = parse_report_zip(make_report(nets=2000, actions=20))
+    rows = sum(len(entries) for entries in data.values())
+
+    t = time.perf_counter()
+    recursive = _prepare_data_recursive(data)
+    t_recursive = time.perf_counter() - t
+
+    t = time.perf_counter()
+    iterative = normalize_keys(data)
+    t_iterative = time.perf_counter() - t
+
+    print(
+        f"normalize keys ({rows} rows): "
+        f"recursive {rows / t_recursive:.0f} rows/s, "
+        f"iterative {rows / t_iterative:.0f} rows/s"
+    )
+
+    assert iterative == recursive
@@ -0,0 +1,88 @@
+import time
+
+import pytest
+
+from prefix_meta.enrich import ENRICH_SOURCES, enrich, enrich_sources
+
+
+@pytest.fixture
+def enrich_settings(settings):
+    settings.ENRICH_SOURCES = ""
+    settings.ENRICH_SOURCE_TIMEOUT = 30.0
+    settings.ENRICH_DEADLINE = 60.0
+    settings.ENRICH_WORKERS = 8
+    settings.IP2LOCATION_API_KEY = ""
+    return settings
+
+
+def mock_source(mocker, name, delay=0, data=None, error=None):
+    def request(prefixes):
+        time.sleep(delay)
+        if error:
+            raise error
+        response = mocker.Mock()
+        response.response.data = data
+        return {f"{prefix}": response for prefix in prefixes}
+
+    return mocker.patch.object(ENRICH_SOURCES[name], "request", side_effect=request)
+
+
+def test_enrich_sources(enrich_settings):
+    assert "ip2location" not in enrich_sources()
+    assert "rdap" in enrich_sources()
+
+    enrich_settings.ENRICH_SOURCES = "rdap, irrexplorer"
+    assert list(enrich_sources().keys()) == ["rdap", "irrexplorer"]
+
+    with pytest.raises(ValueError):
+        enrich_sources(["rdap", "unknown"])
+
+
+def test_enrich(enrich_settings, mocker):
+    mock_source(mocker, "rdap", delay=0.3, data={"inetnum": {}})
+    mock_source(mocker, "irrexplorer", delay=0.3, data=[])
+    mock_source(mocker, "ripestat-rir", error=ValueError("rir failed"))
+    mock_source(mocker, "ripestat-routingstatus", delay=3)
+
+    report = enrich(
+        ["10.0.0.0/24", "10.0.1.0/24"],
+        sources=["rdap", "irrexplorer", "ripestat-rir", "ripestat-routingstatus"],
+        timeout=0.6,
+    )
+
+    # sources are requested concurrently and slow sources are not waited on
+    assert report["duration"] < 1.5
+
+    assert report["prefixes"] == ["10.0.0.0/24", "10.0.1.0/24"]
+
+    rdap = report["sources"]["rdap"]
+    assert rdap["status"] == "ok"
+    assert rdap["data"] == {
+        "10.0.0.0/24": {"inetnum": {}},
+        "10.0.1.0/24": {"inetnum": {}},
+    }
+    assert rdap["duration"] >= 0.3
+
+    assert report["sources"]["irrexplorer"]["status"] == "ok"
+
+    rir = report["sources"]["ripestat-rir"]
+    assert rir["status"] == "error"
+    assert rir["error"] == "rir failed"
+
+    routing_status = report["sources"]["ripestat-routingstatus"]
+    assert routing_status["status"] == "timeout"
+    assert routing_status["data"] is None
+    assert routing_status["duration"] >= 0.6
+
+
+def test_enrich_deadline(enrich_settings, mocker):
+    enrich_settings.ENRICH_WORKERS = 1
+
+    mock_source(mocker, "rdap", delay=0.4, data={})
+    mock_source(mocker, "irrexplorer", delay=0.4, data={})
+
+    report = enrich("10.0.0.0/24", sources=["rdap", "irrexplorer"], deadline=0.6)
+
+    assert report["duration"] < 1
+    assert report["sources"]["rdap"]["status"] == "ok"
+    assert report["sources"]["irrexplorer"]["status"] == "timeout"
@@ -1,4 +1,37 @@
-from django_prefixctl.irr import perform_irr_import
+import io
+import json
+
+import pytest
+import reversion
+from django.contrib.contenttypes.models import ContentType
+from reversion.models import Revision
+
+import django_prefixctl.irr
+from django_prefixctl.irr import (
+    aggregate_prefixes,
+    expand_as_set,
+    iter_bgpq4_rows,
+    perform_irr_import,
+)
+from django_prefixctl.models import IRRExpansion, Prefix, PrefixSet, PrefixSetChangeset
+
+
+def mock_bgpq4(mocker, output, error=b""):
+    """
+    Mocks the bgpq4 process, set `output` or `error` on the
+    returned mock to change what the next process returns
+    """
+
+    def popen(command, stdout=None, stderr=None):
+        stderr.write(bgpq4.error)
+        process = mocker.Mock(returncode=0)
+        process.stdout = io.BytesIO(bgpq4.output.encode())
+        return process
+
+    bgpq4 = mocker.patch("django_prefixctl.irr.subprocess.Popen", side_effect=popen)
+    bgpq4.output = output
+    bgpq4.error = error
+    return bgpq4
 
 
 def test_import_prefixes_when_irr_import_is_disabled(db, account_objects):
@@ -18,13 +51,8 @@ def test_import_prefixes_when_irr_import_is_enabled(db, account_objects, mocker)
 
     assert prefixset.prefix_set.all().count() == 0
 
-    # Mock subprocess.run()
-    mock_run = mocker.patch("django_prefixctl.irr.subprocess.run")
-    mock_run.return_value.stdout.decode.return_value = (
-        '{"NN": [{"prefix": "192.0.2.0/24", "exact": true}]}'
-    )
-    # Set a return value for stderr to avoid raising an exception
-    mock_run.return_value.stderr = b""
+    # Mock the bgpq4 process
+    mock_bgpq4(mocker, '{"NN": [{"prefix": "192.0.2.0/24", "exact": true}]}')
 
     result = perform_irr_import(prefixset, as_set)
 
@@ -45,21 +73,17 @@ def test_import_prefixes_to_be_updated(db, account_objects, mocker):
     prefixset.save()
     as_set = "AS-EXAMPLE"
 
-    # Mock subprocess.run()
-    mock_run = mocker.patch("django_prefixctl.irr.subprocess.run")
-    mock_run.return_value.stdout.decode.return_value = (
-        '{"NN": [{"prefix": "192.168.0.0/24", "exact": ""}]}'
-    )
-    # Set a return value for stderr to avoid raising an exception
-    mock_run.return_value.stderr = b""
+    # Mock the bgpq4 process
+    mock_bgpq4(mocker, '{"NN": [{"prefix": "192.168.0.0/24", "exact": ""}]}')
 
     result = perform_irr_import(prefixset, as_set)
 
     assert result == {
         "added": [],
         "updated": [("192.168.0.0/24", "")],
-        "removed": [("192.168.0.0/24", "exact")],
+        "removed": [],
     }
+    assert prefixset.prefix_set.get().mask_length_range == ""
     assert prefixset.prefix_set_irr_importer.require_task_schedule
     assert prefixset.prefix_set_irr_importer.task_schedule
 
@@ -73,13 +97,8 @@ def test_import_prefixes_to_be_deleted(db, account_objects, mocker):
 
     assert prefixset.prefix_set.all().count() == 1
 
-    # Mock subprocess.run()
-    mock_run = mocker.patch("django_prefixctl.irr.subprocess.run")
-    mock_run.return_value.stdout.decode.return_value = (
-        '{"NN": [{"prefix": "192.0.2.0/24", "exact": true}]}'
-    )
-    # Set a return value for stderr to avoid raising an exception
-    mock_run.return_value.stderr = b""
+    # Mock the bgpq4 process
+    mock_bgpq4(mocker, '{"NN": [{"prefix": "192.0.2.0/24", "exact": true}]}')
 
     result = perform_irr_import(prefixset, as_set)
 
@@ -92,3 +111,261 @@ def test_import_prefixes_to_be_deleted(db, account_objects, mocker):
     }
     assert prefixset.prefix_set_irr_importer.require_task_schedule
     assert prefixset.prefix_set_irr_importer.task_schedule
+
+
+def test_import_prefixes_bulk(
+    db, account_objects, mocker, django_assert_max_num_queries
+):
+    prefixset = account_objects.prefixset
+    prefixset.irr_import = True
+    prefixset.save()
+    as_set = "AS-EXAMPLE"
+
+    def bgpq4_output(prefixes):
+        return json.dumps(
+            {"NN": [{"prefix": prefix, "exact": exact} for prefix, exact in prefixes]}
+        )
+
+    bgpq4 = mock_bgpq4(
+        mocker,
+        bgpq4_output([(f"10.{i // 256}.{i % 256}.0/24", True) for i in range(2000)]),
+    )
+
+    with django_assert_max_num_queries(20):
+        result = perform_irr_import(prefixset, as_set)
+
+    assert len(result["added"]) == 2000
+    assert prefixset.prefix_set.count() == 2000
+
+    # change the mask length range of one prefix, drop one and add one
+
+    IRRExpansion.objects.all().delete()
+
+    # the audit log looks up the prefix content type on delete, warm its
+    # cache so the query count does not depend on test order
+
+    ContentType.objects.get_for_model(Prefix)
+
+    bgpq4.output = bgpq4_output(
+        [("10.0.0.0/24", False)]
+        + [(f"10.{i // 256}.{i % 256}.0/24", True) for i in range(1, 1999)]
+        + [("10.200.0.0/24", True)]
+    )
+
+    with django_assert_max_num_queries(20):
+        result = perform_irr_import(prefixset, as_set)
+
+    assert result == {
+        "added": [("10.200.0.0/24", "exact")],
+        "updated": [("10.0.0.0/24", "")],
+        "removed": [("10.7.207.0/24", "exact")],
+    }
+    assert prefixset.prefix_set.count() == 2000
+    assert prefixset.prefix_set.get(prefix="10.0.0.0/24").mask_length_range == ""
+
+
+def test_import_prefixes_shared_expansion(db, account_objects, mocker, settings):
+    settings.IRR_EXPANSION_CACHE_EXPIRY = 3600
+
+    prefixset = account_objects.prefixset
+    prefixset.irr_import = True
+    prefixset.save()
+
+    prefixset_b = PrefixSet.objects.create(
+        instance=account_objects.prefixctl_instance,
+        name="Test Prefixes B",
+        irr_import=True,
+    )
+
+    bgpq4 = mock_bgpq4(mocker, '{"NN": [{"prefix": "192.0.2.0/24", "exact": true}]}')
+
+    perform_irr_import(prefixset, "AS-EXAMPLE", "RIPE,ARIN")
+    result = perform_irr_import(prefixset_b, "as-example", "ripe, arin")
+
+    # the AS-SET was expanded once and shared by both prefix sets
+    assert bgpq4.call_count == 1
+    assert result["added"] == [("192.0.2.0/24", "exact")]
+    assert prefixset_b.prefix_set.count() == 1
+
+    # different sources are expanded separately
+
+    perform_irr_import(prefixset_b, "AS-EXAMPLE", "RIPE")
+    assert bgpq4.call_count == 2
+
+    # expired expansions are refreshed
+
+    settings.IRR_EXPANSION_CACHE_EXPIRY = 0
+
+    perform_irr_import(prefixset, "AS-EXAMPLE", "RIPE,ARIN")
+    assert bgpq4.call_count == 3
+    assert IRRExpansion.objects.count() == 2
+
+
+def test_import_prefixes_unchanged(db, account_objects, mocker):
+    prefixset = account_objects.prefixset
+    prefixset.irr_import = True
+    prefixset.save()
+    as_set = "AS-EXAMPLE"
+
+    bgpq4 = mock_bgpq4(mocker, '{"NN": [{"prefix": "192.0.2.0/24", "exact": true}]}')
+
+    result = perform_irr_import(prefixset, as_set)
+    assert result["added"] == [("192.0.2.0/24", "exact")]
+
+    apply_irr_import = mocker.spy(django_prefixctl.irr, "apply_irr_import")
+
+    result = perform_irr_import(prefixset, as_set)
+
+    assert result == {"added": [], "updated": [], "removed": [], "unchanged": True}
+    apply_irr_import.assert_not_called()
+
+    # manual changes to the prefix set are reconciled by the next import
+
+    prefixset.prefix_set.all().delete()
+
+    result = perform_irr_import(prefixset, as_set)
+
+    assert result["added"] == [("192.0.2.0/24", "exact")]
+    assert "unchanged" not in result
+    assert apply_irr_import.call_count == 1
+
+    # changed expansions are imported
+
+    IRRExpansion.objects.all().delete()
+    bgpq4.output = '{"NN": [{"prefix": "192.0.2.0/24", "exact": false}]}'
+
+    result = perform_irr_import(prefixset, as_set)
+
+    assert result["updated"] == [("192.0.2.0/24", "")]
+    assert apply_irr_import.call_count == 2
+
+
+def test_iter_bgpq4_rows():
+    rows = [{"prefix": f"10.0.{i}.0/24", "exact": i % 2 == 0} for i in range(200)]
+    output = json.dumps({"NN": rows}, indent=2)
+
+    # rows spanning chunk boundaries are parsed once they are complete
+    for chunk_size in [1, 7, 64, 65536]:
+        assert list(iter_bgpq4_rows(io.StringIO(output), chunk_size)) == rows
+
+    assert list(iter_bgpq4_rows(io.StringIO('{"NN": []}'))) == []
+
+    with pytest.raises(ValueError):
+        list(iter_bgpq4_rows(io.StringIO(output[:-50])))
+
+    with pytest.raises(ValueError):
+        list(iter_bgpq4_rows(io.StringIO("")))
+
+
+def test_expand_as_set_errors(mocker):
+    bgpq4 = mock_bgpq4(mocker, "", error=b"ERROR:Unable to resolve AS-EXAMPLE")
+
+    with pytest.raises(Exception, match="Unable to resolve"):
+        expand_as_set("AS-EXAMPLE")
+
+    bgpq4.error = b""
+    bgpq4.output = '{"NN": [{"prefix": "192.0.2.0/24"'
+
+    with pytest.raises(Exception, match="could not parse bgpq4 output"):
+        expand_as_set("AS-EXAMPLE")
+
+
+def test_aggregate_prefixes():
+    assert aggregate_prefixes({"10.0.0.0/24": "exact", "10.0.1.0/24": "exact"}) == {
+        "10.0.0.0/23": "24..24"
+    }
+
+    assert aggregate_prefixes(
+        {
+            "10.0.0.0/23": "exact",
+            "10.0.0.0/24": "exact",
+            "10.0.1.0/24": "exact",
+            "10.0.2.0/24": "exact",
+        }
+    ) == {"10.0.0.0/23": "23..24", "10.0.2.0/24": "exact"}
+
+    # prefixes that are not adjacent are left alone
+    assert aggregate_prefixes(
+        {"10.0.0.0/24": "exact", "10.0.2.0/24": "exact", "2001:db8::/32": "exact"}
+    ) == {"10.0.0.0/24": "exact", "10.0.2.0/24": "exact", "2001:db8::/32": "exact"}
+
+    # mask length ranges are kept as they are and not aggregated further
+    assert aggregate_prefixes(
+        {"10.0.0.0/23": "23..24", "10.0.2.0/24": "exact", "10.0.3.0/24": "exact"}
+    ) == {"10.0.0.0/23": "23..24", "10.0.2.0/23": "24..24"}
+
+
+def test_import_prefixes_aggregate(db, account_objects, mocker):
+    prefixset = account_objects.prefixset
+    prefixset.irr_import = True
+    prefixset.irr_aggregate = True
+    prefixset.save()
+
+    mock_bgpq4(
+        mocker,
+        json.dumps(
+            {
+                "NN": [
+                    {"prefix": "192.0.2.0/25", "exact": True},
+                    {"prefix": "192.0.2.128/25", "exact": True},
+                    {"prefix": "198.51.100.0/24", "exact": True},
+                ]
+            }
+        ),
+    )
+
+    result = perform_irr_import(prefixset, "AS-EXAMPLE")
+
+    assert sorted(result["added"]) == [
+        ("192.0.2.0/24", "25..25"),
+        ("198.51.100.0/24", "exact"),
+    ]
+    assert prefixset.prefix_set.all().count() == 2
+
+
+def test_import_prefixes_changeset(db, account_objects, mocker, settings):
+    prefixset = account_objects.prefixset
+    prefixset.irr_import = True
+    prefixset.save()
+
+    settings.IRR_IMPORT_REVISIONS = True
+
+    mock_bgpq4(
+        mocker,
+        json.dumps(
+            {"NN": [{"prefix": f"10.0.{i}.0/24", "exact": True} for i in range(50)]}
+        ),
+    )
+
+    revisions = Revision.objects.count()
+
+    with reversion.create_revision():
+        perform_irr_import(prefixset, "AS-EXAMPLE")
+
+    # one changeset revision, no version per imported prefix
+
+    assert Revision.objects.count() == revisions + 1
+
+    changeset = PrefixSetChangeset.objects.get()
+    revision = changeset.revision
+
+    assert changeset.prefix_set == prefixset
+    assert changeset.operation == "irr_import"
+    assert len(changeset.added) == 50
+    assert changeset.changed == []
+    assert changeset.removed == []
+    assert not revision.version_set.exists()
+
+    # automated imports can opt out of revisions
+
+    settings.IRR_IMPORT_REVISIONS = False
+    IRRExpansion.objects.all().delete()
+    bgpq4_output = {"NN": [{"prefix": "10.0.0.0/24", "exact": True}]}
+    mock_bgpq4(mocker, json.dumps(bgpq4_output))
+
+    with reversion.create_revision():
+        result = perform_irr_import(prefixset, "AS-EXAMPLE")
+
+    assert len(result["removed"]) == 49
+    assert Revision.objects.count() == revisions + 1
+    assert PrefixSetChangeset.objects.count() == 1
@@ -0,0 +1,86 @@
+import ipaddress
+
+from prefix_meta.sources.irr_explorer import IRRExplorerData
+
+DATA = [
+    {
+        "prefix": "192.0.2.0/24",
+        "irrRoutes": {
+            "RIPE": [
+                {"asn": 64496, "rpslPk": "192.0.2.0/24AS64496"},
+                {"asn": 64497, "rpslPk": "192.0.2.0/24AS64497"},
+            ],
+            "RADB": [{"asn": 64496, "rpslPk": "192.0.2.0/24AS64496"}],
+        },
+    },
+    {
+        "prefix": "192.0.2.0/25",
+        "irrRoutes": {"RADB": [{"asn": 64496, "rpslPk": "192.0.2.0/25AS64496"}]},
+    },
+    {"prefix": "192.0.2.128/25", "irrRoutes": {}},
+]
+
+
+def test_route_objects():
+    data = IRRExplorerData(prefix="192.0.2.0/24", data=DATA)
+
+    route_objects = data.route_objects()
+
+    assert len(route_objects) == 4
+    assert route_objects[0] == {
+        "asn": 64496,
+        "rpslPk": "192.0.2.0/24AS64496",
+        "prefix": "192.0.2.0/24",
+        "ip_address": "192.0.2.0/24",
+        "dataset": "RIPE",
+    }
+
+    # stored data is left untouched and changes to the result
+    # do not leak into later calls
+
+    assert "dataset" not in DATA[0]["irrRoutes"]["RIPE"][0]
+
+    route_objects[0]["asn"] = 1
+    route_objects.clear()
+    data.filter_routes().clear()
+
+    route_objects = data.route_objects()
+    assert len(route_objects) == 4
+    assert route_objects[0]["asn"] == 64496
+
+
+def test_route_objects_filters():
+    data = IRRExplorerData(prefix="192.0.2.0/24", data=DATA)
+
+    assert sorted(data.datasets) == ["RADB", "RIPE"]
+    assert sorted(data.origins) == [64496, 64497]
+
+    assert [r["prefix"] for r in data.route_objects(dataset="RADB")] == [
+        "192.0.2.0/24",
+        "192.0.2.0/25",
+    ]
+    assert [r["dataset"] for r in data.route_objects(origin=64496)] == [
+        "RIPE",
+        "RADB",
+        "RADB",
+    ]
+    assert [r.prefix for r in data.filter_routes(dataset="RIPE", origin=64497)] == [
+        "192.0.2.0/24"
+    ]
+    assert data.route_objects(dataset="ARIN") == []
+
+
+def test_matched_subnets():
+    data = IRRExplorerData(prefix="192.0.2.0/24", data=DATA)
+
+    # one subnet per route object, same as before the route table
+
+    assert list(data.get_matched_subnets) == [
+        ipaddress.ip_network("192.0.2.0/24"),
+        ipaddress.ip_network("192.0.2.0/24"),
+        ipaddress.ip_network("192.0.2.0/24"),
+        ipaddress.ip_network("192.0.2.0/25"),
+    ]
+
+    data.update([])
+    assert list(data.get_matched_subnets) == []
@@ -1,5 +1,11 @@
+import importlib
+import ipaddress
+
+from django.apps import apps as django_apps
 from django.conf import settings
 
+from django_prefixctl.models import Prefix, mask_length_bounds
+
 
 def test_asn_set(db, account_objects):
     asn_set = account_objects.asn_set
@@ -88,6 +94,115 @@ def test_prefix(db, account_objects):
     assert prefix.prefix == "192.168.0.0/24"
     assert prefix.prefix_set == prefixset
     assert prefix.mask_length_range == "exact"
+    assert (prefix.min_len, prefix.max_len) == (24, 24)
+
+
+def test_mask_length_bounds():
+    assert mask_length_bounds("10.0.0.0/16", "exact") == (16, 16)
+    assert mask_length_bounds("10.0.0.0/16", "") == (16, 16)
+    assert mask_length_bounds("10.0.0.0/16", "16..24") == (16, 24)
+    assert mask_length_bounds("2001:db8::/32", "32..48") == (32, 48)
+    assert mask_length_bounds("10.0.0.0/16", "[24, 24]") == (None, None)
+    assert mask_length_bounds("invalid", "exact") == (None, None)
+
+
+def test_prefix_mask_lengths(db, account_objects):
+    prefixset = account_objects.prefixset
+
+    prefix = Prefix.objects.create(
+        prefix_set=prefixset, prefix="10.0.0.0/16", mask_length_range="16..24"
+    )
+    assert (prefix.min_len, prefix.max_len) == (16, 24)
+
+    prefix.mask_length_range = "exact"
+    prefix.save(update_fields=["mask_length_range"])
+    prefix.refresh_from_db()
+    assert (prefix.min_len, prefix.max_len) == (16, 16)
+
+    prefix.mask_length_range = "16..20"
+    prefix.save()
+
+    Prefix.objects.create(
+        prefix_set=prefixset, prefix="10.1.0.0/24", mask_length_range="exact"
+    )
+
+    def prefixes(qs):
+        return sorted(f"{prefix.prefix}" for prefix in qs)
+
+    assert prefixes(prefixset.prefix_set.permitting_length(24)) == ["10.1.0.0/24"]
+    assert prefixes(prefixset.prefix_set.permitting_length(18)) == ["10.0.0.0/16"]
+
+    assert prefixes(prefixset.prefix_set.permitting("10.0.128.0/17")) == ["10.0.0.0/16"]
+    assert prefixes(prefixset.prefix_set.permitting("10.0.0.0/24")) == []
+    assert prefixes(prefixset.prefix_set.permitting("10.1.0.0/24")) == ["10.1.0.0/24"]
+
+
+def test_prefix_search(db, account_objects):
+    prefixset = account_objects.prefixset
+
+    for prefix in [
+        "10.0.0.0/8",
+        "10.0.0.0/16",
+        "10.0.0.0/24",
+        "10.0.0.0/25",
+        "10.0.0.128/25",
+        "10.1.0.0/16",
+        "192.168.0.0/24",
+        "2001:db8::/32",
+    ]:
+        Prefix.objects.create(prefix_set=prefixset, prefix=prefix)
+
+    def search(query):
+        return [f"{prefix.prefix}" for prefix in prefixset.prefix_set.search(query)]
+
+    # longest match first, then covered prefixes
+
+    assert search("10.0.0.0/24") == [
+        "10.0.0.0/24",
+        "10.0.0.0/16",
+        "10.0.0.0/8",
+        "10.0.0.0/25",
+        "10.0.0.128/25",
+    ]
+    assert search("10.0.0.1") == [
+        "10.0.0.0/25",
+        "10.0.0.0/24",
+        "10.0.0.0/16",
+        "10.0.0.0/8",
+    ]
+    assert search("10.1.0.0/17") == ["10.1.0.0/16", "10.0.0.0/8"]
+    assert search("2001:db8:1::1") == ["2001:db8::/32"]
+    assert search("172.16.0.0/12") == []
+
+    # substring fallback
+
+    assert search("192.168") == ["192.168.0.0/24"]
+    assert search("/25") == ["10.0.0.0/25", "10.0.0.128/25"]
+    assert search("") == []
+
+
+def test_populate_mask_lengths(db, account_objects):
+    migration = importlib.import_module(
+        "django_prefixctl.migrations.0024_prefix_mask_lengths"
+    )
+    prefixset = account_objects.prefixset
+
+    Prefix.objects.create(
+        prefix_set=prefixset, prefix="10.0.0.0/16", mask_length_range="16..24"
+    )
+    Prefix.objects.create(
+        prefix_set=prefixset, prefix="10.1.0.0/16", mask_length_range=""
+    )
+    Prefix.objects.update(min_len=None, max_len=None)
+
+    migration.populate_mask_lengths(django_apps, None)
+
+    assert sorted(Prefix.objects.values_list("prefix", "min_len", "max_len")) == sorted(
+        [
+            (ipaddress.ip_network("10.0.0.0/16"), 16, 24),
+            (ipaddress.ip_network("10.1.0.0/16"), 16, 16),
+        ]
+    )
 
 
 def test_asn_monitor(db, account_objects):
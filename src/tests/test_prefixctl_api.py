@@ -1,11 +1,22 @@
 import json
+import time
 import pytest
 from datetime import timedelta
+from urllib.parse import urlencode
 
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
+from fullctl.django.tasks.orm import work_task
+from reversion.models import Version
 
 import django_prefixctl.models.prefixctl as models
+from django_prefixctl.models.tasks import DeletePrefixSetsTask
+from django_prefixctl.rest.serializers.prefixctl import (
+    Serializers as PrefixSetSerializers,
+    prefix_values,
+)
 
 
 def test_prefixset_list(db, account_objects):
@@ -25,6 +36,123 @@ def test_prefixset_list(db, account_objects):
     assert data[0]["status"] == prefixset.status
 
 
+def test_prefixset_list_queries(db, account_objects):
+    client = account_objects.api_client
+    org = account_objects.org
+    instance = account_objects.prefixctl_instance
+    url = reverse("prefixctl_api:prefix_set-list", args=(org.slug,))
+
+    def create_prefix_sets(count):
+        for i in range(count):
+            n = models.PrefixSet.objects.count()
+            prefix_set = models.PrefixSet.objects.create(
+                instance=instance,
+                name=f"set {n}",
+                irr_import=i % 2 == 0,
+                irr_as_set="AS-EXAMPLE",
+            )
+            for j in range(3):
+                models.Prefix.objects.create(
+                    prefix_set=prefix_set, prefix=f"10.{n}.{j}.0/24"
+                )
+
+    def list_queries():
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+        assert response.status_code == 200
+        return response.json()["data"], len(queries)
+
+    create_prefix_sets(2)
+    data, num_queries = list_queries()
+    assert len(data) == 2
+
+    create_prefix_sets(10)
+    data, num_queries_more = list_queries()
+    assert len(data) == 12
+
+    assert num_queries_more == num_queries
+
+    # same output as serializing each prefix set on its own
+
+    for row in data:
+        prefix_set = models.PrefixSet.objects.get(id=row["id"])
+        expected = json.loads(
+            json.dumps(PrefixSetSerializers.prefix_set(prefix_set).data)
+        )
+        for field in ["prefixes", "monitors", "num_prefixes", "num_monitors"]:
+            assert row[field] == expected[field]
+        assert row["irr_import_status"] == prefix_set.irr_import_status
+
+
+def test_prefixset_sparse_fields(db, account_objects):
+    client = account_objects.api_client
+    org = account_objects.org
+    prefixset = account_objects.prefixset
+    models.Prefix.objects.create(prefix_set=prefixset, prefix="10.0.0.0/24")
+    url = reverse("prefixctl_api:prefix_set-list", args=(org.slug,))
+
+    def get(url):
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+        assert response.status_code == 200
+        return response.json()["data"], len(queries)
+
+    full, num_queries_full = get(url)
+    assert "prefixes" in full[0]
+    assert "monitors" in full[0]
+
+    # summary view
+
+    summary, num_queries_summary = get(f"{url}?view=summary")
+    assert len(summary) == 1
+    assert "prefixes" not in summary[0]
+    assert "monitors" not in summary[0]
+    assert summary[0]["name"] == prefixset.name
+    assert summary[0]["num_prefixes"] == 1
+    assert num_queries_summary < num_queries_full
+
+    # explicit fields, id is always included
+
+    data, _ = get(f"{url}?fields=name,num_prefixes")
+    assert data == [{"id": prefixset.id, "name": prefixset.name, "num_prefixes": 1}]
+
+    # retrieve
+
+    url = reverse(
+        "prefixctl_api:prefix_set-detail",
+        kwargs={"org_tag": org.slug, "pk": prefixset.id},
+    )
+    data, _ = get(f"{url}?fields=name")
+    assert data == [{"id": prefixset.id, "name": prefixset.name}]
+
+
+def test_search_prefix(db, account_objects):
+    prefixset = account_objects.prefixset
+    client = account_objects.api_client
+    org = account_objects.org
+    url = reverse("prefixctl_api:prefix_set-search-prefix", args=(org.slug,))
+
+    models.Prefix.objects.create(prefix_set=prefixset, prefix="10.0.0.0/16")
+    models.Prefix.objects.create(prefix_set=prefixset, prefix="10.0.0.0/24")
+
+    # prefixes of other instances are not searched
+
+    other_instance = models.Instance.objects.create(org=account_objects.other_org)
+    other_prefixset = models.PrefixSet.objects.create(
+        instance=other_instance, name="Other"
+    )
+    models.Prefix.objects.create(prefix_set=other_prefixset, prefix="10.0.0.0/24")
+
+    response = client.get(url, {"q": "10.0.0.1"})
+    assert response.status_code == 200
+    data = response.json()["data"]
+    assert [row["prefix"] for row in data] == ["10.0.0.0/24", "10.0.0.0/16"]
+    assert {row["prefix_set"] for row in data} == {prefixset.id}
+
+    response = client.get(url, {"q": "10.0"})
+    assert len(response.json()["data"]) == 2
+
+
 def test_prefixset_retreive(db, account_objects):
     prefixset = account_objects.prefixset
     client = account_objects.api_client
@@ -382,6 +510,136 @@ def test_list_prefixset_prefixes(db, account_objects):
     assert data[0]["status"] == "ok"
 
 
+def create_prefixes(prefix_set, count):
+    models.Prefix.objects.bulk_create(
+        [
+            models.Prefix(
+                prefix_set=prefix_set,
+                prefix=f"{10 + i // 65536}.{i // 256 % 256}.{i % 256}.0/24",
+                mask_length_range="24-32" if i % 2 else "exact",
+                min_len=24,
+                max_len=32 if i % 2 else 24,
+            )
+            for i in range(count)
+        ],
+        batch_size=5000,
+    )
+
+
+def test_prefix_values(db, account_objects):
+    prefixset = account_objects.prefixset
+    org = account_objects.org
+    create_prefixes(prefixset, 10)
+    for prefix in ["2001:db8::/32", "2001:db8:0:1::/64", "::ffff:10.0.0.0/104"]:
+        models.Prefix.objects.create(prefix_set=prefixset, prefix=prefix)
+
+    def serialize(queryset):
+        regular = json.loads(
+            json.dumps(PrefixSetSerializers.prefix(list(queryset), many=True).data)
+        )
+        fast = json.loads(
+            json.dumps(PrefixSetSerializers.prefix(queryset, many=True).data)
+        )
+        return regular, fast
+
+    regular, fast = serialize(models.Prefix.objects.order_by("id"))
+    assert len(fast) == 13
+    assert fast == regular
+    assert prefix_values(models.Prefix.objects.order_by("id")) == regular
+
+    # grainy namespace follows the org permission id
+
+    org.remote_id = 12345
+    org.save()
+
+    regular, fast = serialize(models.Prefix.objects.order_by("id"))
+    assert fast[0]["grainy"].startswith("prefix.12345.")
+    assert fast == regular
+
+    # nested under a prefix set
+
+    data = PrefixSetSerializers.prefix_set(prefixset).data
+    assert sorted(data["prefixes"], key=lambda row: row["id"]) == fast
+
+
+@pytest.mark.benchmark
+def test_prefix_values_benchmark(db, account_objects):
+    prefixset = account_objects.prefixset
+    create_prefixes(prefixset, 100000)
+    queryset = prefixset.prefix_set.order_by("id")
+
+    t = time.perf_counter()
+    regular = PrefixSetSerializers.prefix(list(queryset), many=True).data
+    t_regular = time.perf_counter() - t
+
+    t = time.perf_counter()
+    fast = prefix_values(queryset)
+    t_fast = time.perf_counter() - t
+
+    print(
+        f"serialize prefixes ({len(fast)} rows): "
+        f"model serializer {t_regular:.3f}s, values_list {t_fast:.3f}s"
+    )
+
+    assert len(fast) == 100000
+    assert fast == json.loads(json.dumps(regular))
+
+
+def test_list_prefixset_prefixes_paginated(db, account_objects, settings):
+    settings.PREFIX_PAGE_SIZE_MAX = 5
+    prefixset = account_objects.prefixset
+    client = account_objects.api_client
+    org = account_objects.org
+
+    expected = [f"10.0.{i}.0/24" for i in range(12)] + ["2001:db8::/32"]
+    for prefix in reversed(expected):
+        models.Prefix.objects.create(prefix_set=prefixset, prefix=prefix)
+
+    url = reverse(
+        "prefixctl_api:prefix_set-prefixes",
+        kwargs={"org_tag": org.slug, "pk": prefixset.id},
+    )
+
+    # page through all prefixes, limit is capped at PREFIX_PAGE_SIZE_MAX
+
+    prefixes = []
+    pages = 0
+    query = {"limit": 100, "count": 1}
+
+    while True:
+        response = client.get(url, query)
+        assert response.status_code == 200
+        assert response["X-Total-Count"] == "13"
+        data = response.json()["data"]
+        assert len(data) <= 5
+        prefixes.extend(row["prefix"] for row in data)
+        pages += 1
+        if "X-Next-Cursor" not in response:
+            break
+        assert 'rel="next"' in response["Link"]
+        query["cursor"] = response["X-Next-Cursor"]
+
+    assert pages == 3
+    assert prefixes == expected
+
+    # cursors are stable, prefixes added before the cursor are not repeated
+
+    response = client.get(url, {"limit": 2})
+    cursor = response["X-Next-Cursor"]
+    assert "X-Total-Count" not in response
+    models.Prefix.objects.create(prefix_set=prefixset, prefix="9.0.0.0/8")
+
+    response = client.get(url, {"limit": 2, "cursor": cursor})
+    assert [row["prefix"] for row in response.json()["data"]] == expected[2:4]
+
+    # invalid parameters
+
+    response = client.get(url, {"cursor": "invalid"})
+    assert response.status_code == 400
+    response = client.get(url, {"limit": 0})
+    assert response.status_code == 400
+
+
 def test_add_prefix_to_prefixset(db, account_objects):
     prefixset = account_objects.prefixset
     client = account_objects.api_client
@@ -433,6 +691,96 @@ def test_add_prefixes_to_prefixset(db, account_objects):
     assert response.status_code == 200
     assert prefixset.prefix_set.all().count() == 2
 
+    # the prefixes are recorded as one changeset instead of a version each
+    changeset = prefixset.changeset_set.get()
+    assert changeset.operation == "add_prefixes"
+    assert sorted(changeset.added) == [
+        ["172.16.0.0/16", "exact"],
+        ["198.51.100.0/24", "exact"],
+    ]
+    assert not Version.objects.get_for_model(models.Prefix).exists()
+
+
+def test_add_prefixes_upsert(db, account_objects):
+    prefixset = account_objects.prefixset
+    client = account_objects.api_client
+    org = account_objects.org
+    url = reverse(
+        "prefixctl_api:prefix_set-add-prefixes",
+        kwargs={"org_tag": org.slug, "pk": prefixset.id},
+    )
+
+    models.Prefix.objects.create(
+        prefix_set=prefixset, prefix="10.0.0.0/16", mask_length_range="16..24"
+    )
+    models.Prefix.objects.create(prefix_set=prefixset, prefix="10.1.0.0/16")
+
+    # the same prefix in another prefix set is not returned
+
+    other_prefixset = models.PrefixSet.objects.create(
+        instance=prefixset.instance, name="Other"
+    )
+    models.Prefix.objects.create(prefix_set=other_prefixset, prefix="10.2.0.0/16")
+
+    def add_prefixes(prefixes):
+        with CaptureQueriesContext(connection) as queries:
+            response = client.post(
+                url,
+                json.dumps({"prefixes": prefixes}),
+                content_type="application/json",
+            )
+        return response, len(queries)
+
+    response, num_queries = add_prefixes(
+        [
+            # existing, keeps its mask length range
+            "10.0.0.0/16",
+            # existing, mask length range updated
+            {"prefix": "10.1.0.0/16", "mask_length_range": "16..20"},
+            # new
+            {"prefix": "10.2.0.0/16", "mask_length_range": "16..24"},
+            "10.3.0.0/16",
+            "",
+        ]
+    )
+
+    assert response.status_code == 200
+    data = response.json()["data"]
+    assert [
+        (row["prefix"], row["mask_length_range"], row["min_len"], row["max_len"])
+        for row in data
+    ] == [
+        ("10.0.0.0/16", "16..24", 16, 24),
+        ("10.1.0.0/16", "16..20", 16, 20),
+        ("10.2.0.0/16", "16..24", 16, 24),
+        ("10.3.0.0/16", "exact", 16, 16),
+    ]
+    assert all(row["id"] for row in data)
+
+    changeset = prefixset.changeset_set.get()
+    assert sorted(changeset.added) == [
+        ["10.2.0.0/16", "16..24"],
+        ["10.3.0.0/16", "exact"],
+    ]
+    assert changeset.changed == [["10.1.0.0/16", "16..20"]]
+
+    # the number of queries does not depend on the number of prefixes
+
+    response, num_queries_more = add_prefixes([f"10.{i}.0.0/16" for i in range(4, 104)])
+    assert response.status_code == 200
+    assert len(response.json()["data"]) == 100
+    assert prefixset.prefix_set.count() == 104
+    assert num_queries_more == num_queries
+    assert other_prefixset.prefix_set.count() == 1
+
+    # invalid input
+
+    response, _ = add_prefixes(["10.0.0.1/16"])
+    assert response.status_code == 400
+    response, _ = add_prefixes([{"prefix": "10.0.0.0/16", "mask_length_range": "x"}])
+    assert response.status_code == 400
+    assert prefixset.prefix_set.count() == 104
+
 
 def test_delete_prefix_from_prefixset(db, account_objects):
     prefixset = account_objects.prefixset
@@ -454,6 +802,112 @@ def test_delete_prefix_from_prefixset(db, account_objects):
     assert response.status_code == 200
     assert prefixset.prefix_set.all().count() == 0
 
+
+def test_delete_prefixes_from_prefixset(db, account_objects):
+    prefixset = account_objects.prefixset
+    client = account_objects.api_client
+    org = account_objects.org
+    url = reverse(
+        "prefixctl_api:prefix_set-delete-prefixes",
+        kwargs={"org_tag": org.slug, "pk": prefixset.id},
+    )
+
+    prefixes = {}
+    for prefix in [
+        "10.0.0.0/16",
+        "10.0.1.0/24",
+        "10.0.2.0/24",
+        "10.1.0.0/16",
+        "192.168.0.0/24",
+        "192.168.1.0/24",
+    ]:
+        prefixes[prefix] = models.Prefix.objects.create(
+            prefix_set=prefixset, prefix=prefix
+        )
+
+    def delete_prefixes(data):
+        return client.delete(url, json.dumps(data), content_type="application/json")
+
+    # nothing selected
+
+    response = delete_prefixes({})
+    assert response.status_code == 400
+
+    response = delete_prefixes({"covering": "10.0.0.1/16"})
+    assert response.status_code == 400
+
+    # by id, prefix and covering prefix at once
+
+    response = delete_prefixes(
+        {
+            "ids": [prefixes["192.168.1.0/24"].id],
+            "prefixes": ["10.1.0.0/16"],
+            "covering": "10.0.0.0/23",
+        }
+    )
+
+    assert response.status_code == 200
+    assert [row["prefix"] for row in response.json()["data"]] == [
+        "10.0.1.0/24",
+        "10.1.0.0/16",
+        "192.168.1.0/24",
+    ]
+    assert sorted(f"{prefix.prefix}" for prefix in prefixset.prefix_set.all()) == [
+        "10.0.0.0/16",
+        "10.0.2.0/24",
+        "192.168.0.0/24",
+    ]
+
+    changeset = prefixset.changeset_set.get()
+    assert changeset.operation == "delete_prefixes"
+    assert sorted(changeset.removed) == [
+        ["10.0.1.0/24", "exact"],
+        ["10.1.0.0/16", "exact"],
+        ["192.168.1.0/24", "exact"],
+    ]
+
+    # prefixes of other prefix sets are not removed
+
+    other = models.PrefixSet.objects.create(
+        instance=account_objects.prefixctl_instance, name="other"
+    )
+    models.Prefix.objects.create(prefix_set=other, prefix="172.16.0.0/16")
+
+    response = delete_prefixes({"covering": "0.0.0.0/0"})
+    assert response.status_code == 200
+    assert len(response.json()["data"]) == 3
+    assert not prefixset.prefix_set.exists()
+    assert other.prefix_set.count() == 1
+
+
+def test_add_and_delete_prefixes_form_encoded(db, account_objects):
+    prefixset = account_objects.prefixset
+    client = account_objects.api_client
+    org = account_objects.org
+    kwargs = {"org_tag": org.slug, "pk": prefixset.id}
+
+    response = client.post(
+        reverse("prefixctl_api:prefix_set-add-prefixes", kwargs=kwargs),
+        {"prefixes": ["10.0.0.0/16", "10.1.0.0/16"]},
+    )
+    assert response.status_code == 200
+    assert [row["prefix"] for row in response.json()["data"]] == [
+        "10.0.0.0/16",
+        "10.1.0.0/16",
+    ]
+
+    response = client.delete(
+        reverse("prefixctl_api:prefix_set-delete-prefixes", kwargs=kwargs),
+        urlencode({"prefixes": ["10.1.0.0/16"]}, doseq=True),
+        content_type="application/x-www-form-urlencoded",
+    )
+    assert response.status_code == 200
+    assert [row["prefix"] for row in response.json()["data"]] == ["10.1.0.0/16"]
+    assert [f"{prefix.prefix}" for prefix in prefixset.prefix_set.all()] == [
+        "10.0.0.0/16"
+    ]
+
+
 def test_delete_prefixsets_after_x_days(db, account_objects):
     prefixset = account_objects.prefixset
     instance = account_objects.prefixctl_instance
@@ -470,19 +924,84 @@ def test_delete_prefixsets_after_x_days(db, account_objects):
 
     assert models.PrefixSet.objects.all().count() == 2
 
+    models.Prefix.objects.create(prefix_set=prefixset_2, prefix="10.0.0.0/24")
+
     data = {"days": 1}
-    response = client.post(
-        reverse(
-            "prefixctl_api:prefix_set-delete-prefixsets",
-            kwargs={"org_tag": org.slug},
-        ),
-        json.dumps(data),
-        content_type="application/json",
+    url = reverse(
+        "prefixctl_api:prefix_set-delete-prefixsets",
+        kwargs={"org_tag": org.slug},
     )
+    response = client.post(url, json.dumps(data), content_type="application/json")
+
+    # prefix sets are deleted by a background task
 
     assert response.status_code == 200
+    handle = response.json()["data"][0]
+    assert handle["op"] == "task_delete_prefixsets"
+    assert handle["status"] == "pending"
+    assert handle["progress"] is None
+    assert models.PrefixSet.objects.count() == 2
+
+    # only one deletion per instance at a time
+
+    response = client.post(url, json.dumps(data), content_type="application/json")
+    assert response.status_code == 400
+
+    task = DeletePrefixSetsTask.objects.get(id=handle["id"])
+    work_task(task)
+
     assert models.PrefixSet.objects.count() == 1
     assert models.PrefixSet.objects.first().id == prefixset.id
+    assert not models.Prefix.objects.filter(prefix_set_id=prefixset_2.id).exists()
+
+    status_url = reverse(
+        "prefixctl_api:prefix_set-delete-prefixsets-status",
+        kwargs={"org_tag": org.slug},
+    )
+    response = client.get(status_url, {"task": handle["id"]})
+    assert response.status_code == 200
+    handle = response.json()["data"][0]
+    assert handle["status"] == "completed"
+    assert handle["progress"] == {"deleted": 1, "total": 1}
+
+    response = client.get(status_url, {"task": "x"})
+    assert response.status_code == 404
+
+
+def test_delete_prefixsets_task_batches(db, account_objects, settings):
+    settings.PREFIX_SET_DELETE_BATCH_SIZE = 2
+    settings.PREFIX_DELETE_BATCH_SIZE = 2
+    instance = account_objects.prefixctl_instance
+    cutoff = timezone.now()
+
+    for i in range(5):
+        prefix_set = models.PrefixSet.objects.create(instance=instance, name=f"set {i}")
+        for j in range(3):
+            models.Prefix.objects.create(
+                prefix_set=prefix_set, prefix=f"10.{i}.{j}.0/24"
+            )
+
+    keep = models.PrefixSet.objects.create(instance=instance, name="keep")
+    models.PrefixSet.objects.exclude(id=keep.id).update(
+        created=cutoff - timedelta(days=1)
+    )
+
+    progress = []
+    report_progress = DeletePrefixSetsTask.report_progress
+
+    def record_progress(task, deleted, total):
+        progress.append((deleted, total))
+        report_progress(task, deleted, total)
+
+    task = DeletePrefixSetsTask.create_task(instance.id, cutoff.isoformat())
+    task.report_progress = record_progress.__get__(task)
+    work_task(task)
+
+    assert task.status == "completed"
+    assert json.loads(task.output) == {"deleted": 5, "total": 5}
+    assert progress == [(0, 5), (2, 5), (4, 5), (5, 5)]
+    assert list(models.PrefixSet.objects.all()) == [keep]
+    assert not models.Prefix.objects.exists()
 
 
 def test_asnset_list(db, account_objects):
@@ -502,6 +1021,34 @@ def test_asnset_list(db, account_objects):
     assert data[0]["id"] == asn_set.id
 
 
+def test_asnset_sparse_fields(db, account_objects):
+    asn_set = account_objects.asn_set
+    client = account_objects.api_client
+    org = account_objects.org
+
+    response = client.get(
+        reverse("prefixctl_api:asn_set-list", args=(org.slug,)) + "?view=summary"
+    )
+
+    assert response.status_code == 200
+    data = response.json()["data"]
+    assert len(data) == 1
+    assert data[0]["name"] == asn_set.name
+    assert "asns" not in data[0]
+    assert "monitors" not in data[0]
+
+    response = client.get(
+        reverse(
+            "prefixctl_api:asn_set-detail",
+            kwargs={"org_tag": org.slug, "pk": asn_set.id},
+        )
+        + "?fields=name"
+    )
+
+    assert response.status_code == 200
+    assert response.json()["data"] == [{"id": asn_set.id, "name": asn_set.name}]
+
+
 def test_create_asn_set(db, account_objects):
     client = account_objects.api_client
     org = account_objects.org
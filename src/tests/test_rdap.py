@@ -0,0 +1,192 @@
+import ipaddress
+import json
+from datetime import timedelta
+
+import pytest
+from django.utils import timezone
+
+import prefix_meta.sources.rir.client as rdap_client
+
+IPV4_BOOTSTRAP = {
+    "services": [
+        [["192.0.0.0/8", "198.0.0.0/8"], ["https://rdap.arin.net/registry/"]],
+        [["193.0.0.0/8"], ["https://rdap.db.ripe.net/"]],
+    ]
+}
+
+
+@pytest.fixture
+def bootstrap_dir(tmp_path, settings):
+    settings.RDAP_BOOTSTRAP_DIR = str(tmp_path / "bootstrap")
+    settings.RDAP_SELF_BOOTSTRAP = True
+    settings.RDAP_BOOTSTRAP_URL = "https://rdap.org/"
+    settings.RDAP_BOOTSTRAP_CACHE_TTL = 25
+    settings.RDAP_CLIENT_MAX_AGE = 3600
+    rdap_client._bootstrap.clear()
+    rdap_client._ip_trees.clear()
+    rdap_client._local.client = None
+    yield tmp_path
+    rdap_client._bootstrap.clear()
+    rdap_client._ip_trees.clear()
+    rdap_client._local.client = None
+
+
+def test_ip_tree():
+    tree = rdap_client.IpTree(IPV4_BOOTSTRAP)
+
+    assert len(tree) == 3
+    assert (
+        tree.get_service_url(ipaddress.ip_address("192.0.2.1"))
+        == "https://rdap.arin.net/registry"
+    )
+    assert tree.get_service_url("193.0.0.1") == "https://rdap.db.ripe.net"
+
+    with pytest.raises(LookupError):
+        tree.get_service_url("10.0.0.1")
+
+
+def test_get_client_pooled(bootstrap_dir):
+    client = rdap_client.get_client()
+    assert rdap_client.get_client() is client
+
+
+def test_get_client_rdap_cache(bootstrap_dir, mocker):
+    get = mocker.patch.object(rdap_client.RdapClient, "_get")
+    get.return_value.json.return_value = {
+        "objectClassName": "entity",
+        "handle": "EXAMPLE-ARIN",
+    }
+    url = "https://rdap.arin.net/registry/entity/EXAMPLE-ARIN"
+
+    client = rdap_client.get_client()
+    assert client.get_rdap(url).handle == "EXAMPLE-ARIN"
+    assert client.get_rdap(url).handle == "EXAMPLE-ARIN"
+    assert get.call_count == 1
+
+    # objects are not reused across lookups on the pooled client
+
+    assert rdap_client.get_client() is client
+    client.get_rdap(url)
+    assert get.call_count == 2
+
+
+def test_refresh_bootstrap_from_file(bootstrap_dir, mocker):
+    path = bootstrap_dir / "ipv4.json"
+    path.write_text(json.dumps(IPV4_BOOTSTRAP))
+
+    fetch = mocker.patch.object(rdap_client.RdapClient, "fetch_bootstrap_data")
+
+    rdap_client.refresh_bootstrap("ipv4", str(path))
+
+    client = rdap_client.get_client()
+
+    assert client.ip_url(ipaddress.ip_address("198.51.100.1")) == (
+        "https://rdap.arin.net/registry"
+    )
+
+    # bootstrap data was read from the disk cache, not fetched
+    fetch.assert_not_called()
+
+    # and is held in memory after that
+
+    (bootstrap_dir / "bootstrap" / "ipv4.json").unlink()
+    assert client.ip_url(ipaddress.ip_address("193.0.0.1")) == (
+        "https://rdap.db.ripe.net"
+    )
+    fetch.assert_not_called()
+
+
+def test_refresh_bootstrap_invalid_file(bootstrap_dir):
+    path = bootstrap_dir / "ipv4.json"
+    path.write_text(json.dumps({"invalid": []}))
+
+    with pytest.raises(ValueError):
+        rdap_client.refresh_bootstrap("ipv4", str(path))
+
+
+def _inetnum(start, end, name):
+    return {f"{start} - {end}": {"name": name, "source": "ARIN"}}
+
+
+def test_inetnum_index():
+    from prefix_meta.sources.rir.base import InetnumIndex
+
+    index = InetnumIndex()
+    index.add(_inetnum("10.0.0.0", "10.0.255.255", "NET-A"))
+    index.add(_inetnum("10.0.5.0", "10.0.5.255", "NET-B"))
+    index.add({"None - None": {}})
+    index.add({})
+
+    assert len(index) == 2
+    assert index.lookup("10.0.1.0/24") == _inetnum("10.0.0.0", "10.0.255.255", "NET-A")
+
+    # most specific covering inetnum wins
+    assert index.lookup("10.0.5.128/25") == _inetnum("10.0.5.0", "10.0.5.255", "NET-B")
+
+    # partially covered or uncovered prefixes are not answered
+    assert index.lookup("10.0.0.0/15") is None
+    assert index.lookup("10.1.0.0/24") is None
+    assert index.lookup("2001:db8::/32") is None
+
+
+def test_rdap_request_covering_inetnum(db, mocker, settings):
+    from prefix_meta.sources.rir.base import RdapData, RdapRequest
+
+    settings.RDAP_REUSE_COVERING_INETNUM = True
+    settings.RDAP_CACHE_EXPIRY = 86400
+
+    def rdap_request(target):
+        if target.subnet_of(ipaddress.ip_network("10.0.0.0/16")):
+            return _inetnum("10.0.0.0", "10.0.255.255", "NET-A")
+        return {}
+
+    rdap_request = mocker.patch.object(
+        RdapRequest, "rdap_request", side_effect=rdap_request
+    )
+
+    targets = ["10.0.2.0/24", "10.0.0.0/24", "10.0.1.0/24", "10.1.0.0/24"]
+
+    results = RdapRequest.request(targets)
+
+    assert sorted(results.keys()) == sorted(targets)
+    assert rdap_request.call_count == 2
+    assert results["10.0.2.0/24"].response.data == _inetnum(
+        "10.0.0.0", "10.0.255.255", "NET-A"
+    )
+    assert results["10.1.0.0/24"].response.data == {}
+
+    # cached inetnums covering new targets are used for them
+
+    results = RdapRequest.request(["10.0.3.0/24"])
+
+    assert rdap_request.call_count == 2
+    assert results["10.0.3.0/24"].response.data == _inetnum(
+        "10.0.0.0", "10.0.255.255", "NET-A"
+    )
+
+    # expired data is not
+
+    RdapData.objects.update(updated=timezone.now() - timedelta(days=2))
+
+    RdapRequest.request(["10.0.4.0/24"])
+
+    assert rdap_request.call_count == 3
+
+
+def test_rdap_data_covering_queryset(db):
+    from prefix_meta.sources.rir.base import RdapData
+
+    data = RdapData.objects.create(
+        prefix="10.0.0.0/24",
+        type="rdap",
+        source_name="rdap",
+        date=timezone.now(),
+        data=_inetnum("10.0.0.0", "10.0.2.255", "NET-A"),
+    )
+
+    assert sorted(str(subnet.prefix) for subnet in data.subnets.all()) == [
+        "10.0.0.0/23",
+        "10.0.2.0/24",
+    ]
+    assert list(RdapData.get_covering_queryset(["10.0.2.128/25"])) == [data]
+    assert list(RdapData.get_covering_queryset(["10.0.3.0/24"])) == []
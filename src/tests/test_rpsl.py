@@ -0,0 +1,169 @@
+import gzip
+import io
+import json
+import os
+import shutil
+
+import pytest
+
+from django_prefixctl.irr import expand_as_set, perform_irr_import
+from django_prefixctl.rpsl import RpslDatabase, get_database, parse_rpsl
+from tests.test_irr_import import mock_bgpq4
+
+DUMP_PATH = os.path.join(os.path.dirname(__file__), "data", "irr", "test.db")
+
+
+@pytest.fixture
+def database():
+    database = RpslDatabase()
+    database.load_file(DUMP_PATH)
+    return database
+
+
+def test_parse_rpsl():
+    objects = list(
+        parse_rpsl(
+            io.StringIO(
+                "% header\n\n"
+                "as-set: AS-A # comment\n"
+                "members: AS1,\n"
+                " AS2\n"
+                "+ AS3\n"
+                "Source: TEST\n\n\n"
+                "person: Someone\n"
+                "source: TEST"
+            ),
+            ["as-set"],
+        )
+    )
+
+    assert objects == [
+        {
+            "class": "as-set",
+            "as-set": ["AS-A"],
+            "members": ["AS1, AS2 AS3"],
+            "source": ["TEST"],
+        }
+    ]
+
+
+def test_resolve_as_set(database):
+    assert database.sources == ["TEST", "OTHER"]
+
+    # nested as-sets are followed, the AS-EXAMPLE -> AS-LOOP -> AS-EXAMPLE
+    # cycle only once
+    assert database.resolve_as_set("as-example") == {
+        65000,
+        65001,
+        65010,
+        65011,
+        65020,
+    }
+
+    # as-sets are looked up in the first source that defines them
+    assert database.resolve_as_set("AS-CUSTOMERS", "OTHER,TEST") == {65099}
+    assert database.resolve_as_set("AS-CUSTOMERS", "TEST,OTHER") == {
+        65000,
+        65001,
+        65010,
+        65011,
+        65020,
+    }
+
+    assert database.resolve_as_set("AS65000") == {65000}
+    assert database.resolve_as_set("AS-UNKNOWN") == set()
+
+
+def test_expand(database):
+    assert database.expand("AS-EXAMPLE", "TEST") == {
+        "192.0.2.0/24": "exact",
+        "198.51.100.0/24": "exact",
+        "203.0.113.0/25": "exact",
+        "203.0.113.128/25": "exact",
+    }
+    assert database.expand("AS-EXAMPLE", "TEST", address_family=6) == {
+        "2001:db8::/32": "exact",
+    }
+
+    with pytest.raises(ValueError):
+        database.expand("AS-EXAMPLE", address_family=5)
+
+    # routes of all requested sources are included
+    assert database.expand("AS65000") == {
+        "192.0.2.0/24": "exact",
+        "100.64.1.0/24": "exact",
+    }
+
+
+def test_get_database(tmp_path):
+    path = tmp_path / "test.db.gz"
+
+    with open(DUMP_PATH, "rb") as src, gzip.open(path, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+
+    database = get_database([str(tmp_path)])
+
+    assert len(database.routes) == 7
+    assert get_database([str(tmp_path)]) is database
+
+
+def test_perform_irr_import_rpsl(db, account_objects, settings, mocker):
+    settings.IRR_EXPANSION_BACKEND = "rpsl"
+    settings.IRR_RPSL_DUMPS = DUMP_PATH
+
+    popen = mocker.patch("django_prefixctl.irr.subprocess.Popen")
+
+    prefixset = account_objects.prefixset
+    prefixset.irr_import = True
+    prefixset.save()
+
+    result = perform_irr_import(prefixset, "AS-EXAMPLE", "TEST")
+
+    popen.assert_not_called()
+    assert sorted(result["added"]) == [
+        ("192.0.2.0/24", "exact"),
+        ("198.51.100.0/24", "exact"),
+        ("203.0.113.0/25", "exact"),
+        ("203.0.113.128/25", "exact"),
+    ]
+
+    settings.IRR_EXPANSION_BACKEND = "unknown"
+
+    with pytest.raises(ValueError):
+        expand_as_set("AS-EXAMPLE")
+
+
+@pytest.mark.parametrize(
+    "address_family,output",
+    [
+        (
+            4,
+            {
+                "NN": [
+                    {"prefix": "192.0.2.0/24", "exact": True},
+                    {"prefix": "198.51.100.0/24", "exact": True},
+                    {"prefix": "203.0.113.0/25", "exact": True},
+                    {"prefix": "203.0.113.128/25", "exact": True},
+                ]
+            },
+        ),
+        (6, {"NN": [{"prefix": "2001:db8::/32", "exact": True}]}),
+    ],
+)
+def test_expand_backends_match(settings, mocker, address_family, output):
+    """
+    The rpsl backend returns the same prefixes as bgpq4 run for the
+    same address family on the same data
+    """
+
+    settings.IRR_RPSL_DUMPS = DUMP_PATH
+    bgpq4 = mock_bgpq4(mocker, json.dumps(output))
+
+    settings.IRR_EXPANSION_BACKEND = "bgpq4"
+    expected = expand_as_set("AS-EXAMPLE", "TEST", address_family)
+
+    command = bgpq4.call_args[0][0]
+    assert ("-6" in command) == (address_family == 6)
+
+    settings.IRR_EXPANSION_BACKEND = "rpsl"
+    assert expand_as_set("AS-EXAMPLE", "TEST", address_family) == expected
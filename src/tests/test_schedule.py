@@ -0,0 +1,207 @@
+import datetime
+
+import pytest
+from django.db import connection
+from django.utils import timezone
+from fullctl.django.models.concrete.tasks import TaskSchedule
+from fullctl.django.tasks.orm import progress_schedules
+
+from django_prefixctl.schedule import (
+    SCHEDULE_LOCK_KEY,
+    next_phase,
+    phased_schedule,
+    rate_limited_schedule,
+    schedule_lock,
+    schedule_phase,
+)
+
+
+@pytest.fixture
+def schedule_settings(settings):
+    settings.TASK_SCHEDULE_JITTER = True
+    settings.TASK_SCHEDULE_RATE_LIMIT = 2
+    settings.TASK_SCHEDULE_RATE_WINDOW = 60
+    return settings
+
+
+def seconds_into_interval(schedule, interval):
+    return round(schedule.timestamp()) % interval
+
+
+def test_schedule_phase():
+    interval = 3600
+
+    phases = [
+        schedule_phase(f"prefix_set_irr_importer.{i}", interval) for i in range(1200)
+    ]
+
+    assert phases == [
+        schedule_phase(f"prefix_set_irr_importer.{i}", interval) for i in range(1200)
+    ]
+    assert all(0 <= phase < interval for phase in phases)
+
+    # keys are spread evenly over the interval
+
+    buckets = [0] * 12
+    for phase in phases:
+        buckets[phase * 12 // interval] += 1
+
+    assert max(buckets) < 2 * 1200 / 12
+
+    assert schedule_phase("a", 1) == 0
+
+
+def test_next_phase():
+    interval = 3600
+    now = timezone.now()
+
+    schedule = next_phase("asn_monitor.1", interval, now)
+
+    assert now <= schedule < now + datetime.timedelta(seconds=interval)
+    assert seconds_into_interval(schedule, interval) == schedule_phase(
+        "asn_monitor.1", interval
+    )
+
+    # the same slot is kept across cycles
+    later = next_phase(
+        "asn_monitor.1", interval, schedule + datetime.timedelta(seconds=1)
+    )
+    assert later - schedule == datetime.timedelta(seconds=interval)
+
+
+def test_rate_limited_schedule(db, schedule_settings):
+    now = timezone.now().replace(microsecond=0)
+
+    assert rate_limited_schedule(now) == now
+
+    for _ in range(2):
+        TaskSchedule.objects.create(
+            task_config={}, interval=3600, repeat=True, schedule=now
+        )
+
+    assert rate_limited_schedule(now) == now + datetime.timedelta(seconds=60)
+
+    schedule_settings.TASK_SCHEDULE_RATE_LIMIT = 0
+    assert rate_limited_schedule(now) == now
+
+
+def test_phased_schedule(db, schedule_settings):
+    now = timezone.now()
+
+    schedule = phased_schedule("asn_monitor.1", 3600, now)
+    assert schedule == next_phase("asn_monitor.1", 3600, now)
+
+    schedule_settings.TASK_SCHEDULE_JITTER = False
+    assert phased_schedule("asn_monitor.1", 3600, now) == now
+
+
+def test_monitor_task_schedule(db, account_objects, schedule_settings):
+    asn_monitor = account_objects.asn_monitor
+    task_schedule = asn_monitor.require_task_schedule
+
+    assert seconds_into_interval(
+        task_schedule.schedule, task_schedule.interval
+    ) == schedule_phase(asn_monitor.schedule_key, task_schedule.interval)
+
+
+def test_irr_importer_task_schedule(db, account_objects, schedule_settings):
+    prefixset = account_objects.prefixset
+    prefixset.irr_import = True
+    prefixset.irr_as_set = "AS-EXAMPLE"
+    prefixset.save()
+
+    importer = prefixset.prefix_set_irr_importer
+    interval = importer.schedule_interval
+
+    # the first import runs right away
+
+    now = timezone.now()
+    assert importer.task_schedule.schedule <= now
+
+    # after that imports run on the importer's phase
+
+    importer.realign_task_schedule()
+    importer.task_schedule.refresh_from_db()
+    schedule = importer.task_schedule.schedule
+
+    assert schedule >= now + datetime.timedelta(seconds=interval // 2)
+    assert schedule <= now + datetime.timedelta(seconds=interval * 1.5)
+    assert seconds_into_interval(schedule, interval) == schedule_phase(
+        importer.schedule_key, interval
+    )
+
+
+@pytest.mark.parametrize("monitor", ["asn_monitor", "prefixset"])
+def test_monitor_schedule_stays_on_phase(
+    db, account_objects, schedule_settings, monitor
+):
+    if monitor == "prefixset":
+        prefixset = account_objects.prefixset
+        prefixset.irr_import = True
+        prefixset.irr_as_set = "AS-EXAMPLE"
+        prefixset.save()
+        monitor = prefixset.prefix_set_irr_importer
+    else:
+        monitor = account_objects.asn_monitor
+
+    task_schedule = monitor.require_task_schedule
+    interval = task_schedule.interval
+
+    # the schedule is due, once it has run the next run is back on the
+    # monitor's phase instead of now + interval
+
+    for _ in range(2):
+        task_schedule.tasks.update(status="completed")
+        TaskSchedule.objects.filter(id=task_schedule.id).update(
+            schedule=timezone.now() - datetime.timedelta(seconds=1)
+        )
+        now = timezone.now()
+        progress_schedules()
+        task_schedule.refresh_from_db()
+
+        assert task_schedule.schedule >= now + datetime.timedelta(seconds=interval // 2)
+        assert seconds_into_interval(task_schedule.schedule, interval) == (
+            schedule_phase(monitor.schedule_key, interval)
+        )
+
+
+def test_monitor_for_task_schedule(
+    db, account_objects, schedule_settings, django_assert_num_queries
+):
+    from django_prefixctl.models.prefixctl import (
+        ASNMonitor,
+        Monitor,
+        PrefixSetIRRImporter,
+    )
+
+    assert {ASNMonitor, PrefixSetIRRImporter} <= set(Monitor.monitor_classes())
+
+    asn_monitor = account_objects.asn_monitor
+    task_schedule = asn_monitor.require_task_schedule
+
+    assert Monitor.for_task_schedule(task_schedule) == asn_monitor
+
+    # schedules that don't belong to a monitor are not queried for
+
+    other = TaskSchedule.objects.create(
+        task_config={}, interval=3600, repeat=True, schedule=timezone.now()
+    )
+
+    with django_assert_num_queries(0):
+        assert Monitor.for_task_schedule(other) is None
+
+
+def test_schedule_lock(db):
+    def advisory_locks():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT count(*) FROM pg_locks WHERE locktype = 'advisory' "
+                "AND pid = pg_backend_pid() AND granted"
+            )
+            return cursor.fetchone()[0]
+
+    assert advisory_locks() == 0
+
+    with schedule_lock():
+        assert advisory_locks() == 1
+        assert SCHEDULE_LOCK_KEY